@@ -19,6 +19,7 @@
 
 from wok.control.base import Resource
 from wok.control.utils import UrlSubNode
+from wok.template import render
 
 
 @UrlSubNode("cio_ignore")
@@ -29,8 +30,20 @@ class CIOIgnore(Resource):
         self.role_key = "administration"
         self.uri_fmt = "/cio_ignore/%s"
         self.params = ['devices']
-        self.remove = self.generate_action_handler_task('remove', self.params)
+        self.remove = self.generate_action_handler_task('remove',
+                                                        ['devices', 'settle'])
+        # generate_action_handler() redirects to the resource and
+        # generate_action_handler_task() returns a task, neither can
+        # return the result of the query. A GET can't take the thousands
+        # of devices a query may have in its query string, so the action
+        # renders its result through the handler both of them are built on.
+        self.query = self._generate_action_handler_base(
+            'query', _render_query, action_args=self.params)
 
     @property
     def data(self):
         return self.info
+
+
+def _render_query(resource, result):
+    return render('CIOIgnoreQuery', result)
@@ -33,6 +33,13 @@ FCLUNS_REQUESTS = {
         'default': "GS390XSTG0004L"},
 }
 
+FCLUNSBULK_REQUESTS = {
+    'POST': {
+        'add': "GS390XSTG0006L",
+        'remove': "GS390XSTG0007L",
+    }
+}
+
 FCLUN_REQUESTS = {
     'DELETE': {'default': "GS390XSTG0005L"}
 }
@@ -72,6 +79,7 @@ class FCLUNs(Collection):
         self.resource = FCLUN
         self.log_map = FCLUNS_REQUESTS
         self.log_args.update({'hbaId': '', 'remoteWwpn': '', 'lunId': ''})
+        self.bulk = FCLUNsBulk(model)
 
     def _get_resources(self, flag_filter):
         """
@@ -96,6 +104,27 @@ class FCLUNs(Collection):
             return []
 
 
+class FCLUNsBulk(Resource):
+    """
+    Resource adding or removing many FC LUNs at once
+    """
+
+    def __init__(self, model):
+        super(FCLUNsBulk, self).__init__(model)
+        self.role_key = 'host'
+        self.admin_methods = ['POST']
+        self.uri_fmt = "/fcluns/bulk/%s"
+        self.params = ['luns']
+        self.add = self.generate_action_handler_task('add', self.params)
+        self.remove = self.generate_action_handler_task('remove',
+                                                        self.params)
+        self.log_map = FCLUNSBULK_REQUESTS
+
+    @property
+    def data(self):
+        return self.info
+
+
 class FCLUN(Resource):
     """
     Resource representing a single LUN
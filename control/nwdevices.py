@@ -28,6 +28,7 @@ class NetworkDevices(Collection):
         self.role_key = 'administration'
         self.admin_methods = ['GET']
         self.resource = NetworkDevice
+        self.bulk = NetworkDevicesBulk(model)
 
     def _get_resources(self, flag_filter):
         try:
@@ -44,6 +45,26 @@ class NetworkDevices(Collection):
             return []
 
 
+class NetworkDevicesBulk(Resource):
+    """
+    Resource configuring or un-configuring many network devices at once
+    """
+    def __init__(self, model):
+        super(NetworkDevicesBulk, self).__init__(model)
+        self.role_key = "administration"
+        self.admin_methods = ['POST']
+        self.uri_fmt = '/nwdevices/bulk/%s'
+        self.params = ['devices']
+        self.configure = self.generate_action_handler_task('configure',
+                                                           self.params)
+        self.unconfigure = self.generate_action_handler_task('unconfigure',
+                                                             self.params)
+
+    @property
+    def data(self):
+        return self.info
+
+
 class NetworkDevice(Resource):
     """
     Network device resource
@@ -32,6 +32,7 @@ class StorageDevices(Collection):
         self.role_key = 'administration'
         self.admin_methods = ['GET']
         self.resource = StorageDevice
+        self.bulk = StorageDevicesBulk(model)
 
     def _get_resources(self, flag_filter):
         """
@@ -56,6 +57,26 @@ class StorageDevices(Collection):
             return []
 
 
+class StorageDevicesBulk(Resource):
+    """
+    Resource bringing many storage devices online or offline at once
+    """
+    def __init__(self, model):
+        super(StorageDevicesBulk, self).__init__(model)
+        self.role_key = 'administration'
+        self.admin_methods = ['POST']
+        self.uri_fmt = "/storagedevices/bulk/%s"
+        self.params = ['devices']
+        self.online = self.generate_action_handler_task('online',
+                                                        self.params)
+        self.offline = self.generate_action_handler_task('offline',
+                                                         self.params)
+
+    @property
+    def data(self):
+        return self.info
+
+
 class StorageDevice(Resource):
     """
     Storage device resource
@@ -66,8 +87,8 @@ class StorageDevice(Resource):
         self.admin_methods = ['GET', 'POST']
         self.uri_fmt = "/storagedevices/%s"
         self.info = {}
-        self.online = self.generate_action_handler('online')
-        self.offline = self.generate_action_handler('offline')
+        self.online = self.generate_action_handler_task('online')
+        self.offline = self.generate_action_handler_task('offline')
 
     @property
     def data(self):
@@ -28,10 +28,13 @@ messages = {
     "GS390XCMD0001E": _("Command failed. Command = %(command)s, RC = %(rc)s, "
                         "REASON = %(reason)s'."),
     "GS390XREG0001E": _("Issue with regex. Reason =  %(reason)s"),
+    "GS390XPOOL001E": _("Processing %(item)s did not finish within %(seconds)s seconds"),
 
     "GS390XIOST001E": _("Failed to bring device online. Error = %(error)s"),
     "GS390XIOST002E": _("Failed to add dasd-eckd device in dasd.conf file. Device = %(device)s"),
     "GS390XIOST003E": _("Failed to remove device from dasd.conf file. Device = %(device)s"),
+    "GS390XIOST005E": _("Failed to bring devices online. Failed devices = %(failed_devices)s"),
+    "GS390XIOST006E": _("Failed to bring devices offline. Failed devices = %(failed_devices)s"),
 
     "GS390XIONW001E": _("Failed to bring network device %(device)s online. Error = %(error)s"),
     "GS390XIONW002E": _("Failed to persist network device %(device)s in "
@@ -41,6 +44,8 @@ messages = {
                         "device %(device)s. Error = %(error)s"),
     "GS390XIONW005E": _("Failed to create ifcfg file %(ifcfg_file_path)s for "
                         "network device %(device)s. Error = %(error)s"),
+    "GS390XIONW006E": _("Failed to configure network devices. Failed devices = %(failed_devices)s"),
+    "GS390XIONW007E": _("Failed to un-configure network devices. Failed devices = %(failed_devices)s"),
 
     "GS390XIOIG001E": _("Failed to retrieve devices in ignored list = %(error)s"),
     "GS390XIOIG002E": _("Failed to remove devices from ignore list. "
@@ -62,5 +67,9 @@ messages = {
     "GS390XSTG00015": _("Unable to execute zipl, %(err)s"),
     "GS390XSTG00016": _("Unable to uuid for tape device, %(err)s"),
     "GS390XSTG00017": _("Unable to parse output of lstape, %(err)s"),
-    "GS390XSTG00017": _("Unable to execute lstape, %(err)s")
+    "GS390XSTG00017": _("Unable to execute lstape, %(err)s"),
+    "GS390XSTG00020": _("luns must be a list of dictionaries having hbaId, remoteWwpn and lunId"),
+    "GS390XSTG00021": _("Failed to add LUNs. Failed LUNs = %(failed_luns)s"),
+    "GS390XSTG00022": _("Failed to remove LUNs. Failed LUNs = %(failed_luns)s"),
+    "GS390XSTG00023": _("No sg device showed up for LUN %(lun)s"),
 }
@@ -0,0 +1,63 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import os
+
+cio_ignore_path = '/proc/cio_ignore'
+cio_settle_path = '/proc/cio_settle'
+
+
+def read_ignored():
+    """
+    Read the ignore list, like 'cio_ignore -l' does
+    :return: list of device ids and ranges of device ids, e.g.
+             ['0.0.0011', '0.0.0013-0.0.0015']
+    :raises: IOError if the ignore list can't be read
+    """
+    with open(cio_ignore_path) as cio_ignore:
+        return [line.strip() for line in cio_ignore if line.strip()]
+
+
+def free(devices):
+    """
+    Remove devices from the ignore list, like 'cio_ignore -r' does. The
+    command is written with a single write, as the kernel parses each
+    write on its own.
+    :param devices: comma separated device ids and ranges of device ids
+    :raises: OSError with errno EINVAL if the kernel rejects the devices,
+             other errors if the ignore list can't be written
+    """
+    fd = os.open(cio_ignore_path, os.O_WRONLY)
+    try:
+        os.write(fd, 'free %s\n' % devices)
+    finally:
+        os.close(fd)
+
+
+def settle():
+    """
+    Wait until the channel subsystem processed all pending work, e.g. the
+    registration of the devices removed from the ignore list
+    :raises: IOError, OSError if the kernel doesn't support it
+    """
+    fd = os.open(cio_settle_path, os.O_WRONLY)
+    try:
+        os.write(fd, '1')
+    finally:
+        os.close(fd)
@@ -0,0 +1,210 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import bisect
+import re
+
+from collections import namedtuple
+
+# Device ids are (css id, subchannel set id, device number) tuples,
+# e.g. (0, 0, 0x190) for '0.0.0190'
+MAX_CSSID = 0xff
+MAX_SSID = 3
+MAX_DEVNO = 0xffff
+
+DeviceRange = namedtuple('DeviceRange', ['start', 'end'])
+
+BUSID_PATTERN = re.compile(r'^([0-9a-f]+)\.([0-9a-f]+)\.([0-9a-f]{1,4})$')
+DEVNO_PATTERN = re.compile(r'^(?:0x)?([0-9a-f]{1,4})$')
+
+# taken by cio_ignore and /proc/cio_ignore in place of the device ids
+ALL_DEVICES = 'all'
+
+
+def parse_device_id(device):
+    """
+    Parse a device id in any of the formats accepted by cio_ignore
+    :param device: "<CSSID>.<SSID>.<DEVNO>", e.g. "0.0.0190", or only the
+                   device number for CSSID and SSID 0, either with or
+                   without leading "0x" and zeros, e.g. "190" or "0x190"
+    :return: (css id, subchannel set id, device number) tuple
+    :raises: ValueError if the device id is invalid
+    """
+    device = str(device).strip().lower()
+    match = BUSID_PATTERN.match(device)
+    if match:
+        device_id = tuple(int(field, 16) for field in match.groups())
+    else:
+        match = DEVNO_PATTERN.match(device)
+        if not match:
+            raise ValueError('invalid device id: %s' % device)
+        device_id = (0, 0, int(match.group(1), 16))
+    if device_id[0] > MAX_CSSID or device_id[1] > MAX_SSID:
+        raise ValueError('invalid device id: %s' % device)
+    return device_id
+
+
+def parse_range(devices):
+    """
+    :param devices: device id or range of device ids, e.g.
+                    "0.0.0190 - 0.0.01a0" or "0.0.0000-0.1.ffff"
+    :return: list of DeviceRange, one per subchannel set spanned by the
+             range, like the ranges listed by cio_ignore
+    :raises: ValueError if the device ids or the range are invalid
+    """
+    fields = str(devices).split('-')
+    if len(fields) > 2:
+        raise ValueError('invalid range of device ids: %s' % devices)
+    start = parse_device_id(fields[0])
+    end = parse_device_id(fields[-1])
+    if start[0] != end[0] or start > end:
+        raise ValueError('invalid range of device ids: %s' % devices)
+    cssid = start[0]
+    ranges = []
+    for ssid in range(start[1], end[1] + 1):
+        first = start[2] if ssid == start[1] else 0
+        last = end[2] if ssid == end[1] else MAX_DEVNO
+        ranges.append(DeviceRange((cssid, ssid, first),
+                                  (cssid, ssid, last)))
+    return ranges
+
+
+def merge(ranges):
+    """
+    Merge overlapping and adjacent ranges
+    :param ranges: iterable of DeviceRange
+    :return: sorted list of DeviceRange without overlaps
+    """
+    merged = []
+    for device_range in sorted(ranges):
+        if merged:
+            last = merged[-1]
+            if last.end[:2] == device_range.start[:2] and \
+                    device_range.start[2] <= last.end[2] + 1:
+                if device_range.end > last.end:
+                    merged[-1] = DeviceRange(last.start, device_range.end)
+                continue
+        merged.append(device_range)
+    return merged
+
+
+def parse_ranges(devices):
+    """
+    Parse and merge device ids and ranges of device ids
+    :param devices: list of device ids and ranges of device ids, see
+                    parse_range()
+    :return: (ranges, invalid) tuple of the sorted list of merged
+             DeviceRange and a dictionary of the entries which can't be
+             parsed -> reason
+    """
+    ranges = []
+    invalid = {}
+    for devices_entry in devices:
+        try:
+            ranges.extend(parse_range(devices_entry))
+        except ValueError as e:
+            invalid[str(devices_entry)] = str(e)
+    return merge(ranges), invalid
+
+
+def format_device_id(device_id):
+    """
+    :param device_id: (css id, subchannel set id, device number) tuple
+    :return: bus id of the device, e.g. '0.0.0190'
+    """
+    return '%x.%x.%04x' % device_id
+
+
+def format_range(device_range):
+    """
+    :return: the device id of a single device range or the first and the
+             last device id, e.g. '0.0.0190-0.0.01a0'
+    """
+    if device_range.start == device_range.end:
+        return format_device_id(device_range.start)
+    return '%s-%s' % (format_device_id(device_range.start),
+                      format_device_id(device_range.end))
+
+
+def range_size(device_range):
+    """
+    :return: number of devices in the range
+    """
+    return device_range.end[2] - device_range.start[2] + 1
+
+
+class RangeIndex(object):
+    """
+    Sorted ranges of device ids, searched by bisection without expanding
+    the ranges
+    """
+
+    def __init__(self, ranges):
+        """
+        :param ranges: iterable of DeviceRange, which may overlap
+        """
+        self.ranges = merge(ranges)
+        self.starts = [device_range.start for device_range in self.ranges]
+        self.count = sum(map(range_size, self.ranges))
+
+    def contains(self, device_id):
+        """
+        :param device_id: (css id, subchannel set id, device number) tuple
+        :return: True if the device is in one of the ranges
+        """
+        index = bisect.bisect_right(self.starts, device_id) - 1
+        return index >= 0 and self.ranges[index].end >= device_id
+
+    def intersect(self, device_range):
+        """
+        :param device_range: DeviceRange
+        :return: sorted list of the parts of device_range which are in the
+                 index
+        """
+        index = max(bisect.bisect_right(self.starts, device_range.start) - 1,
+                    0)
+        parts = []
+        while index < len(self.ranges) and \
+                self.ranges[index].start <= device_range.end:
+            start = max(self.ranges[index].start, device_range.start)
+            end = min(self.ranges[index].end, device_range.end)
+            if start <= end:
+                parts.append(DeviceRange(start, end))
+            index += 1
+        return parts
+
+
+def difference(ranges, parts):
+    """
+    :param ranges: sorted list of DeviceRange without overlaps
+    :param parts: iterable of DeviceRange
+    :return: sorted list of the parts of ranges not covered by parts
+    """
+    index = RangeIndex(parts)
+    uncovered = []
+    for device_range in ranges:
+        start = device_range.start
+        for part in index.intersect(device_range):
+            if part.start > start:
+                uncovered.append(DeviceRange(start, part.start[:2] +
+                                             (part.start[2] - 1,)))
+            start = part.end[:2] + (part.end[2] + 1,)
+        if start <= device_range.end:
+            uncovered.append(DeviceRange(start, device_range.end))
+    return uncovered
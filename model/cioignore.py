@@ -17,12 +17,26 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import errno
+import json
+import os
+import threading
+
+import cio_proc
+import cio_ranges
+import uevent
 from wok.exception import InvalidParameter, OperationFailed
 from wok.model.tasks import TaskModel
+from wok.plugins.gingers390x.config import config
 from wok.utils import add_task, run_command, wok_log
 
 CIO_IGNORE = "cio_ignore"
 IGNORED_DEVICES = 'ignored_devices'
+# the list of devices is written to /proc/cio_ignore, directly or by
+# cio_ignore, and the kernel takes at most 64 KiB per write
+MAX_DEVICES_ARG = 65000
+
+ccw_devices_dir = '/sys/bus/ccw/devices/'
 
 
 class CIOIgnoreModel(object):
@@ -42,20 +56,16 @@ class CIOIgnoreModel(object):
                 or range of device ids)
         """
         devices = {}
-        command = [CIO_IGNORE, '-l']
-        out, err, rc = run_command(command)
-        if rc:
-            wok_log.error('failed to retrieve ignore list '
-                          'using \'cio_ignore -l\'. Error: %s' % err.strip())
-            raise OperationFailed('GS390XIOIG001E', {'error': err.strip()})
-        devices[IGNORED_DEVICES] = _parse_ignore_output(out)
+        devices[IGNORED_DEVICES] = _get_ignored_devices()
         wok_log.info('Successfully retrieved devices from ignore list')
         return devices
 
-    def remove(self, name, devices):
+    def remove(self, name, devices, settle=None):
         """
         Remove one or more device IDs from blacklist.
         :param devices: List of devices
+        :param settle: True to wait until the removed devices show up in
+                       sysfs before the task finishes
         :return: task json
         """
         # Check the type of devices.
@@ -64,16 +74,81 @@ class CIOIgnoreModel(object):
             raise InvalidParameter('GS390XINVINPUT', {'reason': 'input must '
                                                                 'be of type'
                                                                 ' list'})
+        if settle not in (None, True, False):
+            wok_log.error('settle is not a boolean. settle: %s' % settle)
+            raise InvalidParameter('GS390XINVINPUT',
+                                   {'reason': 'settle must be a boolean'})
 
         wok_log.info('Removing devices %s from ignore list' % devices)
         taskid = add_task('/plugins/gingers390x/cioignore/remove',
-                          _remove_devices, self.objstore, devices)
+                          _remove_and_settle if settle else _remove_devices,
+                          self.objstore, devices)
         return self.task.lookup(taskid)
 
+    def query(self, name, devices):
+        """
+        Find which of the devices are in the blacklist, without expanding
+        the ranges of device IDs.
+        :param devices: List of devices IDs and ranges of device IDs, in the
+                        formats taken by _remove_devices()
+        :return: dictionary with
+                 ignored_devices: merged ranges of the given devices which
+                                  are in the ignore list
+                 ignored_count: number of the given devices in the ignore
+                                list
+                 queried_count: number of the valid devices given
+                 total_ignored_count: number of devices in the ignore list
+                 invalid_devices: entries which are no valid device ID or
+                                  range -> reason
+        """
+        if not (isinstance(devices, list)):
+            wok_log.error('Input is not of type list. Input: %s' % devices)
+            raise InvalidParameter('GS390XINVINPUT', {'reason': 'input must '
+                                                                'be of type'
+                                                                ' list'})
+
+        ranges, invalid = cio_ranges.parse_ranges(devices)
+        index = ignore_index.get()
+        ignored = []
+        for device_range in ranges:
+            ignored.extend(index.intersect(device_range))
+        return {'ignored_devices': map(cio_ranges.format_range, ignored),
+                'ignored_count': sum(map(cio_ranges.range_size, ignored)),
+                'queried_count': sum(map(cio_ranges.range_size, ranges)),
+                'total_ignored_count': index.count,
+                'invalid_devices': invalid}
+
+
+class IgnoreListIndex(object):
+    """
+    Interval index of the ignore list, built again only once the ignore
+    list changed
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.devices = None
+        self.index = None
+
+    def get(self):
+        """
+        :return: cio_ranges.RangeIndex of the current ignore list
+        """
+        devices = _get_ignored_devices()
+        with self.lock:
+            if devices != self.devices:
+                ranges, _ = cio_ranges.parse_ranges(devices)
+                self.index = cio_ranges.RangeIndex(ranges)
+                self.devices = devices
+            return self.index
+
+
+ignore_index = IgnoreListIndex()
+
 
 def _remove_devices(cb, devices):
     """
-    Remove one or more device IDs from blacklist.
+    Remove one or more device IDs from blacklist, see _remove().
     :param devices: List of devices IDs. It can have range of device IDs
                     Ex: ['0.0.0120', '0.0.1230-0.0.1300', '0.0.001']
                     device ID format:
@@ -82,43 +157,237 @@ def _remove_devices(cb, devices):
                             alternatively be specified by using only the
                             device number, either with or without leading
                             "0x" and zeros. Ex: "190", "0x190" or "0190"
+                    A range can span subchannel sets of the same CSSID,
+                    Ex: "0.0.0000-0.1.ffff", and "all" empties the
+                    ignore list.
     """
     cb('')  # reset messages
     try:
-        wok_log.info('Removing devices %s from ignore list' % devices)
-        failed_devices = {}
-        for device in devices:
-            device = str(device)
-            if not device.isspace():
-                if '-' in device:
-                    # if range, remove space if any before or after '-'
-                    device = device.replace(' ', '')
-                command = [CIO_IGNORE, '-r', device]
-                out, err, rc = run_command(command)
-                if rc:
-                    wok_log.error('failed to remove device(s): %s, from'
-                                  ' ignore list. Error: %s'
-                                  % (device, err.strip()))
-                    err = err.strip().split(':')[-1].strip()
-                    failed_devices[device] = err
-            else:
-                failed_devices[device] = 'device ID is required'
-                wok_log.error('failed to remove device since'
-                              ' device id is empty')
-
-        if failed_devices:
-            wok_log.error('failed to remove devices %s from'
-                          ' ignore list', failed_devices)
-            raise OperationFailed('GS390XIOIG002E',
-                                  {'failed_devices': failed_devices})
-        wok_log.info('Successfully removed devices %s from'
-                     ' ignore list' % devices)
+        _remove(devices)
         cb('Successfully removed devices %s from ignore'
            ' list' % devices, True)
     except Exception as e:
         cb(e.__str__(), False)
 
 
+def _remove_and_settle(cb, devices):
+    """
+    Remove one or more device IDs from blacklist like _remove_devices()
+    and wait until the removed devices are registered, at most
+    cio_settle_timeout seconds.
+    :param devices: List of devices IDs, see _remove_devices()
+    :return: None, the message of the finished task is the JSON encoded
+             dictionary having
+             ready_devices: merged ranges of the removed devices which
+                            are present in /sys/bus/ccw/devices
+             missing_devices: merged ranges of the removed devices which
+                              are not present, e.g. as they don't exist
+    """
+    cb('')  # reset messages
+    try:
+        ranges = _remove(devices)
+        cb('Removed devices %s from ignore list, waiting for them'
+           % devices)
+        ready, missing = _settle(ranges)
+        wok_log.info('Devices %s are ready, devices %s are missing'
+                     % (ready, missing))
+        # the task message must be a string
+        cb(json.dumps({'ready_devices': ready, 'missing_devices': missing}),
+           True)
+    except Exception as e:
+        cb(e.__str__(), False)
+
+
+def _remove(devices):
+    """
+    Remove one or more device IDs from blacklist. The devices are merged
+    into ranges, which are removed with as few writes to /proc/cio_ignore
+    or cio_ignore calls as possible, usually a single one.
+    :param devices: List of devices IDs, see _remove_devices()
+    :return: sorted list of the removed cio_ranges.DeviceRange
+    :raises: OperationFailed if any of the devices can't be removed
+    """
+    wok_log.info('Removing devices %s from ignore list' % devices)
+    if any(str(device).strip().lower() == cio_ranges.ALL_DEVICES
+           for device in devices):
+        return _remove_all()
+
+    ranges, failed_devices = cio_ranges.parse_ranges(devices)
+    for device in failed_devices:
+        wok_log.error('failed to remove device %s from ignore list. '
+                      'Error: %s' % (device, failed_devices[device]))
+    for batch in _batch_ranges(ranges):
+        failed_devices.update(_remove_ranges(batch))
+
+    if failed_devices:
+        wok_log.error('failed to remove devices %s from'
+                      ' ignore list', failed_devices)
+        raise OperationFailed('GS390XIOIG002E',
+                              {'failed_devices': failed_devices})
+    wok_log.info('Successfully removed devices %s from'
+                 ' ignore list' % devices)
+    return ranges
+
+
+def _remove_all():
+    """
+    Empty the blacklist, passing "all" to /proc/cio_ignore or cio_ignore
+    as is. Any other devices given along with it are removed as well.
+    :return: sorted list of the cio_ranges.DeviceRange which were in the
+             ignore list
+    :raises: OperationFailed if the ignore list can't be emptied
+    """
+    ranges = ignore_index.get().ranges
+    error = _free_devices(cio_ranges.ALL_DEVICES)
+    if error is not None:
+        raise OperationFailed('GS390XIOIG002E',
+                              {'failed_devices':
+                               {cio_ranges.ALL_DEVICES: error}})
+    wok_log.info('Successfully removed all devices from ignore list')
+    return ranges
+
+
+def _get_present_devices(ranges):
+    """
+    :param ranges: sorted list of cio_ranges.DeviceRange
+    :return: sorted list of the parts of ranges present in sysfs
+    """
+    present = []
+    for device in os.listdir(ccw_devices_dir):
+        try:
+            device_id = cio_ranges.parse_device_id(device)
+        except ValueError:
+            continue
+        present.append(cio_ranges.DeviceRange(device_id, device_id))
+
+    index = cio_ranges.RangeIndex(present)
+    return [part for device_range in ranges
+            for part in index.intersect(device_range)]
+
+
+def _settle(ranges):
+    """
+    Wait until the devices removed from the ignore list are registered.
+    The channel subsystem is asked to settle through /proc/cio_settle,
+    after which devices which are not present don't exist. Without it,
+    the devices are checked again on each uevent until all are present
+    or cio_settle_timeout passed.
+    :param ranges: sorted list of the removed cio_ranges.DeviceRange
+    :return: (ready, missing) tuple of the lists of merged ranges of the
+             present and of the missing devices
+    """
+    total = sum(map(cio_ranges.range_size, ranges))
+    present = [[]]
+
+    def all_present():
+        present[0] = _get_present_devices(ranges)
+        return sum(map(cio_ranges.range_size, present[0])) == total
+
+    try:
+        cio_proc.settle()
+        all_present()
+    except (IOError, OSError) as e:
+        wok_log.warning('Unable to write %s, waiting for uevents instead. '
+                        '%s' % (cio_proc.cio_settle_path, e))
+        uevent.wait_until(all_present, config["cio_settle_timeout"])
+
+    missing = cio_ranges.difference(ranges, present[0])
+    return (map(cio_ranges.format_range, present[0]),
+            map(cio_ranges.format_range, missing))
+
+
+def _use_proc():
+    return config["cio_ignore_from_proc"]
+
+
+def _get_ignored_devices():
+    """
+    Read the ignore list from /proc/cio_ignore if enabled, otherwise or
+    if it can't be read, run 'cio_ignore -l'
+    :return: list of device ids and ranges of device ids
+    """
+    if _use_proc():
+        try:
+            return cio_proc.read_ignored()
+        except (IOError, OSError) as e:
+            wok_log.warning('Unable to read %s, running cio_ignore instead. '
+                            '%s' % (cio_proc.cio_ignore_path, e))
+
+    command = [CIO_IGNORE, '-l']
+    out, err, rc = run_command(command)
+    if rc:
+        wok_log.error('failed to retrieve ignore list '
+                      'using \'cio_ignore -l\'. Error: %s' % err.strip())
+        raise OperationFailed('GS390XIOIG001E', {'error': err.strip()})
+    return _parse_ignore_output(out)
+
+
+def _free_devices(devices):
+    """
+    Remove devices from the ignore list by writing to /proc/cio_ignore if
+    enabled, otherwise or if it can't be written, using 'cio_ignore -r'
+    :param devices: comma separated device ids and ranges of device ids
+    :return: error message or None on success
+    """
+    if _use_proc():
+        try:
+            cio_proc.free(devices)
+            return None
+        except (IOError, OSError) as e:
+            if e.errno == errno.EINVAL:
+                wok_log.error('failed to remove device(s): %s, from ignore '
+                              'list. Error: %s' % (devices, e))
+                return 'Invalid device ID or range'
+            wok_log.warning('Unable to write %s, running cio_ignore '
+                            'instead. %s' % (cio_proc.cio_ignore_path, e))
+
+    command = [CIO_IGNORE, '-r', devices]
+    out, err, rc = run_command(command)
+    if rc:
+        wok_log.error('failed to remove device(s): %s, from ignore list. '
+                      'Error: %s' % (devices, err.strip()))
+        return err.strip().split(':')[-1].strip()
+    return None
+
+
+def _batch_ranges(ranges):
+    """
+    Split the ranges into batches fitting in a single write to
+    /proc/cio_ignore
+    :param ranges: list of cio_ranges.DeviceRange
+    :return: list of lists of ranges formatted as cio_ignore expects them
+    """
+    batches = []
+    length = 0
+    for device_range in ranges:
+        devices = cio_ranges.format_range(device_range)
+        if not batches or length + len(devices) + 1 > MAX_DEVICES_ARG:
+            batches.append([])
+            length = 0
+        batches[-1].append(devices)
+        length += len(devices) + 1
+    return batches
+
+
+def _remove_ranges(ranges):
+    """
+    Remove the ranges of device ids from the ignore list at once. If it
+    fails, the ranges are removed one by one to find the failing ones.
+    :param ranges: list of device ids or ranges of device ids
+    :return: dictionary of the ranges failed to be removed -> error
+    """
+    error = _free_devices(','.join(ranges))
+    if error is None:
+        return {}
+    if len(ranges) == 1:
+        return {ranges[0]: error}
+
+    failed = {}
+    for devices in ranges:
+        failed.update(_remove_ranges([devices]))
+    return failed
+
+
 def _parse_ignore_output(cmd_out):
     """
     method to parse 'cio_ignore -l' output
@@ -0,0 +1,85 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import os
+import re
+
+from collections import namedtuple
+
+css_dir = '/sys/bus/css/devices/'
+
+CCWDevice = namedtuple('CCWDevice', ['device', 'subchannel', 'devtype',
+                                     'cutype', 'online', 'pim', 'pam', 'pom',
+                                     'chpids'])
+
+DEVICE_PATTERN = re.compile(r'^\d\.\d\.[0-9a-f]{4}$')
+
+
+def _read_attr(path):
+    with open(path) as attr_file:
+        return attr_file.readline().strip()
+
+
+def _read_subchannel(subchannel, wanted=None):
+    """
+    Read the I/O subchannel and the ccw device attached to it
+    :param subchannel: subchannel id, e.g. '0.0.0000'
+    :param wanted: set of the device ids to be read, None for all
+    :return: CCWDevice or None if there is no ccw device on the subchannel
+             or it is not wanted
+    :raises: IOError, OSError if the subchannel is no I/O subchannel or
+             went away while reading it
+    """
+    sch_dir = css_dir + subchannel + '/'
+    devices = [entry for entry in os.listdir(sch_dir)
+               if DEVICE_PATTERN.match(entry)]
+    if not devices or (wanted is not None and devices[0] not in wanted):
+        return None
+
+    # e.g. pimpampom is '80 80 ff' and chpids is '10 00 00 00 00 00 00 00'
+    pim, pam, pom = _read_attr(sch_dir + 'pimpampom').split()
+    chpids = _read_attr(sch_dir + 'chpids').split()
+    dev_dir = sch_dir + devices[0] + '/'
+    return CCWDevice(devices[0], subchannel,
+                     _read_attr(dev_dir + 'devtype'),
+                     _read_attr(dev_dir + 'cutype'),
+                     _read_attr(dev_dir + 'online') == '1',
+                     pim, pam, pom, chpids)
+
+
+def read_devices(wanted=None):
+    """
+    Collect the same data as 'lscss' does, straight from sysfs
+    :param wanted: set of the device ids to be read, None for all. The
+                   attributes of other devices are not read at all.
+    :return: dictionary of device id -> CCWDevice
+    :raises: OSError if the channel subsystem can't be read
+    """
+    devices = {}
+    for subchannel in os.listdir(css_dir):
+        try:
+            ccw_device = _read_subchannel(subchannel, wanted)
+        except (IOError, OSError, ValueError):
+            # Not an I/O subchannel, e.g. a CHSC subchannel has no paths,
+            # or it got removed in the meanwhile
+            continue
+
+        if ccw_device:
+            devices[ccw_device.device] = ccw_device
+    return devices
@@ -21,6 +21,7 @@
 import utils
 
 from wok.exception import (InvalidOperation,
+                           InvalidParameter,
                            MissingParameter,
                            NotFoundError,
                            OperationFailed
@@ -110,13 +111,104 @@ class FCLUNsModel(object):
         lun_path = hbaId + ":" + wwpn + ":" + lunId
         return lun_path
 
-    def get_list(self):
+    def get_list(self, _hbaId=None, _remoteWwpn=None, _configured=None,
+                 _type=None, _vendor=None, _offset=None, _limit=None):
+        """
+        :param _hbaId: List only the LUNs of the given HBA adapter
+        :param _remoteWwpn: List only the LUNs of the given remote port
+        :param _configured: 'true' lists only the LUNs added to the
+        system, 'false' only the discovered ones which are not added yet
+        :param _type: List only the LUNs of given type, e.g. 'disk'
+        :param _vendor: List only the LUNs of given vendor, e.g. 'IBM'
+        :param _offset: Number of matching LUNs to skip
+        :param _limit: Maximum number of LUNs to return
+        :return: List of dictionaries with the details of the LUNs
+        """
+        if _configured in ['True', 'true']:
+            configured = True
+        elif _configured in ['False', 'false']:
+            configured = False
+        elif _configured is None:
+            configured = None
+        else:
+            wok_log.error("Invalid _configured given. _configured: %s"
+                          % _configured)
+            raise InvalidParameter("GS390XINVTYPE",
+                                   {'supported_type': 'True/False'})
+
+        offset = _get_count('_offset', _offset, 0)
+        limit = _get_count('_limit', _limit, None)
+
         try:
-            return utils.get_luns()
+            luns = utils.lun_inventory.get()
         except OperationFailed as e:
             wok_log.error("Fetching list of LUNs failed")
             raise OperationFailed("GS390XSTG00007", {'err': e})
 
+        # Filters which need no more than the LUN path or sysfs go first,
+        # so that only the remaining LUNs have to be inquired
+        lun_paths = []
+        for lun in luns:
+            adapter, port, lun_id = lun.split(':')
+            if _hbaId is not None and adapter != _hbaId:
+                continue
+            if _remoteWwpn is not None and port != _remoteWwpn:
+                continue
+            if configured is not None and \
+                    configured != utils.is_lun_configured(adapter, port,
+                                                          lun_id):
+                continue
+            lun_paths.append((adapter, port, lun_id))
+
+        inquiry_filter = _type is not None or _vendor is not None
+        if not inquiry_filter:
+            lun_paths = _paginate(lun_paths, offset, limit)
+
+        luns_info = utils.lun_inventory.get_info(lun_paths)
+
+        if inquiry_filter:
+            luns_info = _paginate(
+                [lun_info for lun_info in luns_info
+                 if (_type is None or lun_info.get('type') == _type) and
+                 (_vendor is None or lun_info.get('vendor') == _vendor)],
+                offset, limit)
+
+        return luns_info
+
+
+class FCLUNsBulkModel(object):
+    """
+    Model adding or removing many FC LUNs at once
+    """
+
+    def __init__(self, **kargs):
+        self.objstore = kargs.get('objstore')
+        self.task = TaskModel(**kargs)
+
+    def add(self, name, luns):
+        """
+        Add the given LUNs and persist them with a single update of
+        /etc/zfcp.conf
+        :param luns: List of dictionaries having hbaId, remoteWwpn, lunId
+        :return: task json
+        """
+        lun_paths = _validate_luns(luns)
+        taskid = add_task('/plugins/gingers390x/fcluns/bulk/add',
+                          utils.add_luns, self.objstore, lun_paths)
+        return self.task.lookup(taskid)
+
+    def remove(self, name, luns):
+        """
+        Remove the given LUNs and unpersist them with a single update of
+        /etc/zfcp.conf
+        :param luns: List of dictionaries having hbaId, remoteWwpn, lunId
+        :return: task json
+        """
+        lun_paths = _validate_luns(luns)
+        taskid = add_task('/plugins/gingers390x/fcluns/bulk/remove',
+                          utils.remove_luns, self.objstore, lun_paths)
+        return self.task.lookup(taskid)
+
 
 class FCLUNModel(object):
     """
@@ -142,3 +234,65 @@ class FCLUNModel(object):
 
         path_components = utils.validate_lun_path(path)
         utils.remove_lun(*path_components)
+
+
+def _get_count(name, value, default):
+    """
+    Convert the value of a pagination parameter
+    :param name: name of the parameter, for the error message
+    :param value: value of the parameter as given in the query string
+    :param default: value to be used if the parameter is not given
+    :return: non negative integer or default
+    """
+    if value is None:
+        return default
+
+    try:
+        count = int(value)
+    except ValueError:
+        count = -1
+
+    if count < 0:
+        wok_log.error("Invalid %s given. %s: %s" % (name, name, value))
+        raise InvalidParameter("GS390XINVINPUT",
+                               {'reason': '%s has to be a non negative '
+                                          'integer' % name})
+    return count
+
+
+def _paginate(items, offset, limit):
+    if limit is None:
+        return items[offset:]
+    return items[offset:offset + limit]
+
+
+def _validate_luns(luns):
+    """
+    Validate the LUNs given to a bulk action
+    :param luns: List of dictionaries having hbaId, remoteWwpn, lunId
+    :return: List of (hbaId, remoteWwpn, lunId) tuples
+    """
+    if utils.is_lun_scan_enabled()['current']:
+        wok_log.error(
+            "Lun scan is enabled. Cannot add/remove LUNs manually.")
+        raise InvalidOperation("GS390XSTG00009")
+
+    if not isinstance(luns, list):
+        wok_log.error('Input is not of type list. Input: %s' % luns)
+        raise InvalidParameter("GS390XSTG00020")
+
+    lun_paths = []
+    for lun in luns:
+        if not isinstance(lun, dict) or \
+                not all(key in lun for key in ['hbaId', 'remoteWwpn',
+                                               'lunId']):
+            wok_log.error('Invalid LUN given. LUN: %s' % lun)
+            raise InvalidParameter("GS390XSTG00020")
+
+        utils.validate_hba_id(lun['hbaId'])
+        utils.validate_wwpn_or_lun(lun['remoteWwpn'])
+        utils.validate_wwpn_or_lun(lun['lunId'])
+        lun_paths.append((str(lun['hbaId']), str(lun['remoteWwpn']),
+                          str(lun['lunId'])))
+
+    return lun_paths
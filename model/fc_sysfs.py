@@ -0,0 +1,200 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import os
+
+from collections import namedtuple
+from wok.utils import wok_log
+
+sg_dir = "/sys/class/scsi_generic/"
+
+SGDevice = namedtuple('SGDevice', ['name', 'hba_id', 'wwpn', 'fcp_lun'])
+
+
+def _read_attr(sg_dev, attr):
+    """
+    Read a single sysfs attribute of the given sg device
+    :param sg_dev: name of the sg device, e.g. 'sg0'
+    :param attr: attribute under <sg_dev>/device/, e.g. 'wwpn'
+    :return: attribute value with trailing whitespace removed
+    """
+    with open(sg_dir + sg_dev + '/device/' + attr) as attr_file:
+        return attr_file.readline().rstrip()
+
+
+def sg_identity(sg_dev):
+    """
+    :param sg_dev: name of the sg device
+    :return: inode of the sysfs directory of the sg device, which changes
+             when the device gets re-created under the same name, or None
+             if the sg device does not exist
+    """
+    try:
+        return os.stat(sg_dir + sg_dev).st_ino
+    except OSError:
+        return None
+
+
+def _read_sg_device(sg_dev):
+    """
+    Read the FC attributes of a sg device
+    :param sg_dev: name of the sg device
+    :return: SGDevice or None if the device is not FC attached or
+             went away while reading it
+    """
+    try:
+        return SGDevice(sg_dev,
+                        _read_attr(sg_dev, 'hba_id'),
+                        _read_attr(sg_dev, 'wwpn'),
+                        _read_attr(sg_dev, 'fcp_lun'))
+    except (IOError, OSError):
+        # Either the transport is not FC (no wwpn attribute) or the
+        # device got removed in the meanwhile. Both are not of interest.
+        return None
+
+
+class SGSnapshot(object):
+    """
+    In-memory index of the FC sg devices found in sysfs. The sysfs tree
+    is walked once and the devices are indexed by name, by their
+    (hba_id, wwpn, fcp_lun) path and by remote port.
+    """
+
+    def __init__(self):
+        self.by_name = {}
+        self.by_path = {}
+        self.by_port = {}
+        # sg devices which are not FC attached, not to be read again
+        self.skipped = set()
+        # sg device name -> sg_identity() of the known and skipped ones
+        self.identities = {}
+
+    def add(self, sg_device):
+        self.by_name[sg_device.name] = sg_device
+        self.by_path[(sg_device.hba_id, sg_device.wwpn,
+                      sg_device.fcp_lun)] = sg_device
+        port_luns = self.by_port.setdefault(
+            (sg_device.hba_id, sg_device.wwpn), {})
+        port_luns[sg_device.fcp_lun] = sg_device.name
+
+    def remove(self, sg_dev):
+        sg_device = self.by_name.pop(sg_dev, None)
+        if not sg_device:
+            return None
+
+        path = (sg_device.hba_id, sg_device.wwpn, sg_device.fcp_lun)
+        if self.by_path.get(path) == sg_device:
+            del self.by_path[path]
+
+        port = (sg_device.hba_id, sg_device.wwpn)
+        port_luns = self.by_port.get(port, {})
+        if port_luns.get(sg_device.fcp_lun) == sg_dev:
+            del port_luns[sg_device.fcp_lun]
+        if not port_luns:
+            self.by_port.pop(port, None)
+
+        return sg_device
+
+    def names(self):
+        """
+        :return: List of names of all FC sg devices in the snapshot
+        """
+        return self.by_name.keys()
+
+    def devices(self):
+        """
+        :return: List of SGDevice entries in the snapshot
+        """
+        return self.by_name.values()
+
+    def ports(self):
+        """
+        :return: List of (hba_id, wwpn) tuples having at least one sg device
+        """
+        return self.by_port.keys()
+
+    def port_luns(self, hba_id, wwpn):
+        """
+        :return: Dictionary of fcp_lun -> sg device name for the given port
+        """
+        return dict(self.by_port.get((hba_id, wwpn), {}))
+
+    def lookup(self, hba_id, wwpn, fcp_lun):
+        """
+        Find the sg device for the given LUN path
+        :return: name of the sg device or '' if there is none
+        """
+        sg_device = self.by_path.get((hba_id, wwpn, fcp_lun))
+        if sg_device:
+            return sg_device.name
+        return ''
+
+    def refresh(self):
+        """
+        Bring the snapshot up to date with sysfs. Only the attributes of
+        sg devices which were not known before or got re-created under the
+        same name are read, vanished ones are dropped.
+        :return: Set of (hba_id, wwpn) ports whose sg devices changed
+        """
+        changed = set()
+        try:
+            current = set(os.listdir(sg_dir))
+        except OSError:
+            wok_log.error("Unable to list sg devices in %s", sg_dir)
+            return changed
+
+        def forget(sg_dev):
+            sg_device = self.remove(sg_dev)
+            if sg_device:
+                changed.add((sg_device.hba_id, sg_device.wwpn))
+            self.skipped.discard(sg_dev)
+            self.identities.pop(sg_dev, None)
+
+        for sg_dev in set(self.identities) - current:
+            forget(sg_dev)
+
+        for sg_dev in current:
+            identity = sg_identity(sg_dev)
+            if identity is not None and \
+                    self.identities.get(sg_dev) == identity:
+                continue
+
+            forget(sg_dev)
+            if identity is None:
+                # went away meanwhile
+                continue
+            self.identities[sg_dev] = identity
+            sg_device = _read_sg_device(sg_dev)
+            if sg_device:
+                self.add(sg_device)
+                changed.add((sg_device.hba_id, sg_device.wwpn))
+            else:
+                self.skipped.add(sg_dev)
+
+        return changed
+
+
+def take_snapshot():
+    """
+    Walk /sys/class/scsi_generic once and index all FC sg devices
+    :return: SGSnapshot
+    """
+    snapshot = SGSnapshot()
+    snapshot.refresh()
+    return snapshot
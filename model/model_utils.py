@@ -18,9 +18,15 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 #
 import glob
+import itertools
+import Queue
 import re
+import subprocess
+import tempfile
+import threading
+import time
 
-from wok.exception import OperationFailed
+from wok.exception import OperationFailed, TimeoutExpired
 from wok.utils import wok_log
 
 
@@ -58,6 +64,167 @@ def get_dirname(path):
         return None
 
 
+class TableParser(object):
+    """
+    Parser of the tables printed by commands like lscss and znetconf. The
+    header and value patterns are compiled once, the column names are
+    taken from each distinct header line once and rows are matched in a
+    single pass, lazily.
+    """
+
+    # distinct header lines remembered, commands print very few of them
+    MAX_HEADERS = 16
+
+    def __init__(self, hdr_pattern, val_pattern):
+        """
+        :param hdr_pattern: pattern of the header line, having a group for
+                            each column name
+        :param val_pattern: pattern of a row, having a group for each value
+        """
+        self.hdr_pattern = re.compile(hdr_pattern, re.M | re.I)
+        self.val_pattern = re.compile(val_pattern, re.M | re.I)
+        self.lock = threading.Lock()
+        # header line -> (matched header, column names)
+        self.headers = {}
+
+    def _search_header(self, line):
+        """
+        :return: (matched header, column names) tuple or None if the line
+                 is no header
+        """
+        with self.lock:
+            columns = self.headers.get(line)
+        if columns is None:
+            header = self.hdr_pattern.search(line)
+            if header is None or not header.group():
+                return None
+            columns = (header.group(), header.groups())
+            with self.lock:
+                if len(self.headers) >= self.MAX_HEADERS:
+                    self.headers.clear()
+                self.headers[line] = columns
+        return columns
+
+    def _parse_header(self, line):
+        columns = self._search_header(line)
+        if columns is None:
+            _header_error()
+        return columns
+
+    def _to_row(self, columns, value):
+        """
+        :param value: match of the value pattern
+        :return: dictionary of column name -> value or None if the match
+                 is no row of the table
+        """
+        header, names = columns
+        if value.group() != header:
+            values = value.groups()
+            if len(values) == len(names):
+                return dict(itertools.izip(names, values))
+        return None
+
+    def iter_rows(self, cmd_output, hdr_index=0, val_start_index=2):
+        """
+        :param cmd_output: command output
+        :param hdr_index: index of the header line
+        :param val_start_index: index of the first row
+        :return: iterator of dictionaries of column name -> value, one for
+                 each row matching the value pattern
+        :raises: OperationFailed if the header doesn't match
+        """
+        return self.iter_line_rows(cmd_output.strip().split("\n"),
+                                   hdr_index, val_start_index)
+
+    def iter_line_rows(self, lines, hdr_index=0, val_start_index=2,
+                       keep=None):
+        """
+        Same as iter_rows() for output which is still being read, e.g.
+        from run_command_lines()
+        :param lines: iterable of the lines of the command output
+        :param hdr_index: index of the header line
+        :param val_start_index: index of the first row
+        :param keep: callable taking a line and returning False for rows to
+                     be skipped without matching them, None to keep all
+        :return: iterator of dictionaries of column name -> value
+        :raises: OperationFailed if the header doesn't match
+        """
+        lines = iter(lines)
+        header = next(itertools.islice(lines, hdr_index, None), '')
+        columns = self._parse_header(header)
+        lines = itertools.islice(lines, val_start_index - hdr_index - 1,
+                                 None)
+        if keep is not None:
+            lines = itertools.ifilter(keep, lines)
+        search = self.val_pattern.search
+
+        def rows():
+            for line in lines:
+                value = search(line)
+                if value:
+                    row = self._to_row(columns, value)
+                    if row is not None:
+                        yield row
+        return rows()
+
+    def find_row(self, cmd_output, condition=None):
+        """
+        :param cmd_output: command output, the header line may be anywhere
+        :param condition: callable taking a row dictionary and returning
+                          True for the row looked for, None to take the
+                          first line matching the value pattern
+        :return: dictionary of column name -> value or {} if there is no
+                 such row
+        :raises: OperationFailed if there is no header
+        """
+        lines = cmd_output.split("\n")
+        for line in lines:
+            columns = self._search_header(line)
+            if columns is not None:
+                break
+        else:
+            _header_error()
+
+        for line in lines:
+            value = self.val_pattern.search(line)
+            if not value:
+                continue
+            row = self._to_row(columns, value)
+            if condition is None:
+                return row or {}
+            if row is not None and condition(row):
+                return row
+        return {}
+
+
+def _header_error():
+    wok_log.error("header is empty for given pattern")
+    raise OperationFailed("GS390XREG0001E",
+                          {'reason': "header is empty for given pattern"})
+
+
+# (header pattern, value pattern) -> TableParser
+_table_parsers = {}
+_table_parsers_lock = threading.Lock()
+MAX_TABLE_PARSERS = 64
+
+
+def get_table_parser(hdr_pattern, val_pattern):
+    """
+    :return: TableParser for the patterns, shared by all callers passing
+             the same patterns
+    """
+    key = (hdr_pattern, val_pattern)
+    with _table_parsers_lock:
+        parser = _table_parsers.get(key)
+        if parser is None:
+            if len(_table_parsers) >= MAX_TABLE_PARSERS:
+                _table_parsers.clear()
+            parser = TableParser(hdr_pattern, val_pattern)
+            _table_parsers[key] = parser
+        return parser
+
+
 def get_row_data(command_output, header_pattern, value_pattern):
     """
     return a dictionary for particular row, in which row is
@@ -89,19 +256,8 @@ def get_row_data(command_output, header_pattern, value_pattern):
                 "POM": "ff", "CHPIDs": "b0b10d00 00000000"
     }, the first match to the value_pattern
     """
-    header = re.search(header_pattern, command_output, re.M | re.I)
-    value = re.search(value_pattern, command_output, re.M | re.I)
-    row_data = {}
-    if header is None or not header.group():
-        wok_log.error("header is empty for given pattern")
-        raise OperationFailed("GS390XREG0001E",
-                              {'reason': "header is empty for given pattern"})
-    elif value:
-        if (header.group() != value.group()) and \
-                (len(header.groups()) == len(value.groups())):
-                for cnt in range(1, len(header.groups())+1):
-                    row_data[header.group(cnt)] = value.group(cnt)
-    return row_data
+    return get_table_parser(header_pattern, value_pattern).find_row(
+        command_output)
 
 
 def get_rows_info(cmd_output, hdr_pattern, val_pattern, unique_col=None,
@@ -154,43 +310,158 @@ def get_rows_info(cmd_output, hdr_pattern, val_pattern, unique_col=None,
      ]depending on format_data
 
     """
-    command_out = cmd_output.strip().split("\n")
-    header = re.search(hdr_pattern, command_out[hdr_index], re.M | re.I)
-    if header is None or not header.group():
-        wok_log.error("header is empty for given pattern")
-        raise OperationFailed("GS390XREG0001E",
-                              {'reason': "header is empty for given pattern"})
+    rows = get_table_parser(hdr_pattern, val_pattern).iter_rows(
+        cmd_output, hdr_index, val_start_index)
+    return collect_rows(rows, unique_col, format_data)
+
+
+def collect_rows(rows, unique_col=None, format_data=None):
+    """
+    :param rows: iterable of row dictionaries, see TableParser.iter_rows()
+    :param unique_col: key/col name for which value in each row is unique
+    :param format_data: Callback function to format each row dictionary.
+    :return: dictionary of the unique_col value -> row if unique_col is
+             not None, list of the rows otherwise, see get_rows_info()
+    """
     if unique_col is not None:
         devices = {}
     else:
         devices = []
 
-    value_pattern = re.compile(val_pattern, re.M | re.I)
-
-    for row in command_out[val_start_index:]:
-        value = re.search(value_pattern, row)
-        row_data = {}
-        if value:
-            if (header.group() != value.group()) and \
-                    (len(header.groups()) == len(value.groups())):
-                for cnt in range(1, len(header.groups())+1):
-                    row_data[header.group(cnt)] = value.group(cnt)
-
-                # Get the unique_col value if not return None,
-                # as format_data might does pop
-                if unique_col:
-                    key = row_data.get(unique_col)
-
-                # format the row data if callback format function is not None
-                if format_data:
-                    row_data = format_data(row_data)
-
-                # If unique col then return dictionary of dictionary
-                # else return list of dictionary
-                if unique_col:
-                    if not key:
-                        key = row_data[unique_col]
-                    devices[key] = row_data
-                else:
-                    devices.append(row_data)
+    for row_data in rows:
+        # Get the unique_col value if not return None,
+        # as format_data might does pop
+        if unique_col:
+            key = row_data.get(unique_col)
+
+        # format the row data if callback format function is not None
+        if format_data:
+            row_data = format_data(row_data)
+
+        # If unique col then return dictionary of dictionary
+        # else return list of dictionary
+        if unique_col:
+            if not key:
+                key = row_data[unique_col]
+            devices[key] = row_data
+        else:
+            devices.append(row_data)
     return devices
+
+
+def run_command_lines(cmd):
+    """
+    Run a command and yield the lines of its output while it is running,
+    rather than buffering the whole output like run_command() does
+    :param cmd: command to be run, as a list
+    :return: iterator of the output lines, without the line ends
+    :raises: OperationFailed if the command can't be run or exits with a
+             non-zero return code, once all the lines were read
+    """
+    # stderr goes to a file, so a chatty command can't block on a full
+    # pipe while only stdout is read
+    with tempfile.TemporaryFile() as err_file:
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                    stderr=err_file, close_fds=True)
+        except OSError as e:
+            wok_log.error('Unable to run "%s": %s' % (cmd, e))
+            raise OperationFailed("GS390XCMD0001E",
+                                  {'command': cmd, 'rc': e.errno,
+                                   'reason': e.strerror})
+        done = False
+        try:
+            for line in iter(proc.stdout.readline, ''):
+                yield line.rstrip('\n')
+            done = True
+        finally:
+            proc.stdout.close()
+            if not done and proc.poll() is None:
+                # the caller stopped reading early
+                proc.kill()
+            rc = proc.wait()
+        if rc:
+            err_file.seek(0)
+            err = err_file.read().strip()
+            wok_log.error('"%s" failed with rc %s: %s' % (cmd, rc, err))
+            raise OperationFailed("GS390XCMD0001E",
+                                  {'command': cmd, 'rc': rc, 'reason': err})
+
+
+def run_in_pool(func, items, workers, timeout=None):
+    """
+    Call func for each of the items using at most 'workers' threads.
+    An item not processed within timeout seconds since it started is
+    reported as failed. Its thread is left behind to finish in background
+    and a new thread takes over the remaining items, so that a hung item
+    does not hold up the items queued after it.
+
+    :param func: callable taking a single item as parameter
+    :param items: list of items to be processed
+    :param workers: maximum number of items processed concurrently
+    :param timeout: time in seconds a single item may take, None to wait
+                    for all items to finish
+    :return: list of (result, error) tuples in the order of items, where
+             error is None or the exception raised while processing the item
+    """
+    results = [None] * len(items)
+    pending = Queue.Queue()
+    for index, item in enumerate(items):
+        pending.put((index, item))
+    changed = threading.Condition()
+    # index -> start time of the items being processed
+    running = {}
+    remaining = [len(items)]
+
+    def worker():
+        while True:
+            try:
+                index, item = pending.get_nowait()
+            except Queue.Empty:
+                return
+            with changed:
+                running[index] = time.time()
+                changed.notify_all()
+            try:
+                result = (func(item), None)
+            except Exception as e:
+                result = (None, e)
+            with changed:
+                if index not in running:
+                    # timed out, another thread took over
+                    return
+                del running[index]
+                results[index] = result
+                remaining[0] -= 1
+                changed.notify_all()
+
+    def start_worker():
+        thread = threading.Thread(target=worker)
+        thread.setDaemon(True)
+        thread.start()
+
+    for _ in range(max(1, min(workers, len(items)))):
+        start_worker()
+
+    with changed:
+        while remaining[0]:
+            wait = None
+            if timeout is not None:
+                now = time.time()
+                for index, started in running.items():
+                    if now - started < timeout:
+                        left = started + timeout - now
+                        wait = left if wait is None else min(wait, left)
+                        continue
+                    wok_log.error("Processing %s did not finish within %s "
+                                  "seconds", items[index], timeout)
+                    del running[index]
+                    results[index] = (None, TimeoutExpired(
+                        "GS390XPOOL001E", {'item': items[index],
+                                           'seconds': timeout}))
+                    remaining[0] -= 1
+                    start_worker()
+                if not remaining[0]:
+                    break
+            changed.wait(wait)
+    return results
@@ -18,12 +18,19 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
 import augeas
+import copy
 import os
 import re
+import threading
+import time
 
 import model_utils as utils
+import persistence
+import qeth_sysfs
+import uevent
 from wok.exception import InvalidParameter, OperationFailed
 from wok.model.tasks import TaskModel
+from wok.plugins.gingers390x.config import config
 from wok.rollbackcontext import RollbackContext
 from wok.utils import add_task, run_command, wok_log
 
@@ -59,6 +66,24 @@ CONF_HDR_PATTERN = r'('+re.escape(ZNETCONF_DEV_IDS) + r')\s+' \
                    r'('+re.escape(ZNETCONF_DEV_NAME) + r')\s+' \
                    r'('+re.escape(ZNETCONF_STATE) + r')\s+$'
 
+CONF_DEVICE_PATTERN = r'(\d\.\d\.[0-9a-fA-F]{4},' \
+                      r'\d\.\d\.[0-9a-fA-F]{4},' \
+                      r'\d\.\d\.[0-9a-fA-F]{4})\s+' \
+                      r'(\w+\/\w+)\s+' \
+                      r'(\w+)\s+' \
+                      r'([0-9a-fA-F]{2})\s+' \
+                      r'(qeth)\s+' \
+                      r'(\w+\d\.\d\.[0-9a-fA-F]{4})\s+' \
+                      r'(\w+)\s{0,}$'
+
+UNCONF_DEVICE_PATTERN = r'(\d\.\d\.[0-9a-fA-F]{4},' \
+                        r'\d\.\d\.[0-9a-fA-F]{4},' \
+                        r'\d\.\d\.[0-9a-fA-F]{4})\s+' \
+                        r'(\w+\/\w+)\s+' \
+                        r'(OSA\s+\(\w+\))\s+' \
+                        r'([0-9a-fA-F]{2})\s+' \
+                        r'(qeth)\s{0,}$'
+
 
 class NetworkDevicesModel(object):
     def __init__(self, **kargs):
@@ -76,12 +101,11 @@ class NetworkDevicesModel(object):
         wok_log.info('Fetching network devices. _configured '
                      '= %s' % _configured)
         if _configured is None:
-            devices = _get_configured_devices()
-            devices.extend(_get_unconfigured_devices())
+            devices = nw_inventory.get_list()
         elif _configured in ['True', 'true']:
-            devices = _get_configured_devices()
+            devices = nw_inventory.get_list(configured=True)
         elif _configured in ['False', 'false']:
-            devices = _get_unconfigured_devices()
+            devices = nw_inventory.get_list(configured=False)
         else:
             wok_log.error("Invalid _configured given. _configured: %s"
                           % _configured)
@@ -98,26 +122,15 @@ class NetworkDeviceModel(object):
 
     def lookup(self, name):
         """
-        Gets list of all configured device info(dictionary) devices
-        with name of device as key.
-        If the list has the device lookup is looking for then returns
-        the device info.
-        Otherwise gets list of all un-configured device info devices
-        with name of device as key.
-        If the list has the device lookup is looking for then returns
-        the device info.
+        Looks up the device in the inventory of configured and
+        un-configured devices and returns the device info.
         Otherwise raises InvalidParameter exception.
         :param name: name of device to lookup.
         :return: OSA device info if device found otherwise InvalidParameter
         """
         wok_log.info('Fetching attributes of network devices %s' % name)
         _validate_device(name)
-        configured_devices = _get_configured_devices(key=UNIQUE_COL_NAME)
-        device = configured_devices.get(name, None)
-        if not device:
-            unconfigured_devices = _get_unconfigured_devices(
-                key=UNIQUE_COL_NAME)
-            device = unconfigured_devices.get(name, None)
+        device = nw_inventory.lookup(name)
         if not device:
             wok_log.error('Given device is not of type OSA. Device: %s', name)
             raise InvalidParameter("GS390XINVINPUT",
@@ -161,6 +174,238 @@ class NetworkDeviceModel(object):
         return self.task.lookup(taskid)
 
 
+class NetworkDevicesBulkModel(object):
+    """
+    Model configuring or un-configuring many network devices at once
+    """
+    def __init__(self, **kargs):
+        self.objstore = kargs.get('objstore')
+        self.task = TaskModel(**kargs)
+
+    def configure(self, name, devices):
+        """
+        Configure the given network devices and persist them with a single
+        augeas session
+        :param devices: list of network device ids or interface names
+        :return: task json
+        """
+        devices = _validate_devices(devices)
+        wok_log.info('Configuring network devices %s' % devices)
+        taskid = add_task('/plugins/gingers390x/nwdevices/bulk/configure',
+                          _configure_interfaces, self.objstore, devices)
+        return self.task.lookup(taskid)
+
+    def unconfigure(self, name, devices):
+        """
+        Un-configure the given network devices and unpersist them
+        :param devices: list of network device ids or interface names
+        :return: task json
+        """
+        devices = _validate_devices(devices)
+        wok_log.info('Un-configuring network devices %s' % devices)
+        taskid = add_task('/plugins/gingers390x/nwdevices/bulk/unconfigure',
+                          _unconfigure_interfaces, self.objstore, devices)
+        return self.task.lookup(taskid)
+
+
+class NetworkDeviceInventory(object):
+    """
+    Configured and un-configured OSA devices, read from sysfs or listed by
+    "znetconf -c" and "znetconf -u". The devices are kept in memory until
+    older than the TTL, a ccw or ccwgroup uevent arrives or a device got
+    configured or un-configured.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.configured = []
+        self.unconfigured = []
+        # device name -> device info
+        self.devices = {}
+        self.timestamp = 0
+        self.watching = False
+
+    def _refresh(self):
+        self.configured, self.unconfigured = _get_devices()
+        self.devices = dict((device['name'], device)
+                            for device in self.unconfigured)
+        self.devices.update((device['name'], device)
+                            for device in self.configured)
+        self.timestamp = time.time()
+
+    def _update(self):
+        """
+        Refresh the devices if expired
+        :return: True if the devices got refreshed
+        """
+        if not self.watching:
+            self.watching = True
+            uevent.watch(self.invalidate, ['ccw', 'ccwgroup'])
+        if time.time() - self.timestamp >= self.ttl:
+            self._refresh()
+            return True
+        return False
+
+    def get_list(self, configured=None):
+        """
+        :param configured: True for the configured devices only, False for
+                           the un-configured ones, None for both
+        :return: list of device info
+        """
+        with self.lock:
+            self._update()
+            if configured is None:
+                devices = self.configured + self.unconfigured
+            elif configured:
+                devices = self.configured
+            else:
+                devices = self.unconfigured
+            return copy.deepcopy(devices)
+
+    def lookup(self, name):
+        """
+        :param name: name of the device
+        :return: device info or None if there is no such OSA device, which
+                 costs at most one refresh
+        """
+        with self.lock:
+            refreshed = self._update()
+            if name not in self.devices and not refreshed:
+                self._refresh()
+            return copy.deepcopy(self.devices.get(name))
+
+    def invalidate(self):
+        with self.lock:
+            self.timestamp = 0
+
+
+nw_inventory = NetworkDeviceInventory(config["nw_device_cache_ttl"])
+
+
+class IfcfgAugeas(object):
+    """
+    Long-lived augeas handle for writing ifcfg files. Instead of parsing
+    every file of /etc with every lens, only the Shellvars lens is loaded
+    and only for the ifcfg files being written.
+    """
+
+    LENS = 'Shellvars.lns'
+    LOAD_PATH = '/augeas/load/Ifcfg'
+
+    def __init__(self, root='/'):
+        self.root = root
+        self.lock = threading.Lock()
+        self.parser = None
+
+    def _get_parser(self):
+        if self.parser is None:
+            self.parser = augeas.Augeas(
+                self.root, flags=augeas.Augeas.NO_LOAD |
+                augeas.Augeas.NO_MODL_AUTOLOAD)
+        return self.parser
+
+    def _close(self):
+        if self.parser is not None:
+            self.parser.close()
+            self.parser = None
+
+    def write(self, files):
+        """
+        Set the attributes in the ifcfg files and save them
+        :param files: dictionary of ifcfg file path relative to the root ->
+                      dictionary of attributes
+        :raises: the error of augeas, in which case the handle is dropped
+                 so that unsaved changes don't leak into the next write
+        """
+        with self.lock:
+            parser = self._get_parser()
+            try:
+                # files of the previous write are dropped from the tree
+                parser.remove(self.LOAD_PATH)
+                parser.set(self.LOAD_PATH + '/lens', self.LENS)
+                for index, path in enumerate(files, 1):
+                    parser.set(self.LOAD_PATH + '/incl[%d]' % index,
+                               '/' + path)
+                parser.load()
+                for path, params in files.iteritems():
+                    for key, value in params.iteritems():
+                        parser.set(path + '/' + key, value)
+                parser.save()
+            except Exception:
+                self._close()
+                raise
+
+
+ifcfg_augeas = IfcfgAugeas()
+
+
+def _get_devices():
+    """
+    Collect the configured and un-configured devices, from sysfs unless
+    configured otherwise. znetconf is used if sysfs can't be read.
+    :return: tuple of the list of configured and the list of un-configured
+             device info
+    """
+    if config["qeth_from_sysfs"]:
+        try:
+            return _get_sysfs_devices()
+        except (IOError, OSError) as e:
+            wok_log.warning("Unable to read the qeth devices from sysfs, "
+                            "running znetconf instead. %s" % e)
+    return _get_znetconf_devices()
+
+
+def _get_znetconf_devices():
+    """
+    Run "znetconf -c" and "znetconf -u" concurrently
+    :return: tuple of the list of configured and the list of un-configured
+             device info
+    """
+    results = utils.run_in_pool(lambda collect: collect(),
+                                [_get_configured_devices,
+                                 _get_unconfigured_devices], 2)
+    for _, error in results:
+        if error:
+            raise error
+    return tuple(devices for devices, _ in results)
+
+
+def _get_sysfs_devices():
+    """
+    Read the configured and un-configured devices from sysfs, formatted
+    the same way as the output of znetconf
+    :return: tuple of the list of configured and the list of un-configured
+             device info
+    """
+    configured = []
+    for qeth_device in qeth_sysfs.read_configured_devices():
+        device = _qeth_device_to_znetconf(qeth_device)
+        device[ZNETCONF_STATE] = 'online' if qeth_device.online \
+            else 'offline'
+        if qeth_device.if_name:
+            device[ZNETCONF_DEV_NAME] = qeth_device.if_name
+        configured.append(_format_znetconf(device))
+
+    # Only OSA card types are listed by "znetconf -u", as matched by the
+    # device pattern in _get_unconfigured_devices()
+    unconfigured = [_format_znetconf(_qeth_device_to_znetconf(qeth_device))
+                    for qeth_device in qeth_sysfs.read_unconfigured_devices()
+                    if qeth_device.card_type.startswith('OSA')]
+    return configured, unconfigured
+
+
+def _qeth_device_to_znetconf(qeth_device):
+    """
+    :return: dictionary keyed by the columns of the znetconf output
+    """
+    return {ZNETCONF_DEV_IDS: ','.join(qeth_device.device_ids),
+            ZNETCONF_TYPE: qeth_device.cutype,
+            ZNETCONF_CARDTYPE: qeth_device.card_type,
+            ZNETCONF_CHPID: qeth_device.chpid,
+            ZNETCONF_DRV: 'qeth'}
+
+
 def _get_configured_devices(key=None):
     """
     :param key: key for which value is unique
@@ -178,30 +423,20 @@ def _get_configured_devices(key=None):
                               {'command': cmd,
                                'rc': rc, 'reason': err})
 
-    device_pattern = r'(\d\.\d\.[0-9a-fA-F]{4},' \
-                     r'\d\.\d\.[0-9a-fA-F]{4},' \
-                     r'\d\.\d\.[0-9a-fA-F]{4})\s+' \
-                     r'(\w+\/\w+)\s+' \
-                     r'(\w+)\s+' \
-                     r'([0-9a-fA-F]{2})\s+' \
-                     r'(qeth)\s+' \
-                     r'(\w+\d\.\d\.[0-9a-fA-F]{4})\s+' \
-                     r'(\w+)\s{0,}$'
-
     wok_log.info('parsing znetconf -c output')
     if key:
         configured_devices = utils.get_rows_info(
             cmd_output=output,
             hdr_pattern=CONF_HDR_PATTERN,
             unique_col=key,
-            val_pattern=device_pattern,
+            val_pattern=CONF_DEVICE_PATTERN,
             format_data=_format_znetconf,
             hdr_index=0, val_start_index=2)
     else:
         configured_devices = utils.get_rows_info(
             cmd_output=output,
             hdr_pattern=CONF_HDR_PATTERN,
-            val_pattern=device_pattern,
+            val_pattern=CONF_DEVICE_PATTERN,
             format_data=_format_znetconf,
             hdr_index=0, val_start_index=2)
     wok_log.info('successfully retrieved and parsed configured devices')
@@ -225,28 +460,20 @@ def _get_unconfigured_devices(key=None):
         raise OperationFailed("GS390XCMD0001E",
                               {'command': cmd,
                                'rc': rc, 'reason': err})
-    device_pattern = r'(\d\.\d\.[0-9a-fA-F]{4},' \
-                     r'\d\.\d\.[0-9a-fA-F]{4},' \
-                     r'\d\.\d\.[0-9a-fA-F]{4})\s+' \
-                     r'(\w+\/\w+)\s+' \
-                     r'(OSA\s+\(\w+\))\s+' \
-                     r'([0-9a-fA-F]{2})\s+' \
-                     r'(qeth)\s{0,}$'
-
     wok_log.info('parsing znetconf -u output')
     if key:
         unconfigured_devices = utils.get_rows_info(
             cmd_output=output,
             hdr_pattern=UNCONF_HDR_PATTERN,
             unique_col=key,
-            val_pattern=device_pattern,
+            val_pattern=UNCONF_DEVICE_PATTERN,
             format_data=_format_znetconf,
             hdr_index=1, val_start_index=3)
     else:
         unconfigured_devices = utils.get_rows_info(
             cmd_output=output,
             hdr_pattern=UNCONF_HDR_PATTERN,
-            val_pattern=device_pattern,
+            val_pattern=UNCONF_DEVICE_PATTERN,
             format_data=_format_znetconf,
             hdr_index=1,
             val_start_index=3)
@@ -309,6 +536,8 @@ def _configure_interface(cb, interface):
         cb('Successfully configured network device %s' % interface, True)
     except Exception as e:
         cb(e.__str__(), False)
+    finally:
+        nw_inventory.invalidate()
 
 
 def _unconfigure_interface(cb, interface):
@@ -330,6 +559,144 @@ def _unconfigure_interface(cb, interface):
         cb('Successfully un-configured network device %s' % interface, True)
     except Exception as e:
         cb(e.__str__(), False)
+    finally:
+        nw_inventory.invalidate()
+
+
+def _configure_interfaces(cb, interfaces):
+    """
+    method to configure and persist many network devices. The devices
+    are brought online concurrently, the configured devices are read once
+    afterwards and all the ifcfg files are written in a single augeas
+    session. Rollback is performed for each device which fails.
+
+    :param interfaces: list of network device ids
+    :return: None
+    """
+    cb('')  # reset messages
+    rollbacks = dict((interface, RollbackContext())
+                     for interface in interfaces)
+    failed = {}
+    done = [0]
+    lock = threading.Lock()
+
+    def bring_online(interface):
+        if not _is_interface_online(interface):
+            _bring_online(interface)
+            rollbacks[interface].prependDefer(_bring_offline, interface)
+        ifcfg_file_path = '/' + ifcfg_path.replace('<deviceid>', interface)
+        if not os.path.isfile(ifcfg_file_path):
+            _create_ifcfg_file(interface)
+        with lock:
+            done[0] += 1
+            cb('Network device %s is online, %d of %d devices done'
+               % (interface, done[0], len(interfaces)))
+
+    try:
+        results = utils.run_in_pool(bring_online, interfaces,
+                                    config["nw_device_workers"])
+        for interface, (_, error) in zip(interfaces, results):
+            if error:
+                failed[interface] = error.__str__()
+
+        online = [interface for interface in interfaces
+                  if interface not in failed]
+        if online:
+            configured, _ = _get_devices()
+            devices = dict((device['name'], device) for device in configured)
+            device_infos = {}
+            for interface in online:
+                if ENCCW + interface in devices:
+                    device_infos[interface] = devices[ENCCW + interface]
+                else:
+                    failed[interface] = 'network device %s is not ' \
+                                        'configured' % interface
+            failed.update(_write_ifcfg_files(device_infos))
+    except Exception as e:
+        for interface in interfaces:
+            failed.setdefault(interface, e.__str__())
+    finally:
+        for interface in interfaces:
+            try:
+                # leaving the context without commit undoes the changes
+                with rollbacks[interface] as rollback:
+                    if interface not in failed:
+                        rollback.commitAll()
+            except Exception as e:
+                wok_log.error('Failed to roll back network device %s. '
+                              'Error: %s' % (interface, e.__str__()))
+        nw_inventory.invalidate()
+
+    if failed:
+        wok_log.error('Failed to configure network devices: %s' % failed)
+        cb(OperationFailed('GS390XIONW006E',
+                           {'failed_devices': failed}).__str__(), False)
+    else:
+        cb('Successfully configured network devices %s'
+           % ', '.join(interfaces), True)
+
+
+def _unconfigure_interfaces(cb, interfaces):
+    """
+    method to un-configure/remove and unpersist many network devices
+    concurrently. Rollback is performed for each device which fails.
+
+    :param interfaces: list of network device ids
+    :return: None
+    """
+    cb('')  # reset messages
+    done = [0]
+    lock = threading.Lock()
+
+    def unconfigure(interface):
+        with RollbackContext() as rollback:
+            if _is_interface_online(interface):
+                _bring_offline(interface)
+                rollback.prependDefer(_bring_online, interface)
+            _unpersist_interface(interface)
+            rollback.commitAll()
+        with lock:
+            done[0] += 1
+            cb('Network device %s is un-configured, %d of %d devices done'
+               % (interface, done[0], len(interfaces)))
+
+    try:
+        results = utils.run_in_pool(unconfigure, interfaces,
+                                    config["nw_device_workers"])
+    finally:
+        nw_inventory.invalidate()
+
+    failed = dict((interface, error.__str__())
+                  for interface, (_, error) in zip(interfaces, results)
+                  if error)
+    if failed:
+        wok_log.error('Failed to un-configure network devices: %s' % failed)
+        cb(OperationFailed('GS390XIONW007E',
+                           {'failed_devices': failed}).__str__(), False)
+    else:
+        cb('Successfully un-configured network devices %s'
+           % ', '.join(interfaces), True)
+
+
+def _validate_devices(devices):
+    """
+    validate the network devices given to a bulk action
+    :param devices: list of network device ids or interface names
+    :return: list of the device ids without duplicates
+    """
+    if not isinstance(devices, list) or not devices:
+        wok_log.error('Devices are not a list of network devices. '
+                      'Devices: %s' % devices)
+        raise InvalidParameter("GS390XINVINPUT",
+                               {'reason': 'devices must be a non-empty list '
+                                          'of network device ids'})
+    validated = []
+    for device in devices:
+        device = str(device).strip().replace(ENCCW, '')
+        _validate_device(device)
+        if device not in validated:
+            validated.append(device)
+    return validated
 
 
 def _validate_device(interface):
@@ -362,8 +729,8 @@ def _validate_device(interface):
 def _create_ifcfg_file(interface):
     """
     method to create ifcfg-enccw<device_id> file in
-    /etc/sysconfig/network-scripts/ folder and change
-    persmission of that file to 644 to be in sync with
+    /etc/sysconfig/network-scripts/ folder with
+    persmission 644 to be in sync with
     other files in directory
 
     :param interface: network device id
@@ -372,9 +739,8 @@ def _create_ifcfg_file(interface):
     wok_log.info('creating ifcfg file for %s', interface)
     ifcfg_file_path = '/' + ifcfg_path.replace('<deviceid>', interface)
     try:
-        ifcfg_file = open(ifcfg_file_path, 'w+')
-        ifcfg_file.close()
-        os.system('chmod 644 ' + ifcfg_file_path)
+        with open(ifcfg_file_path, 'w+') as ifcfg_file:
+            os.fchmod(ifcfg_file.fileno(), persistence.IFCFG_MODE)
         wok_log.info('created file %s for network device %s'
                      % (ifcfg_file_path, interface))
     except Exception as e:
@@ -474,8 +840,8 @@ def _unpersist_interface(interface):
 def _write_ifcfg_params(interface):
     """
     method to write mandatory attributes to ifcfg file
-    of corresponding network device using augeas module
-    to persist it
+    of corresponding network device using the writer
+    selected by the ifcfg_augeas option to persist it
 
     :param interface: network device id
     :return: None
@@ -484,36 +850,100 @@ def _write_ifcfg_params(interface):
                  'network device %s to persist it' % interface)
     configured_devices = _get_configured_devices(key=UNIQUE_COL_NAME)
     device_info = configured_devices[ENCCW + interface]
-    sub_channels = ','.join(device_info['device_ids'])
-    device_name = device_info['name']
-    cfgmap = {DEVICE: device_name,
-              ONBOOT: 'yes',
-              SUBCHANNELS: sub_channels,
-              NETTYPE: 'qeth'}
-    ifcfg_file_pattern = ifcfg_path.replace('<deviceid>', interface) + '/'
-    ifcfg_file_path = '/' + ifcfg_path.replace('<deviceid>', interface)
-    parser = None
+    cfgmap = _get_ifcfg_params(device_info)
+    ifcfg_file = ifcfg_path.replace('<deviceid>', interface)
+    ifcfg_file_path = '/' + ifcfg_file
     try:
-        parser = augeas.Augeas('/')
-        parser.load()
-        for key, value in cfgmap.iteritems():
-            path = ifcfg_file_pattern+key
-            parser.set(path, value)
-        parser.save()
+        _save_ifcfg_files({ifcfg_file: cfgmap})
     except Exception as e:
-        wok_log.error('Failedd to write device attributes to ifcfg file '
-                      'using augeas tool. Error: %s' % e.__str__())
+        wok_log.error('Failed to write device attributes to ifcfg file '
+                      '%s. Error: %s' % (ifcfg_file_path, e.__str__()))
         raise OperationFailed('GS390XIONW002E',
                               {'device': interface,
                                'ifcfg_file_path': ifcfg_file_path,
                                'error': e.__str__()})
-    finally:
-        if parser:
-            del parser
     wok_log.info('successfully updated mandatory params in ifcfg '
                  'file of network device %s' % interface)
 
 
+def _get_ifcfg_params(device_info):
+    """
+    :param device_info: device info of the configured network device
+    :return: dictionary of the mandatory ifcfg file attributes
+    """
+    return {DEVICE: device_info['name'],
+            ONBOOT: 'yes',
+            SUBCHANNELS: ','.join(device_info['device_ids']),
+            NETTYPE: 'qeth'}
+
+
+def _write_ifcfg_files(devices):
+    """
+    method to write the mandatory attributes to the ifcfg files of many
+    network devices, with a single load and save if augeas is used
+
+    :param devices: dictionary of network device id -> device info
+    :return: dictionary of network device id -> error for the devices
+             which could not be persisted
+    """
+    if not devices:
+        return {}
+
+    wok_log.info('updating mandatory params to ifcfg files of network '
+                 'devices %s to persist them' % devices.keys())
+    if _use_augeas():
+        # one augeas load and save, a failure affects all devices
+        groups = [devices.keys()]
+    else:
+        groups = [[interface] for interface in devices]
+
+    failed = {}
+    for interfaces in groups:
+        try:
+            _save_ifcfg_files(dict(
+                (ifcfg_path.replace('<deviceid>', interface),
+                 _get_ifcfg_params(devices[interface]))
+                for interface in interfaces))
+        except Exception as e:
+            wok_log.error('Failed to write device attributes to ifcfg files '
+                          'of %s. Error: %s' % (interfaces, e.__str__()))
+            for interface in interfaces:
+                ifcfg_file_path = '/' + ifcfg_path.replace('<deviceid>',
+                                                           interface)
+                failed[interface] = OperationFailed(
+                    'GS390XIONW002E', {'device': interface,
+                                       'ifcfg_file_path': ifcfg_file_path,
+                                       'error': e.__str__()}).__str__()
+    if not failed:
+        wok_log.info('successfully updated mandatory params in ifcfg files')
+    return failed
+
+
+def _use_augeas():
+    """
+    :return: True if the ifcfg files are written using augeas instead of
+             the native writer
+    """
+    return config["ifcfg_augeas"]
+
+
+def _save_ifcfg_files(files):
+    """
+    method to set the attributes in the ifcfg files, with the writer
+    selected by the ifcfg_augeas option
+
+    :param files: dictionary of ifcfg file path relative to / ->
+                  dictionary of attributes
+    :return: None
+    """
+    if _use_augeas():
+        ifcfg_augeas.write(files)
+        return
+
+    for path, params in files.iteritems():
+        persistence.write_ifcfg('/' + path, params)
+
+
 def _is_interface_online(interface):
     """
     method to check if the network device is online
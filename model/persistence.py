@@ -0,0 +1,244 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import errno
+import fcntl
+import os
+import re
+import tempfile
+import threading
+
+from contextlib import contextmanager
+
+DASD_CONF = '/etc/dasd.conf'
+ZFCP_CONF = '/etc/zfcp.conf'
+
+# mode of new ifcfg files, the same as of the other network scripts
+IFCFG_MODE = 0o644
+SHELLVAR_PATTERN = re.compile(r'^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)=')
+PLAIN_VALUE_PATTERN = re.compile(r'^[A-Za-z0-9_.,:/@+-]*$')
+
+
+def _zfcp_key(line):
+    """
+    :return: (adapter, port, lun_id) tuple of a /etc/zfcp.conf line or
+             None for comments and empty lines
+    """
+    fields = line.split('#', 1)[0].lower().split()
+    if not fields:
+        return None
+    return tuple(fields)
+
+
+def _dasd_key(line):
+    """
+    :return: device id of a /etc/dasd.conf line, e.g. '0.0.0190' for
+             '0.0.0190 use_diag=0', or None for comments and empty lines
+    """
+    fields = line.split('#', 1)[0].lower().split()
+    if not fields:
+        return None
+    return fields[0]
+
+
+class ConfFile(object):
+    """
+    Configuration file holding one entry per line, like /etc/zfcp.conf
+    and /etc/dasd.conf. The keys of the entries are indexed in a set,
+    which is only parsed again once the file changed on disk. Updates
+    are done under a fcntl lock and the file is replaced atomically by
+    renaming a temporary file over it.
+    """
+
+    def __init__(self, path, parse_key):
+        """
+        :param path: path of the configuration file
+        :param parse_key: callable returning the key of a line or None
+                          if the line holds no entry
+        """
+        self.path = path
+        self.parse_key = parse_key
+        self.lock = threading.Lock()
+        self.stat = None
+        self.keys = frozenset()
+
+    @contextmanager
+    def _locked(self, operation):
+        """
+        Open the file and lock it
+        :param operation: fcntl.LOCK_SH or fcntl.LOCK_EX
+        :return: file object
+        """
+        while True:
+            conf = open(self.path, 'a+')
+            try:
+                fcntl.flock(conf, operation)
+                # A concurrent update may have replaced the file while
+                # waiting for the lock, in which case it is on a stale file
+                if os.fstat(conf.fileno()).st_ino == \
+                        os.stat(self.path).st_ino:
+                    conf.seek(0)
+                    yield conf
+                    return
+            finally:
+                conf.close()
+
+    def _index(self, conf, lines):
+        stat = os.fstat(conf.fileno())
+        self.stat = (stat.st_ino, stat.st_mtime, stat.st_size)
+        self.keys = frozenset(key for key in map(self.parse_key, lines)
+                              if key is not None)
+
+    def _is_current(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return self.stat == (stat.st_ino, stat.st_mtime, stat.st_size)
+
+    def get_keys(self):
+        """
+        :return: set of the keys of all entries in the file
+        """
+        with self.lock:
+            if not os.path.exists(self.path):
+                self.stat = None
+                self.keys = frozenset()
+            elif not self._is_current():
+                with self._locked(fcntl.LOCK_SH) as conf:
+                    self._index(conf, conf.readlines())
+            return self.keys
+
+    def contains(self, entry):
+        """
+        :param entry: line or the leading fields of it identifying the
+                      entry, e.g. a device id for /etc/dasd.conf
+        :return: True if an entry with the same key is in the file
+        """
+        return self.parse_key(entry) in self.get_keys()
+
+    def update(self, add=(), remove=()):
+        """
+        Add and remove many entries with a single rewrite of the file
+        :param add: list of lines to be added, unless an entry with the
+                    same key is present already
+        :param remove: list of entries to be removed, compared by key
+        :return: True if the file was changed
+        """
+        remove = set(map(self.parse_key, remove)) - set([None])
+        with self.lock:
+            with self._locked(fcntl.LOCK_EX) as conf:
+                lines = conf.readlines()
+                output = [line for line in lines
+                          if self.parse_key(line) not in remove]
+                keys = set(map(self.parse_key, output))
+                for line in add:
+                    key = self.parse_key(line)
+                    if key not in keys:
+                        output.append(line.rstrip('\n') + '\n')
+                        keys.add(key)
+
+                if output == lines:
+                    self._index(conf, lines)
+                    return False
+
+                fd, temp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(self.path),
+                    prefix='.' + os.path.basename(self.path) + '.')
+                try:
+                    with os.fdopen(fd, 'w') as temp_file:
+                        os.fchmod(temp_file.fileno(),
+                                  os.fstat(conf.fileno()).st_mode & 0o7777)
+                        temp_file.writelines(output)
+                        temp_file.flush()
+                        os.fsync(temp_file.fileno())
+                        os.rename(temp_path, self.path)
+                        self._index(temp_file, output)
+                except:
+                    if os.path.exists(temp_path):
+                        os.unlink(temp_path)
+                    raise
+                return True
+
+
+dasd_conf = ConfFile(DASD_CONF, _dasd_key)
+zfcp_conf = ConfFile(ZFCP_CONF, _zfcp_key)
+
+
+def _quote_shellvar(value):
+    """
+    :return: value quoted for a shell variable assignment, if needed
+    """
+    if PLAIN_VALUE_PATTERN.match(value):
+        return value
+    return '"%s"' % re.sub(r'(["\\$`])', r'\\\1', value)
+
+
+def write_ifcfg(path, params):
+    """
+    Set variables in an ifcfg file, the way augeas does with the Shellvars
+    lens: assignments of the variables are replaced in place, missing ones
+    are appended and all other lines, e.g. comments and unknown variables,
+    are kept. The file is replaced atomically by renaming a temporary file
+    over it, a new file gets IFCFG_MODE.
+    :param path: path of the ifcfg file
+    :param params: dictionary of variable name -> value
+    :return: True if the file was changed
+    """
+    try:
+        with open(path) as ifcfg_file:
+            lines = ifcfg_file.readlines()
+        mode = os.stat(path).st_mode & 0o7777
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        lines = None
+        mode = IFCFG_MODE
+
+    output = []
+    written = set()
+    for line in lines or []:
+        match = SHELLVAR_PATTERN.match(line)
+        key = match.group(1) if match else None
+        if key not in params:
+            output.append(line if line.endswith('\n') else line + '\n')
+        elif key not in written:
+            # later assignments of the same variable are dropped
+            output.append('%s=%s\n' % (key, _quote_shellvar(params[key])))
+            written.add(key)
+    for key in sorted(set(params) - written):
+        output.append('%s=%s\n' % (key, _quote_shellvar(params[key])))
+
+    if output == lines:
+        return False
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                     prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'w') as temp_file:
+            os.fchmod(temp_file.fileno(), mode)
+            temp_file.writelines(output)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+            os.rename(temp_path, path)
+    except:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return True
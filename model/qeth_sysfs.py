@@ -0,0 +1,144 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import glob
+import os
+import re
+
+from collections import namedtuple
+
+ccwgroup_dir = '/sys/bus/ccwgroup/drivers/qeth/'
+ccw_dir = '/sys/bus/ccw/devices/'
+
+# Control unit types of the qeth devices and the card type shown by
+# znetconf for the devices which are not grouped yet
+CARD_TYPES = {'1731/01': 'OSA (QDIO)',
+              '1731/05': 'HiperSockets',
+              '1731/06': 'OSN'}
+
+QethDevice = namedtuple('QethDevice', ['device_ids', 'cutype', 'card_type',
+                                       'chpid', 'if_name', 'online'])
+
+DEVICE_PATTERN = re.compile(r'^\d\.\d\.[0-9a-f]{4}$')
+
+
+def _read_attr(path):
+    with open(path) as attr_file:
+        return attr_file.readline().strip()
+
+
+def _devno(device):
+    """
+    :return: device number of the device id, e.g. 0xf500 for '0.0.f500'
+    """
+    return int(device.rsplit('.', 1)[1], 16)
+
+
+def _read_group(group):
+    """
+    Read the qeth group device
+    :param group: bus id of the group device, e.g. '0.0.f500'
+    :return: QethDevice
+    """
+    group_dir = ccwgroup_dir + group + '/'
+    device_ids = [os.path.basename(os.readlink(cdev))
+                  for cdev in sorted(glob.glob(group_dir + 'cdev[0-9]'))]
+    online = _read_attr(group_dir + 'online') == '1'
+    if_name = ''
+    if os.path.exists(group_dir + 'if_name'):
+        if_name = _read_attr(group_dir + 'if_name')
+    return QethDevice(device_ids,
+                      _read_attr(ccw_dir + device_ids[0] + '/cutype'),
+                      _read_attr(group_dir + 'card_type'),
+                      _read_attr(group_dir + 'chpid'), if_name, online)
+
+
+def read_configured_devices():
+    """
+    Collect the qeth group devices, like 'znetconf -c' does
+    :return: list of QethDevice sorted by device id
+    :raises: OSError if the qeth driver can't be read
+    """
+    devices = []
+    for group in sorted(os.listdir(ccwgroup_dir)):
+        if not DEVICE_PATTERN.match(group):
+            # driver attributes, e.g. 'group' and 'uevent'
+            continue
+
+        try:
+            devices.append(_read_group(group))
+        except (IOError, OSError, IndexError):
+            # the group device got removed in the meanwhile
+            continue
+    return devices
+
+
+def _read_ungrouped():
+    """
+    :return: list of (device id, cutype, chpid) tuples of the qeth capable
+             ccw devices which are not part of a group device
+    """
+    devices = []
+    for device in os.listdir(ccw_dir):
+        device_dir = ccw_dir + device + '/'
+        if not DEVICE_PATTERN.match(device) or \
+                os.path.exists(device_dir + 'group_device'):
+            continue
+
+        try:
+            cutype = _read_attr(device_dir + 'cutype')
+            if cutype not in CARD_TYPES:
+                continue
+
+            # first CHPID of the subchannel the device is attached to
+            subchannel_dir = os.path.dirname(os.path.realpath(device_dir))
+            chpid = _read_attr(subchannel_dir + '/chpids').split()[0]
+        except (IOError, OSError, IndexError):
+            continue
+        devices.append((device, cutype, chpid))
+    return devices
+
+
+def read_unconfigured_devices():
+    """
+    Collect the qeth capable devices which are not grouped yet and group
+    them the way 'znetconf -u' does: devices of the same control unit type
+    and CHPID are taken in order of their device numbers, a read device is
+    followed by a write device having the next device number and by the
+    data device.
+    :return: list of QethDevice sorted by device id
+    :raises: OSError if the ccw devices can't be read
+    """
+    paths = {}
+    for device, cutype, chpid in sorted(_read_ungrouped()):
+        paths.setdefault((cutype, chpid), []).append(device)
+
+    devices = []
+    for (cutype, chpid), device_ids in paths.iteritems():
+        index = 0
+        while index + 2 < len(device_ids):
+            read, write = device_ids[index:index + 2]
+            if _devno(write) != _devno(read) + 1:
+                index += 1
+                continue
+
+            devices.append(QethDevice(device_ids[index:index + 3], cutype,
+                                      CARD_TYPES[cutype], chpid, '', False))
+            index += 3
+    return sorted(devices)
@@ -17,14 +17,20 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
-import binascii
 import os
 import re
+import threading
+import time
 
+import css_sysfs
 import model_utils as utils
+import persistence
+import uevent
 from wok.exception import InvalidParameter, OperationFailed
+from wok.model.tasks import TaskModel
+from wok.plugins.gingers390x.config import config
 from wok.rollbackcontext import RollbackContext
-from wok.utils import run_command, wok_log
+from wok.utils import add_task, run_command, wok_log
 
 
 DEV_TYPES = ["dasd-eckd", "zfcp"]
@@ -32,6 +38,8 @@ syspath_eckd = "/sys/bus/ccw/drivers/dasd-eckd/0.*/"
 syspath_zfcp = "/sys/bus/ccw/drivers/zfcp/0.*/"
 lscss = "lscss"
 chccwdev = 'chccwdev'
+# devices passed to a single chccwdev call by the bulk actions
+CHCCWDEV_BATCH = 256
 LSCSS_DEV = "Device"
 LSCSS_SUBCH = "Subchan"
 LSCSS_DEVTYPE = "DevType"
@@ -50,8 +58,21 @@ HEADER_PATTERN = r'('+re.escape(LSCSS_DEV) + r')\s+' \
                  r'('+re.escape(LSCSS_PAM) + r')\s+' \
                  r'('+re.escape(LSCSS_POM) + r')\s+' \
                  r'('+re.escape(LSCSS_CHPID) + r')$'
-DASD_CONF = '/etc/dasd.conf'
-ZFCP_CONF = '/etc/zfcp.conf'
+DEVICE_PATTERN = r'(\d\.\d\.[0-9a-fA-F]{4})\s+' \
+                 r'(\d\.\d\.[0-9a-fA-F]{4})\s+' \
+                 r'(\w+\/\w+)\s+' \
+                 r'(\w+\/\w+)\s' \
+                 r'(\s{3}|yes)\s+' \
+                 r'([0-9a-fA-F]{2})\s+' \
+                 r'([0-9a-fA-F]{2})\s+' \
+                 r'([0-9a-fA-F]{2})\s+' \
+                 r'(\w+\s\w+)'
+DASD_CONF = persistence.DASD_CONF
+ZFCP_CONF = persistence.ZFCP_CONF
+# path mask -> offsets of the CHPIDs of its paths in the CHPIDs column
+PATH_OFFSETS = tuple(tuple(2 * path for path in range(8)
+                           if mask & (0x80 >> path))
+                     for mask in range(256))
 
 
 class StorageDevicesModel(object):
@@ -69,12 +90,12 @@ class StorageDevicesModel(object):
         """
         device_paths = []
         if _type is None:
-            device_paths.extend(utils.get_directories(syspath_eckd))
-            device_paths.extend(utils.get_directories(syspath_zfcp))
+            device_paths.extend(device_cache.get_paths(syspath_eckd))
+            device_paths.extend(device_cache.get_paths(syspath_zfcp))
         elif _type == DEV_TYPES[0]:
-            device_paths = utils.get_directories(syspath_eckd)
+            device_paths = device_cache.get_paths(syspath_eckd)
         elif _type == DEV_TYPES[1]:
-            device_paths = utils.get_directories(syspath_zfcp)
+            device_paths = device_cache.get_paths(syspath_zfcp)
         else:
             wok_log.error("Invalid _type given. _type: %s"
                           % _type)
@@ -82,40 +103,108 @@ class StorageDevicesModel(object):
                                    {'supported_type': DEV_TYPES})
         if not device_paths:
             return []
-        command = [lscss]
-        msg = 'The command executed is "%s" ' % command
-        wok_log.debug(msg)
-        out, err, rc = run_command(command)
-        if rc:
-            err = err.strip().replace("lscss:", '').strip()
-            wok_log.error(err)
-            raise OperationFailed("GS390XCMD0001E",
-                                  {'command': command,
-                                   'rc': rc, 'reason': err})
-
-        device_pattern = r'(\d\.\d\.[0-9a-fA-F]{4})\s+' \
-                         r'(\d\.\d\.[0-9a-fA-F]{4})\s+' \
-                         r'(\w+\/\w+)\s+' \
-                         r'(\w+\/\w+)\s' \
-                         r'(\s{3}|yes)\s+' \
-                         r'([0-9a-fA-F]{2})\s+' \
-                         r'([0-9a-fA-F]{2})\s+' \
-                         r'([0-9a-fA-F]{2})\s+' \
-                         r'(\w+\s\w+)'
-
-        devices = utils.get_rows_info(out, HEADER_PATTERN, device_pattern,
-                                      unique_col='device',
-                                      format_data=_format_lscss)
+        devices = device_cache.get_table()
         device_data_list = _list_devicesinfo(devices, device_paths)
         return device_data_list
 
 
+class StorageDeviceCache(object):
+    """
+    Table of the dasd-eckd and zfcp devices found in sysfs along with their
+    channel subsystem info, so that looking up a device costs no
+    subprocess. An entry is refreshed once older than the TTL. All entries
+    are dropped whenever the kernel reports a ccw or css uevent and after a
+    device was brought online or offline.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # sysfs path pattern -> (timestamp, paths, device ids)
+        self.paths = {}
+        self.table = None
+        self.timestamp = 0
+        self.watching = False
+
+    def _expired(self, timestamp):
+        return time.time() - timestamp >= self.ttl
+
+    def _watch(self):
+        if not self.watching:
+            self.watching = True
+            uevent.watch(self.invalidate, ['ccw', 'css'])
+
+    def _read_entry(self, pattern):
+        entry = self.paths.get(pattern)
+        if entry is None or self._expired(entry[0]):
+            paths = utils.get_directories(pattern)
+            devices = set(filter(None, map(utils.get_dirname, paths)))
+            entry = (time.time(), paths, devices)
+            self.paths[pattern] = entry
+        return entry
+
+    def _get_entry(self, pattern):
+        with self.lock:
+            self._watch()
+            return self._read_entry(pattern)
+
+    def get_paths(self, pattern):
+        """
+        :param pattern: sysfs path pattern, e.g. syspath_eckd
+        :return: list of the device paths matching the pattern
+        """
+        return list(self._get_entry(pattern)[1])
+
+    def has_device(self, pattern, device):
+        """
+        :return: True if the device is one of the devices found with the
+                 sysfs path pattern
+        """
+        return device in self._get_entry(pattern)[2]
+
+    def _read_table(self):
+        self._watch()
+        if self.table is None or self._expired(self.timestamp):
+            devices = self._read_entry(syspath_eckd)[2] | \
+                self._read_entry(syspath_zfcp)[2]
+            self.table = _get_device_table(devices) if devices else {}
+            self.timestamp = time.time()
+        return self.table
+
+    def get_table(self):
+        """
+        :return: dictionary of device id -> device info dictionary for all
+                 the dasd-eckd and zfcp devices
+        """
+        with self.lock:
+            return dict((device, dict(info))
+                        for device, info in self._read_table().iteritems())
+
+    def get_device(self, device):
+        """
+        :return: device info dictionary or None if the device is not in
+                 the table
+        """
+        with self.lock:
+            info = self._read_table().get(device)
+            return dict(info) if info is not None else None
+
+    def invalidate(self):
+        with self.lock:
+            self.paths = {}
+            self.table = None
+
+
+device_cache = StorageDeviceCache(config["device_cache_ttl"])
+
+
 class StorageDeviceModel(object):
     """
     Model class for Storage Device
     """
     def __init__(self, **kargs):
-        pass
+        self.objstore = kargs.get('objstore')
+        self.task = TaskModel(**kargs)
 
     def get_storagedevice(self, device):
         """
@@ -126,6 +215,11 @@ class StorageDeviceModel(object):
         """
         device = _validate_device(device)
         if _is_dasdeckd_device(device) or _is_zfcp_device(device):
+            device_info = device_cache.get_device(device)
+            if device_info:
+                return device_info
+
+            # The device may have shown up after the table was cached
             command = [lscss, '-d', device]
             msg = 'The command is "%s" ' % command
             wok_log.debug(msg)
@@ -159,19 +253,124 @@ class StorageDeviceModel(object):
 
     def online(self, device):
         """
-        Bring the device online.
+        Bring the device online in background.
         :param device: device id
+        :return: task json
         """
         device = _validate_device(device)
-        _device_online(device)
+        taskid = add_task('/plugins/gingers390x/storagedevices/%s/online'
+                          % device, _bring_device_online, self.objstore,
+                          device)
+        return self.task.lookup(taskid)
 
     def offline(self, device):
         """
-        Bring the device offline.
+        Bring the device offline in background.
         :param device: device id
+        :return: task json
         """
         device = _validate_device(device)
-        _device_offline(device)
+        taskid = add_task('/plugins/gingers390x/storagedevices/%s/offline'
+                          % device, _bring_device_offline, self.objstore,
+                          device)
+        return self.task.lookup(taskid)
+
+
+class StorageDevicesBulkModel(object):
+    """
+    Model bringing many storage devices online or offline at once
+    """
+    def __init__(self, **kargs):
+        self.objstore = kargs.get('objstore')
+        self.task = TaskModel(**kargs)
+
+    def online(self, name, devices):
+        """
+        Bring the given devices online and persist the dasd-eckd devices
+        with a single update of DASD_CONF
+        :param devices: list of device ids
+        :return: task json
+        """
+        devices = _validate_devices(devices)
+        taskid = add_task('/plugins/gingers390x/storagedevices/bulk/online',
+                          _devices_online, self.objstore, devices)
+        return self.task.lookup(taskid)
+
+    def offline(self, name, devices):
+        """
+        Bring the given devices offline and unpersist the dasd-eckd
+        devices with a single update of DASD_CONF
+        :param devices: list of device ids
+        :return: task json
+        """
+        devices = _validate_devices(devices)
+        taskid = add_task('/plugins/gingers390x/storagedevices/bulk/offline',
+                          _devices_offline, self.objstore, devices)
+        return self.task.lookup(taskid)
+
+
+def _get_device_table(devices=None):
+    """
+    Collect the info of the devices, from sysfs unless configured
+    otherwise. lscss is used if sysfs can't be read.
+    :param devices: set of the device ids to be collected, None for all
+    :return: dictionary of device id -> device info dictionary
+    """
+    if config["css_from_sysfs"]:
+        try:
+            return _get_sysfs_table(devices)
+        except (IOError, OSError) as e:
+            wok_log.warning("Unable to read the channel subsystem from "
+                            "sysfs, running lscss instead. %s" % e)
+    return _get_lscss_table(devices)
+
+
+def _get_sysfs_table(devices=None):
+    """
+    Read the devices from sysfs, formatted the same way as the
+    output of lscss
+    :param devices: set of the device ids to be read, None for all
+    :return: dictionary of device id -> device info dictionary
+    """
+    table = {}
+    for device, ccw_device in css_sysfs.read_devices(devices).iteritems():
+        chpids = ccw_device.chpids
+        table[device] = _format_lscss({
+            LSCSS_DEV: device,
+            LSCSS_SUBCH: ccw_device.subchannel,
+            # lscss shows devices without a model as 0000/00
+            LSCSS_DEVTYPE: ccw_device.devtype.replace('n/a', '0000/00'),
+            LSCSS_CUTYPE: ccw_device.cutype,
+            LSCSS_USE: 'yes' if ccw_device.online else '',
+            LSCSS_PIM: ccw_device.pim,
+            LSCSS_PAM: ccw_device.pam,
+            LSCSS_POM: ccw_device.pom,
+            LSCSS_CHPID: ''.join(chpids[:4]) + ' ' + ''.join(chpids[4:])})
+    return table
+
+
+def _get_lscss_table(devices=None):
+    """
+    Run lscss once for all the devices. Its output is parsed while it is
+    read and the rows of other devices are dropped before being matched,
+    so only the rows kept are ever turned into dictionaries.
+    :param devices: set of the device ids to be collected, None for all
+    :return: dictionary of device id -> device info dictionary
+    """
+    command = [lscss]
+    msg = 'The command executed is "%s" ' % command
+    wok_log.debug(msg)
+    keep = None
+    if devices is not None:
+        def keep(line):
+            # rows start with the device id, e.g. '0.0.0190 0.0.0000 ...'
+            return line.split(' ', 1)[0] in devices
+
+    parser = utils.get_table_parser(HEADER_PATTERN, DEVICE_PATTERN)
+    rows = parser.iter_line_rows(utils.run_command_lines(command),
+                                 keep=keep)
+    return utils.collect_rows(rows, unique_col='device',
+                              format_data=_format_lscss)
 
 
 def _format_lscss(device):
@@ -200,52 +399,30 @@ def _format_lscss(device):
             device['sub_channel'] = device.pop(LSCSS_SUBCH)
             device['device_type'] = device.pop(LSCSS_DEVTYPE)
             device['cu_type'] = device.pop(LSCSS_CUTYPE)
-            pim = device.pop(LSCSS_PIM)
-            pam = device.pop(LSCSS_PAM)
+            pim = int(device.pop(LSCSS_PIM), 16)
+            pam = int(device.pop(LSCSS_PAM), 16)
             del device[LSCSS_POM]
             chipid = device.pop(LSCSS_CHPID)
+            device['enabled_chipids'] = _get_paths(pam, chipid)
             if pim == pam:
-                binaryval_pam = _hex_to_binary(pam)
-                device['enabled_chipids'] = _get_paths(binaryval_pam, chipid)
                 device['installed_chipids'] = device['enabled_chipids']
             else:
-                binaryval_pam = _hex_to_binary(pam)
-                device['enabled_chipids'] = _get_paths(binaryval_pam, chipid)
-                binaryval_pim = _hex_to_binary(pim)
-                device['installed_chipids'] = _get_paths(binaryval_pim, chipid)
+                device['installed_chipids'] = _get_paths(pim, chipid)
         except KeyError as e:
             wok_log.error('Issue while formating lscss dictionary output')
             raise e
     return device
 
 
-def _byte_to_binary(n):
-    """
-    Converts each byte into binary value i.e. sets of 0 and 1
-    """
-    return ''.join(str((n & (1 << i)) and 1) for i in reversed(range(8)))
-
-
-def _hex_to_binary(h):
-    """
-    Return the actual bytes of data represented by the
-    hexadecimal string specified as the parameter.
-    """
-    return ''.join(_byte_to_binary(ord(b)) for b in binascii.unhexlify(h))
-
-
 def _get_paths(mask, chipid):
     """
     method to return the enabled or installed paths of chipid.
-    :param mask: the binary value for the pam or pim.
+    :param mask: the pam or pim as integer, the most significant bit
+                 standing for the first path
+    :param chipid: CHPIDs column of lscss, e.g. 'b0b10d00 00000000'
     :return: list of available or installed paths of the chipid value.
     """
-    chipids = [chipid[i:i+2] for i in range(0, len(chipid), 2)]
-    chipid_paths = []
-    for index, j in enumerate(mask):
-        if j == '1':
-            chipid_paths.append(chipids[index])
-    return chipid_paths
+    return [chipid[offset:offset + 2] for offset in PATH_OFFSETS[mask]]
 
 
 def _get_deviceinfo(lscss_out, device):
@@ -254,17 +431,13 @@ def _get_deviceinfo(lscss_out, device):
     :param device: device id for which we need info to be returned
     :return: device info dict for the device from lscss output
     """
-    device_pattern = r'('+re.escape(device) + r')\s+' \
-                                              r'(\d\.\d\.[0-9a-fA-F]{4})\s+' \
-                                              r'(\w+\/\w+)\s+' \
-                                              r'(\w+\/\w+)\s' \
-                                              r'(\s{3}|yes)\s+' \
-                                              r'([0-9a-fA-F]{2})\s+' \
-                                              r'([0-9a-fA-F]{2})\s+' \
-                                              r'([0-9a-fA-F]{2})\s+' \
-                                              r'(\w+\s\w+)'
     if device:
-        device = utils.get_row_data(lscss_out, HEADER_PATTERN, device_pattern)
+        # the generic pattern keeps a single compiled parser for lscss
+        # instead of one for every device looked up
+        parser = utils.get_table_parser(HEADER_PATTERN, DEVICE_PATTERN)
+        device_id = device.lower()
+        device = parser.find_row(
+            lscss_out, lambda row: row[LSCSS_DEV].lower() == device_id)
         msg = 'The device is %s' % device
         wok_log.debug(msg)
         try:
@@ -323,6 +496,26 @@ def _validate_device(device):
     return device
 
 
+def _validate_devices(devices):
+    """
+    validate the device ids given to a bulk action
+    :param devices: list of device ids
+    :return: list of the validated device ids without duplicates
+    """
+    if not isinstance(devices, list) or not devices:
+        wok_log.error("Devices are not a list of device ids. Devices: %s"
+                      % devices)
+        raise InvalidParameter("GS390XINVINPUT",
+                               {'reason': 'devices must be a non-empty list '
+                                          'of device ids'})
+    validated = []
+    for device in devices:
+        device = _validate_device(device)
+        if device not in validated:
+            validated.append(device)
+    return validated
+
+
 def _device_online(device):
     """
     Bring device online, if it is not online.
@@ -359,30 +552,149 @@ def _device_offline(device):
         rollback.commitAll()
 
 
-def _get_dasdeckd_devices():
+def _bring_device_online(cb, device):
     """
-    Return list of dasd-eckd devices
+    Task bringing the device online and persisting it.
+    :param cb: callback of the task
+    :param device: device id
     """
-    device_paths = utils.get_directories(syspath_eckd)
-    dasdeckd_devices = []
-    for path in device_paths:
-        device = utils.get_dirname(path)
-        if device:
-            dasdeckd_devices.append(device)
-    return dasdeckd_devices
+    cb('')  # reset messages
+    try:
+        cb('Bringing device %s online' % device)
+        _device_online(device)
+        cb('Successfully brought device %s online' % device, True)
+    except Exception as e:
+        cb(e.__str__(), False)
+    finally:
+        device_cache.invalidate()
 
 
-def _get_zfcp_devices():
+def _bring_device_offline(cb, device):
     """
-    Return list of zfcp devices
+    Task bringing the device offline and unpersisting it.
+    :param cb: callback of the task
+    :param device: device id
+    """
+    cb('')  # reset messages
+    try:
+        cb('Bringing device %s offline' % device)
+        _device_offline(device)
+        cb('Successfully brought device %s offline' % device, True)
+    except Exception as e:
+        cb(e.__str__(), False)
+    finally:
+        device_cache.invalidate()
+
+
+def _change_devices_state(devices, online, progress=None):
+    """
+    Bring many devices online or offline. chccwdev is run once for a batch
+    of devices, the devices of a failed batch which did not reach the
+    requested state are retried one by one in a pool of workers, so that
+    a single broken device does not fail the others.
+    :param devices: list of device ids
+    :param online: True to bring the devices online, False for offline
+    :param progress: callable called with each device done, or None
+    :return: dictionary of device id -> error for the devices which failed
+    """
+    flag, change_state = ('-e', _bring_online) if online \
+        else ('-d', _bring_offline)
+    retry = []
+    for index in range(0, len(devices), CHCCWDEV_BATCH):
+        batch = devices[index:index + CHCCWDEV_BATCH]
+        command = [chccwdev, flag, ','.join(batch)]
+        out, err, rc = run_command(command)
+        for device in batch:
+            if rc and _is_online(device) != online:
+                retry.append(device)
+            elif progress:
+                progress(device)
+        if rc:
+            wok_log.warning("Command %s failed, retrying the devices one by "
+                            "one. Error: %s" % (command, err.strip()))
+
+    def change(device):
+        change_state(device)
+        if progress:
+            progress(device)
+
+    failed = {}
+    results = utils.run_in_pool(change, retry, config["device_workers"])
+    for device, (_, error) in zip(retry, results):
+        if error:
+            failed[device] = str(error)
+    return failed
+
+
+def _change_devices(cb, devices, online):
+    """
+    Task bringing many devices online or offline. The dasd-eckd devices
+    are persisted or unpersisted with a single update of DASD_CONF, the
+    devices are brought back to their previous state if that fails.
+    :param cb: callback of the task
+    :param devices: list of device ids
+    :param online: True to bring the devices online, False for offline
+    """
+    cb('')  # reset messages
+    state = 'online' if online else 'offline'
+    try:
+        eckd_devices = [device for device in devices
+                        if _is_dasdeckd_device(device)]
+        to_change = [device for device in devices
+                     if _is_online(device) != online]
+        done = [len(devices) - len(to_change)]
+
+        def progress(device):
+            done[0] += 1
+            cb('Device %s is %s, %d of %d devices done'
+               % (device, state, done[0], len(devices)))
+
+        failed = _change_devices_state(to_change, online, progress)
+
+        persist = [device for device in eckd_devices if device not in failed]
+        try:
+            if online:
+                persistence.dasd_conf.update(add=persist)
+            else:
+                persistence.dasd_conf.update(remove=persist)
+        except (IOError, OSError) as e:
+            wok_log.error("Failed to update %s. Error: %s" % (DASD_CONF, e))
+            _change_devices_state([device for device in to_change
+                                   if device in persist], not online)
+            for device in persist:
+                failed[device] = str(e)
+
+        if failed:
+            wok_log.error("Failed to bring devices %s. Failed devices: %s"
+                          % (state, failed))
+            raise OperationFailed("GS390XIOST005E" if online
+                                  else "GS390XIOST006E",
+                                  {'failed_devices': failed})
+        wok_log.info("Successfully brought devices %s %s" % (devices, state))
+        cb('Successfully brought devices %s %s' % (', '.join(devices), state),
+           True)
+    except Exception as e:
+        cb(e.__str__(), False)
+    finally:
+        device_cache.invalidate()
+
+
+def _devices_online(cb, devices):
+    """
+    Task bringing many devices online
+    :param cb: callback of the task
+    :param devices: list of device ids
     """
-    device_paths = utils.get_directories(syspath_zfcp)
-    zfcp_devices = []
-    for path in device_paths:
-        device = utils.get_dirname(path)
-        if device:
-            zfcp_devices.append(device)
-    return zfcp_devices
+    _change_devices(cb, devices, True)
+
+
+def _devices_offline(cb, devices):
+    """
+    Task bringing many devices offline
+    :param cb: callback of the task
+    :param devices: list of device ids
+    """
+    _change_devices(cb, devices, False)
 
 
 def _is_online(device):
@@ -408,18 +720,11 @@ def _is_dasdeckd_persisted(device):
     Return True if device persent in DASD_CONF, else return False
     :param device: dasd-eckd device id
     """
-    if os.access(DASD_CONF, os.R_OK):
-        dasd_conf = None
-        try:
-            dasd_conf = open(DASD_CONF)
-            dasd_conf.seek(0, 0)
-            conf_content = dasd_conf.read()
-            if re.search(br'(?i)%s' % device, conf_content):
-                return True
-        finally:
-            if dasd_conf:
-                dasd_conf.close()
-    return False
+    try:
+        return persistence.dasd_conf.contains(device)
+    except (IOError, OSError) as e:
+        wok_log.error("Failed to read %s. Error: %s" % (DASD_CONF, e))
+        return False
 
 
 def _bring_online(device):
@@ -455,14 +760,11 @@ def _persist_dasdeckd_device(device):
     Add the dasd-eckd device id into DASD_CONF
     :param device: device id
     """
-    command_persist_dasdeckd = 'flock -w 1 %s -c \"echo %s >> %s\"' \
-                               % (DASD_CONF, device, DASD_CONF)
-    if os.access(DASD_CONF, os.W_OK):
-        retcode = os.system(command_persist_dasdeckd)
-        if not retcode:
-            return
-    wok_log.error("Failed to persist dasd-eckd device: %s" % device)
-    raise OperationFailed("GS390XIOST002E", {'device': device})
+    try:
+        persistence.dasd_conf.update(add=[device])
+    except (IOError, OSError):
+        wok_log.error("Failed to persist dasd-eckd device: %s" % device)
+        raise OperationFailed("GS390XIOST002E", {'device': device})
 
 
 def _unpersist_dasdeckd_device(device):
@@ -470,14 +772,11 @@ def _unpersist_dasdeckd_device(device):
     Remove the dasd-eckd device id from DASD_CONF
     :param device: device id
     """
-    command_unpersist_dasdeckd = 'flock -w 1 %s -c \"sed -i \'/%s/Id\' %s\"'\
-                                 % (DASD_CONF, device, DASD_CONF)
-    if os.access(DASD_CONF, os.W_OK):
-        retcode = os.system(command_unpersist_dasdeckd)
-        if not retcode:
-            return
-    wok_log.error("Failed to unpersist dasd-eckd device: %s" % device)
-    raise OperationFailed("GS390XIOST003E", {'device': device})
+    try:
+        persistence.dasd_conf.update(remove=[device])
+    except (IOError, OSError):
+        wok_log.error("Failed to unpersist dasd-eckd device: %s" % device)
+        raise OperationFailed("GS390XIOST003E", {'device': device})
 
 
 def _is_dasdeckd_device(device):
@@ -485,10 +784,7 @@ def _is_dasdeckd_device(device):
     Return True if the device is of type dasd-eckd otherwise False
     :param device: device id
     """
-    dasdeckd_devices = _get_dasdeckd_devices()
-    if device in dasdeckd_devices:
-        return True
-    return False
+    return device_cache.has_device(syspath_eckd, device)
 
 
 def _is_zfcp_device(device):
@@ -496,7 +792,4 @@ def _is_zfcp_device(device):
     Return True if the device is of type zfcp otherwise False
     :param device: device id
     """
-    zfcp_devices = _get_zfcp_devices()
-    if device in zfcp_devices:
-        return True
-    return False
+    return device_cache.has_device(syspath_zfcp, device)
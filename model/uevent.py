@@ -0,0 +1,166 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import os
+import select
+import socket
+import threading
+import time
+
+from wok.utils import wok_log
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+UEVENT_TIMEOUT = 30
+# upper bound between two checks, in case an event got lost
+POLL_INTERVAL = 1
+
+
+class UeventListener(object):
+    """
+    Netlink socket receiving the uevents sent by the kernel
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                                  NETLINK_KOBJECT_UEVENT)
+        try:
+            self.sock.bind((0, UEVENT_KERNEL_GROUP))
+        except socket.error:
+            self.sock.close()
+            raise
+
+    def wait(self, timeout):
+        """
+        Wait for the next uevent
+        :param timeout: time in seconds to wait at most
+        :return: dictionary of the uevent properties, e.g. 'ACTION',
+                 'DEVPATH' and 'SUBSYSTEM' or None if no uevent arrived
+        """
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return None
+
+        try:
+            data = self.sock.recv(16384)
+        except socket.error:
+            # receive buffer overrun, events got dropped
+            return {}
+
+        # <action>@<devpath>\0KEY=VALUE\0KEY=VALUE...
+        uevent = {}
+        for field in data.split('\0')[1:]:
+            if '=' in field:
+                key, value = field.split('=', 1)
+                uevent[key] = value
+        return uevent
+
+    def close(self):
+        self.sock.close()
+
+
+def _open_listener():
+    """
+    :return: UeventListener or None if uevents can't be received, in
+             which case the callers fall back to polling
+    """
+    try:
+        return UeventListener()
+    except (socket.error, AttributeError) as e:
+        wok_log.debug("Unable to listen for uevents, polling instead. %s", e)
+        return None
+
+
+def wait_until(condition, timeout=UEVENT_TIMEOUT):
+    """
+    Wait until the given condition is met. The condition is checked
+    again whenever the kernel sends a uevent, so the caller is woken up
+    as soon as the device it cares about shows up instead of waiting for
+    the whole udev queue to drain.
+    :param condition: callable returning a true value once done
+    :param timeout: time in seconds to wait at most
+    :return: the last value returned by condition
+    """
+    # Listen before checking the condition, so that no event gets lost
+    listener = _open_listener()
+    try:
+        deadline = time.time() + timeout
+        result = condition()
+        while not result:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+
+            if listener:
+                listener.wait(min(remaining, POLL_INTERVAL))
+            else:
+                time.sleep(min(remaining, POLL_INTERVAL))
+            result = condition()
+        return result
+    finally:
+        if listener:
+            listener.close()
+
+
+def wait_for_paths(paths, timeout=UEVENT_TIMEOUT):
+    """
+    Wait until all the given sysfs paths exist
+    :param paths: list of paths
+    :param timeout: time in seconds to wait at most
+    :return: list of the paths which still do not exist
+    """
+    missing = [list(paths)]
+
+    def all_present():
+        missing[0] = [path for path in missing[0] if not os.path.exists(path)]
+        return not missing[0]
+
+    wait_until(all_present, timeout)
+    return missing[0]
+
+
+def watch(callback, subsystems):
+    """
+    Call the given callback from a background thread whenever the kernel
+    sends a uevent of one of the given subsystems. The callback is also
+    called if uevents got dropped, as any of them may have been relevant.
+    :param callback: callable taking no parameters
+    :param subsystems: list of subsystems, e.g. ['ccw', 'css']
+    :return: True if watching, False if uevents can't be received
+    """
+    listener = _open_listener()
+    if not listener:
+        return False
+
+    def run():
+        while True:
+            uevent = listener.wait(None)
+            if uevent is None:
+                continue
+            if not uevent or uevent.get('SUBSYSTEM') in subsystems:
+                try:
+                    callback()
+                except Exception as e:
+                    wok_log.error("Failed to handle uevent %s. %s",
+                                  uevent, e)
+
+    thread = threading.Thread(target=run)
+    thread.setDaemon(True)
+    thread.start()
+    return True
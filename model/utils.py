@@ -18,12 +18,19 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
 import ConfigParser
+import copy
 import glob
 import re
 import os
+import threading
+import time
 
+import fc_sysfs
+import model_utils
+import persistence
+import uevent
 from wok.exception import OperationFailed, InvalidParameter
-from os import listdir
+from wok.plugins.gingers390x.config import config
 from wok.utils import run_command, wok_log
 
 res_hash = {}
@@ -33,52 +40,49 @@ ports = []
 adapter_dir = '/sys/bus/ccw/drivers/zfcp/'
 wlun = "0xc101000000000000"
 lun0 = "0x0000000000000000"
-sg_dir = "/sys/class/scsi_generic/"
-udevadm = "/sbin/udevadm"
+# Time in seconds to wait for a LUN added temporarily to a port to report
+# the LUNs of the port, at most a quarter of lun_probe_timeout
+TEMP_LUN_TIMEOUT = 10
+sg_dir = fc_sysfs.sg_dir
 
 
-def _get_lun_dict():
+class LUNDiscovery(object):
     """
-    Get the dictionary of LUNs configured on the system.
-    :return: Dictionary containing discovered LUNs and their attributes
+    Discovery state of the LUNs available on the system. The sg devices
+    are scanned once, later refreshes only look at the sg devices which
+    appeared or went away and rescan just the ports they belong to.
     """
-    lun_dict = {}
 
-    # Get the list of sg devices of configured LUNs (FC)
-    sg_devices = get_sg_devices()
-
-    # Iterate over all FC sg devices
-    for sg_dev in sg_devices:
-        wwpn = open(sg_dir + "/" + sg_dev + "/device/wwpn").readline().rstrip()
-        fcp_lun = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/fcp_lun").readline().rstrip()
-        hba_id = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/hba_id").readline().rstrip()
-
-        if hba_id not in lun_dict:
-            lun_dict[hba_id] = {}
-
-        wwpn_lun_dict = {wwpn: {}}
-        if wwpn not in lun_dict[hba_id]:
-            lun_dict[hba_id].update(wwpn_lun_dict)
-
-        fcp_lun_dict = {fcp_lun: sg_dev}
+    def __init__(self):
+        # serializes refreshes triggered by concurrent port probes
+        self.lock = threading.Lock()
+        self.snapshot = fc_sysfs.take_snapshot()
+        self.lun_dict = {}
+        for adapter, port in self.snapshot.ports():
+            self._scan_port(adapter, port)
+
+        # Dumping the LUNs info in logs. This could be very helpful
+        # in dealing with issues where we won't have access to live system
+        wok_log.info("Available LUNs on the system, %s", self.lun_dict)
+
+    def _scan_port(self, adapter, port):
+        """
+        Rebuild the LUNs of a single remote port from the snapshot
+        :param adapter: HBA adapter id
+        :param port: Remote port wwpn
+        """
+        port_luns = self.snapshot.port_luns(adapter, port)
+        lun_dict = dict(port_luns)
 
         # Lets see what other LUNs we can disocover using LUN 0
-        if fcp_lun == lun0 or fcp_lun == wlun:
+        for fcp_lun, sg_dev in port_luns.iteritems():
+            if fcp_lun != lun0 and fcp_lun != wlun:
+                continue
+
             out, err, rc = run_command(['sg_luns', '/dev/' + sg_dev])
             if rc == 0:
-                luns = parse_sg_luns(out)
-                for lun in luns:
-                    if lun == fcp_lun:
-                        continue
-                    fcp_lun_dict.update({lun: None})
+                for lun in parse_sg_luns(out):
+                    lun_dict.setdefault(lun, None)
             else:
                 wok_log.error(
                     "Error getting sg_luns for sg device. %s", sg_dev)
@@ -87,13 +91,28 @@ def _get_lun_dict():
                 # this LUN. That way we could grab as much info as
                 # possible from system.
 
-        if fcp_lun not in lun_dict[hba_id][wwpn]:
-            lun_dict[hba_id][wwpn].update(fcp_lun_dict)
+        if lun_dict:
+            self.lun_dict.setdefault(adapter, {})[port] = lun_dict
+        elif port in self.lun_dict.get(adapter, {}):
+            del self.lun_dict[adapter][port]
 
-    # Dumping the LUNs info in logs. This could be very helpful
-    # in dealing with issues where we won't have access to live system
-    wok_log.info("Available LUNs on the system, %s", lun_dict)
-    return lun_dict
+    def refresh(self):
+        """
+        Pick up sg devices added or removed since the last scan and rescan
+        only the ports they belong to.
+        """
+        for adapter, port in self.snapshot.refresh():
+            self._scan_port(adapter, port)
+
+    def has_port(self, adapter, port):
+        return port in self.lun_dict.get(adapter, {})
+
+    def get_port_luns(self, adapter, port):
+        """
+        :return: Dictionary of LUN id -> sg device (None if the LUN
+                 is only discovered and not configured) of the given port
+        """
+        return self.lun_dict.get(adapter, {}).get(port, {})
 
 
 def _get_sg_inq_dict(sg_inq_output):
@@ -136,6 +155,88 @@ def _get_sg_inq_dict(sg_inq_output):
     return sg_inq_dict
 
 
+class InquiryCache(object):
+    """
+    SCSI inquiry data of the FC LUNs, keyed by (hba_id, wwpn, fcp_lun,
+    sg_device). Vendor, product, type and serial number do not change
+    while a LUN stays attached, so 'sg_inq' runs only once per sg device.
+    An entry is dropped once its sg device disappears or gets re-created,
+    which is detected by the inode of the sg device in sysfs.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def _identity(self, sg_dev):
+        return fc_sysfs.sg_identity(sg_dev)
+
+    def _inquire(self, sg_dev):
+        out, err, rc = run_command(["sg_inq", "/dev/" + sg_dev])
+        if rc != 0:
+            wok_log.error("Error getting sg_inq for sg device. %s", sg_dev)
+            return None
+        return _get_sg_inq_dict(out)
+
+    def get(self, hba_id, wwpn, fcp_lun, sg_dev):
+        """
+        :return: Dictionary of parsed 'sg_inq' output of the given LUN
+                 or None if the sg device could not be inquired
+        """
+        key = (hba_id, wwpn, fcp_lun, sg_dev)
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """
+        Collect the inquiry data of many LUNs at once. The sg devices
+        missing in the cache are inquired concurrently by a bounded
+        number of workers.
+        :param keys: List of (hba_id, wwpn, fcp_lun, sg_device) tuples
+        :return: Dictionary of key -> parsed 'sg_inq' output, keys which
+                 could not be inquired are left out
+        """
+        inquiry = {}
+        misses = []
+        with self.lock:
+            for key in keys:
+                identity = self._identity(key[3])
+                entry = self.entries.get(key)
+                if identity is None:
+                    self.entries.pop(key, None)
+                elif entry and entry[0] == identity:
+                    inquiry[key] = dict(entry[1])
+                else:
+                    misses.append((key, identity))
+
+        results = model_utils.run_in_pool(
+            lambda miss: self._inquire(miss[0][3]), misses, self.workers)
+
+        with self.lock:
+            for (key, identity), (sg_inq_dict, error) in zip(misses,
+                                                               results):
+                if error:
+                    wok_log.error("Unable to inquire sg device %s, %s",
+                                  key[3], error)
+                elif sg_inq_dict:
+                    self.entries[key] = (identity, sg_inq_dict)
+                    inquiry[key] = dict(sg_inq_dict)
+
+        return inquiry
+
+    def prune(self):
+        """
+        Drop the entries of sg devices which are gone or got re-created
+        """
+        with self.lock:
+            for key, (identity, _) in self.entries.items():
+                if self._identity(key[3]) != identity:
+                    del self.entries[key]
+
+
+inquiry_cache = InquiryCache(config["inquiry_workers"])
+
+
 def remove_lun(adapter, port, lun_id):
     """
     Remove a LUN from system
@@ -150,60 +251,36 @@ def remove_lun(adapter, port, lun_id):
     wok_log.info("Removing LUN, %s", lun_dir)
 
     # Let's look for the sg_device associated with this LUN
-    sg_device = ''
-    sg_devices = get_sg_devices()
-    for sg_dev in sg_devices:
-        wwpn = open(sg_dir + "/" + sg_dev + "/device/wwpn").readline().rstrip()
-        fcp_lun = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/fcp_lun").readline().rstrip()
-        hba_id = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/hba_id").readline().rstrip()
-
-        if hba_id == adapter and wwpn == port and fcp_lun == lun_id:
-            sg_device = sg_dev
-
-            break
+    sg_device = get_sg_dev(adapter, port, lun_id)
 
     if not os.path.exists(lun_dir):
         return
     else:
-        # If there is any sg_device, remove it
-        # If there is no sg_device, then the LUN was only discovered
-        # and not configured, so we don't have to do anything
-        if sg_device:
-            try:
-                with open(sg_dir + sg_device + '/device/delete', "w")\
-                        as txt_file:
-                    txt_file.write("1")
-            except Exception as e:
-                wok_log.error("Unable to remove sg_dev, %s", sg_device)
-                raise OperationFailed("GS390XSTG00001", {'err': e.message})
+        try:
+            # If there is any sg_device, remove it
+            # If there is no sg_device, then the LUN was only discovered
+            # and not configured, so we don't have to do anything
+            if sg_device:
+                try:
+                    with open(sg_dir + sg_device + '/device/delete', "w")\
+                            as txt_file:
+                        txt_file.write("1")
+                except Exception as e:
+                    wok_log.error("Unable to remove sg_dev, %s", sg_device)
+                    raise OperationFailed("GS390XSTG00001", {'err': e.message})
 
-            try:
-                with open(port_dir + 'unit_remove', "w") as txt_file:
-                    txt_file.write(lun_id)
+                try:
+                    with open(port_dir + 'unit_remove', "w") as txt_file:
+                        txt_file.write(lun_id)
 
-                fo = open("/etc/zfcp.conf", "r")
-                lines = fo.readlines()
-                output = []
-                fo.close()
-                fo = open("/etc/zfcp.conf", "w")
-                for line in lines:
-                    if [adapter, port, lun_id] == line.split():
-                        continue
-                    else:
-                        output.append(line)
-                fo.writelines(output)
-                fo.close()
-            except Exception as e:
-                wok_log.error("Unable to remove LUN, %s", lun_dir)
-                raise OperationFailed("GS390XSTG00002", {'err': e.message})
+                    persistence.zfcp_conf.update(
+                        remove=[' '.join([adapter, port, lun_id])])
+                except Exception as e:
+                    wok_log.error("Unable to remove LUN, %s", lun_dir)
+                    raise OperationFailed("GS390XSTG00002", {'err': e.message})
+        finally:
+            # The LUN may be partly removed even on failure
+            lun_inventory.invalidate()
 
 
 def add_lun(adapter, port, lun_id):
@@ -227,27 +304,132 @@ def add_lun(adapter, port, lun_id):
             with open(port_dir + 'unit_add', "w") as txt_file:
                 txt_file.write(lun_id)
 
-            for _ in range(4):
-                # Don't wait for udev queue to completely flush.
-                # Wait for the relavant entry for this LUN is created in sysfs
-                run_command([udevadm, "settle", "--exit-if-exists=" + lun_dir])
-                if os.path.exists(lun_dir):
-                    entry_exists = False
-                    fo = open("/etc/zfcp.conf", "r")
-                    lines = fo.readlines()
-                    for line in lines:
-                        if [adapter, port, lun_id] == line.split():
-                            entry_exists = True
-                    fo.close()
-                    if not entry_exists:
-                        with open("/etc/zfcp.conf", "a") as zfcp:
-                            zfcp.write(adapter+" "+port+" "+lun_id+"\n")
-                    break
+            # Don't wait for udev queue to completely flush.
+            # Wait for the relavant entry for this LUN is created in sysfs
+            if not uevent.wait_for_paths([lun_dir]):
+                persistence.zfcp_conf.update(
+                    add=[' '.join([adapter, port, lun_id])])
 
         except Exception as e:
             wok_log.error("Unable to add LUN, %s", lun_dir)
             raise OperationFailed("GS390XSTG00003", {'err': e.message})
 
+        finally:
+            lun_inventory.invalidate()
+
+
+def add_luns(cb, luns):
+    """
+    Add many LUNs to the system. The LUNs are added to their ports one
+    after the other without waiting in between, then the sysfs entries of
+    all of them are waited for at once and the ones which showed up are
+    persisted with a single update of /etc/zfcp.conf.
+    :param cb: callback of the task
+    :param luns: List of (adapter, port, lun_id) tuples
+    """
+    cb('')  # reset messages
+    failed_luns = {}
+    added = []
+    for adapter, port, lun_id in luns:
+        port_dir = adapter_dir + adapter + '/' + port + '/'
+        if os.path.exists(port_dir + lun_id):
+            # LUN already present on the system, nothing to add.
+            continue
+
+        wok_log.info("Adding LUN, %s", port_dir + lun_id)
+        try:
+            with open(port_dir + 'unit_add', "w") as txt_file:
+                txt_file.write(lun_id)
+            added.append((adapter, port, lun_id))
+        except Exception as e:
+            wok_log.error("Unable to add LUN, %s", port_dir + lun_id)
+            failed_luns[':'.join([adapter, port, lun_id])] = str(e)
+
+    try:
+        missing = uevent.wait_for_paths(
+            [adapter_dir + '/'.join(lun) for lun in added])
+        persist = []
+        for lun in added:
+            if adapter_dir + '/'.join(lun) in missing:
+                wok_log.error("LUN did not show up, %s", ':'.join(lun))
+                failed_luns[':'.join(lun)] = 'LUN did not show up in sysfs'
+            else:
+                persist.append(lun)
+
+        try:
+            persistence.zfcp_conf.update(
+                add=[' '.join(lun) for lun in persist])
+        except Exception as e:
+            wok_log.error("Unable to persist LUNs in %s, %s",
+                          persistence.zfcp_conf.path, e)
+            for lun in persist:
+                failed_luns[':'.join(lun)] = str(e)
+
+        if failed_luns:
+            raise OperationFailed("GS390XSTG00021",
+                                  {'failed_luns': failed_luns})
+        wok_log.info("Successfully added LUNs %s", luns)
+        cb('Successfully added LUNs %s' %
+           ', '.join(':'.join(lun) for lun in luns), True)
+    except Exception as e:
+        cb(e.__str__(), False)
+    finally:
+        lun_inventory.invalidate()
+
+
+def remove_luns(cb, luns):
+    """
+    Remove many LUNs from the system. The sg devices are looked up in a
+    single snapshot and the entries of all the LUNs are dropped from
+    /etc/zfcp.conf with a single update.
+    :param cb: callback of the task
+    :param luns: List of (adapter, port, lun_id) tuples
+    """
+    cb('')  # reset messages
+    failed_luns = {}
+    removed = []
+    try:
+        snapshot = fc_sysfs.take_snapshot()
+        for adapter, port, lun_id in luns:
+            port_dir = adapter_dir + adapter + '/' + port + '/'
+            sg_device = snapshot.lookup(adapter, port, lun_id)
+            # If there is no sg_device, then the LUN was only discovered
+            # and not configured, so we don't have to do anything
+            if not os.path.exists(port_dir + lun_id) or not sg_device:
+                continue
+
+            wok_log.info("Removing LUN, %s", port_dir + lun_id)
+            try:
+                with open(sg_dir + sg_device + '/device/delete', "w")\
+                        as txt_file:
+                    txt_file.write("1")
+                with open(port_dir + 'unit_remove', "w") as txt_file:
+                    txt_file.write(lun_id)
+                removed.append((adapter, port, lun_id))
+            except Exception as e:
+                wok_log.error("Unable to remove LUN, %s", port_dir + lun_id)
+                failed_luns[':'.join([adapter, port, lun_id])] = str(e)
+
+        try:
+            persistence.zfcp_conf.update(
+                remove=[' '.join(lun) for lun in removed])
+        except Exception as e:
+            wok_log.error("Unable to unpersist LUNs in %s, %s",
+                          persistence.zfcp_conf.path, e)
+            for lun in removed:
+                failed_luns[':'.join(lun)] = str(e)
+
+        if failed_luns:
+            raise OperationFailed("GS390XSTG00022",
+                                  {'failed_luns': failed_luns})
+        wok_log.info("Successfully removed LUNs %s", luns)
+        cb('Successfully removed LUNs %s' %
+           ', '.join(':'.join(lun) for lun in luns), True)
+    except Exception as e:
+        cb(e.__str__(), False)
+    finally:
+        lun_inventory.invalidate()
+
 
 def get_lun_info(adapter, port, lun_id):
     """
@@ -256,9 +438,11 @@ def get_lun_info(adapter, port, lun_id):
     :param port: Remote port wwpn
     :param lun_id: Id of the given LUN
     :return: Dictionary containing detailed information about a specific LUN
+    :raises: OperationFailed if the LUN can't be added temporarily or no
+             sg_device showed up for it
     """
 
-    port_dir = '/sys/bus/ccw/drivers/zfcp/' + adapter + '/' + port + '/'
+    port_dir = adapter_dir + adapter + '/' + port + '/'
     lun_dir = port_dir + lun_id
 
     lun_info = {}
@@ -272,79 +456,57 @@ def get_lun_info(adapter, port, lun_id):
             with open(port_dir + 'unit_add', "w") as txt_file:
                 txt_file.write(lun_id)
 
-            for _ in range(4):
-                run_command([udevadm, "settle", "--exit-if-exists=" + lun_dir])
-                if os.path.exists(lun_dir):
-                    break
-
-            if not os.path.exists(lun_dir):
+            if uevent.wait_for_paths([lun_dir]):
                 with open(port_dir + 'unit_remove', "w") as txt_file:
                     txt_file.write(lun0)
 
                 with open(port_dir + 'unit_add', "w") as txt_file:
                     txt_file.write(wlun)
 
-                for _ in range(4):
-                    run_command(
-                        [udevadm, "settle", "--exit-if-exists=" + lun_dir])
-
-                    if os.path.exists(lun_dir):
-                        break
-
-                    if not os.path.exists(lun_dir):
-                        with open(port_dir + 'unit_remove', "w") as txt_file:
-                            txt_file.write(wlun)
+                if uevent.wait_for_paths([lun_dir]):
+                    with open(port_dir + 'unit_remove', "w") as txt_file:
+                        txt_file.write(wlun)
 
         except Exception as e:
             wok_log.error("Unable to add LUN temporarily, %s", lun_dir)
             raise OperationFailed("GS390XSTG00003", {'err': e.message})
 
-    # Get the list of FC only sg devices. This includes the sg_devices
-    # of temporary LUNs as well.
-    sg_devices = get_sg_devices()
-    for sg_dev in sg_devices:
-        wwpn = open(sg_dir + "/" + sg_dev + "/device/wwpn").readline().rstrip()
-        fcp_lun = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/fcp_lun").readline().rstrip()
-        hba_id = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/hba_id").readline().rstrip()
-
-        if hba_id == adapter and wwpn == port and fcp_lun == lun_id:
-            lun_info['hbaId'] = hba_id
-            lun_info['remoteWwpn'] = port
-            lun_info['lunId'] = lun_id
+    # Look up the FC sg device of the LUN. This includes the sg_devices
+    # of temporary LUNs as well, which may take a moment to show up.
+    if lun_info['configured']:
+        sg_dev = get_sg_dev(adapter, port, lun_id)
+    else:
+        sg_dev = _wait_for_sg_dev(adapter, port, lun_id)
+    if sg_dev:
+        lun_info['hbaId'] = adapter
+        lun_info['remoteWwpn'] = port
+        lun_info['lunId'] = lun_id
 
-            lun_info['sgDev'] = sg_dev
-            out, err, rc = run_command(["sg_inq", "/dev/" + sg_dev])
-            if rc == 0:
-                lun_info.update(_get_sg_inq_dict(out))
-            break
+        lun_info['sgDev'] = sg_dev
+        sg_inq_dict = inquiry_cache.get(adapter, port, lun_id, sg_dev)
+        if sg_inq_dict:
+            lun_info.update(sg_inq_dict)
 
     # Get rid of the LUN if it's not configured
     if not lun_info['configured']:
         lun_info['configured'] = "false"
-        try:
-            wok_log.info("Removing sg_device , %s", lun_info['sgDev'])
-            with open(sg_dir + lun_info['sgDev'] + '/device/delete', "w")\
-                    as txt_file:
-                txt_file.write("1")
+        if sg_dev:
+            try:
+                wok_log.info("Removing sg_device , %s", sg_dev)
+                with open(sg_dir + sg_dev + '/device/delete', "w")\
+                        as txt_file:
+                    txt_file.write("1")
 
-            del lun_info['sgDev']
+                del lun_info['sgDev']
 
-        except Exception as e:
-            wok_log.error("Unable to remove sg_device , %s", lun_info['sgDev'])
-            raise OperationFailed("GS390XSTG00001", {'err': e.message})
+            except Exception as e:
+                wok_log.error("Unable to remove sg_device , %s", sg_dev)
+                raise OperationFailed("GS390XSTG00001", {'err': e.message})
 
         try:
             wok_log.info("Removing LUN , %s", lun_dir)
             with open(port_dir + 'unit_remove', "w") as txt_file:
-                txt_file.write(fcp_lun)
+                txt_file.write(lun_id)
         except:
             # If failed to remove the given LUN, at least remove the wlun
             wok_log.info("Removing LUN , %s", port_dir + ":" + wlun)
@@ -357,57 +519,113 @@ def get_lun_info(adapter, port, lun_id):
                 wok_log.error(
                     "Removing LUN failed , %s",
                     port_dir + ":" + wlun)
+
+        if not sg_dev:
+            wok_log.error("No sg_device showed up for LUN, %s", lun_dir)
+            raise OperationFailed("GS390XSTG00023", {'lun': lun_dir})
     else:
         lun_info['configured'] = "true"
 
     return lun_info
 
 
+def is_lun_configured(adapter, port, lun_id):
+    """
+    :return: True if the given LUN is added to the system
+    """
+    return os.path.exists(adapter_dir + adapter + '/' + port + '/' + lun_id)
+
+
+def get_luns_info(lun_paths):
+    """
+    Get detailed information about many LUNs at once. The sg devices of
+    the configured LUNs are looked up in a single snapshot and inquired
+    in one batch. Unconfigured LUNs have to be added temporarily, which
+    is done one LUN at a time per port with the ports handled
+    concurrently.
+    :param lun_paths: List of (adapter, port, lun_id) tuples
+    :return: List of dictionaries as returned by get_lun_info, in the
+             order of lun_paths
+    """
+    snapshot = fc_sysfs.take_snapshot()
+    luns_info = {}
+    inquiry_keys = []
+    unconfigured = {}
+
+    for adapter, port, lun_id in lun_paths:
+        lun_info = {'hbaId': adapter, 'remoteWwpn': port, 'lunId': lun_id}
+        luns_info[(adapter, port, lun_id)] = lun_info
+        if not is_lun_configured(adapter, port, lun_id):
+            lun_info['configured'] = "false"
+            unconfigured.setdefault((adapter, port), []).append(lun_id)
+            continue
+
+        lun_info['configured'] = "true"
+        sg_dev = snapshot.lookup(adapter, port, lun_id)
+        if sg_dev:
+            lun_info['sgDev'] = sg_dev
+            inquiry_keys.append((adapter, port, lun_id, sg_dev))
+
+    for key, sg_inq_dict in inquiry_cache.get_many(inquiry_keys).iteritems():
+        luns_info[key[:3]].update(sg_inq_dict)
+
+    def port_luns_info(adapter_port):
+        adapter, port = adapter_port
+        for lun_id in unconfigured[adapter_port]:
+            try:
+                luns_info[(adapter, port, lun_id)].update(
+                    get_lun_info(adapter, port, lun_id))
+            except Exception as e:
+                # Keep going, the other LUNs of the port may still work
+                wok_log.error("Unable to get info of LUN %s:%s:%s, %s",
+                              adapter, port, lun_id, e)
+
+    ports = unconfigured.keys()
+    results = model_utils.run_in_pool(port_luns_info, ports,
+                                      config["lun_probe_workers"])
+    for (adapter, port), (_, error) in zip(ports, results):
+        if error:
+            wok_log.error("Unable to get info of LUNs of port %s:%s, %s",
+                          adapter, port, error)
+
+    return [luns_info[tuple(lun_path)] for lun_path in lun_paths]
+
+
 def get_sg_devices():
     """
     Returns the list of FC only 'sg' devices.
     :return List of FC only sg_devices
     """
 
-    sg_devices = []
-    for sg_dev in listdir(sg_dir):
+    return fc_sysfs.take_snapshot().names()
 
-        # skip devices whose transport is not FC
-        if os.path.exists(sg_dir + "/" + sg_dev + "/device/wwpn"):
-            sg_devices.append(sg_dev)
 
-    return sg_devices
+def _wait_for_sg_dev(adapter, port, lun_id):
+    """
+    Wait for the sg_device of a LUN which has just been added
+    :param adapter: HBA adapter id
+    :param port: Remote port wwpn
+    :param lun_id: Id of the given LUN
+    :return: name of the sg_device or '' if it did not show up in time
+    """
+    snapshot = fc_sysfs.SGSnapshot()
+
+    def lookup_sg_dev():
+        snapshot.refresh()
+        return snapshot.lookup(adapter, port, lun_id)
+
+    return uevent.wait_until(lookup_sg_dev)
 
 
 def get_sg_dev(adapter, port, lun_id):
     """
     Find the corresponding sg_device for the given LUN
-    :param adapter:
-    :param port:
-    :param lun_id:
-    :return:
-    """
-    sg_device = ''
-
-    sg_devices = get_sg_devices()
-    for sg_dev in sg_devices:
-        wwpn = open(sg_dir + "/" + sg_dev + "/device/wwpn").readline().rstrip()
-        fcp_lun = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/fcp_lun").readline().rstrip()
-        hba_id = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/hba_id").readline().rstrip()
-
-        if hba_id == adapter and wwpn == port and fcp_lun == lun_id:
-            sg_device = sg_dev
-            break
-
-    return sg_device
+    :param adapter: HBA adapter id
+    :param port: Remote port wwpn
+    :param lun_id: Id of the given LUN
+    :return: name of the sg_device or '' if the LUN has none
+    """
+    return fc_sysfs.take_snapshot().lookup(adapter, port, lun_id)
 
 
 def _get_host_fcp_dict():
@@ -433,146 +651,377 @@ def _get_host_fcp_dict():
     return host_fcp_dict
 
 
+def _is_port_accessible(port_dir):
+    """
+    Check if the remote port is online and accessible
+    :param port_dir: sysfs directory of the remote port
+    :return: True if LUNs can be probed on the port, False otherwise
+    """
+    if not os.path.exists(port_dir):
+        return False
+
+    for attr in ['access_denied', 'failed', 'in_recovery']:
+        if open(port_dir + attr).readline().rstrip() == "1":
+            return False
+
+    return True
+
+
+def _is_unit_failed(unit_dir):
+    """
+    zfcp scans a unit for its SCSI device while it is added, a unit
+    without SCSI device is reported failed
+    :param unit_dir: sysfs directory of the unit
+    :return: True if no sg device is going to show up for the unit
+    """
+    try:
+        if open(unit_dir + 'in_recovery').readline().rstrip() == "1":
+            return False
+        return open(unit_dir + 'failed').readline().rstrip() == "1"
+    except IOError:
+        # the unit is gone
+        return True
+
+
+class PortProbe(object):
+    """
+    State of a port probe, shared with _probe_ports() which may give up
+    on the probe while it is still running
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.abandoned = False
+        self.temp_lun = None
+
+    def keep(self, temp_lun):
+        """
+        :return: False if the probe was given up, so the LUN added
+                 temporarily has to be removed by the probe itself
+        """
+        with self.lock:
+            if not self.abandoned:
+                self.temp_lun = temp_lun
+            return not self.abandoned
+
+    def abandon(self):
+        """
+        Give up on the probe
+        :return: LUN added temporarily if the probe finished meanwhile
+        """
+        with self.lock:
+            self.abandoned = True
+            return self.temp_lun
+
+
+def _probe_port(discovery, adapter, port, probe=None):
+    """
+    Temporarily add LUN 0 or, if that does not work, the well known
+    LUN to a port without any LUNs to initiate LUN discovery on it.
+    :param discovery: LUNDiscovery holding the current discovery state
+    :param adapter: HBA adapter id
+    :param port: Remote port wwpn
+    :param probe: PortProbe of the probe or None
+    :return: The LUN added temporarily or None if the port did not
+             report any LUNs
+    """
+    port_dir = adapter_dir + adapter + '/' + port + '/'
+    timeout = min(TEMP_LUN_TIMEOUT, config["lun_probe_timeout"] / 4.0)
+
+    def port_has_luns():
+        with discovery.lock:
+            discovery.refresh()
+            return discovery.has_port(adapter, port)
+
+    for temp_lun in [lun0, wlun]:
+        if probe is not None and probe.abandoned:
+            break
+        unit_dir = port_dir + temp_lun + '/'
+
+        def probed():
+            if port_has_luns():
+                return 'found'
+            if _is_unit_failed(unit_dir):
+                return 'failed'
+            return None
+
+        found = False
+        try:
+            with open(port_dir + 'unit_add', "w") as txt_file:
+                txt_file.write(temp_lun)
+
+            # Wait for the sg device of the new unit to show up, unless
+            # the unit scan failed already
+            found = uevent.wait_until(probed, timeout) == 'found'
+        except Exception:
+            wok_log.error("Unable to add LUN , %s", port_dir + temp_lun)
+
+        if found:
+            if probe is None or probe.keep(temp_lun):
+                return temp_lun
+
+            # Nobody else removes the LUN once the probe was given up, as
+            # it took too long
+            wok_log.info("Probing port %s:%s finished too late",
+                         adapter, port)
+            try:
+                _remove_temp_lun(discovery, adapter, port, temp_lun)
+            except OperationFailed:
+                # logged already
+                pass
+            return None
+
+        try:
+            with open(port_dir + 'unit_remove', "w") as txt_file:
+                txt_file.write(temp_lun)
+        except Exception:
+            wok_log.error(
+                "Unable to remove LUN , %s", port_dir + temp_lun)
+
+    return None
+
+
+def _probe_ports(discovery, ports):
+    """
+    Probe the given ports for LUNs. The ports are independent of each
+    other, so they are probed concurrently by a bounded number of workers
+    and a single port taking too long does not hold up the others.
+    :param discovery: LUNDiscovery holding the current discovery state
+    :param ports: List of (adapter, port) tuples
+    :return: Dictionary of (adapter, port) -> LUN added temporarily
+    """
+    workers = config["lun_probe_workers"]
+    timeout = config["lun_probe_timeout"]
+
+    probes = dict((adapter_port, PortProbe()) for adapter_port in ports)
+    results = model_utils.run_in_pool(
+        lambda adapter_port: _probe_port(discovery, adapter_port[0],
+                                         adapter_port[1],
+                                         probes[adapter_port]),
+        ports, workers, timeout)
+
+    temp_luns = {}
+    for (adapter, port), (temp_lun, error) in zip(ports, results):
+        if error:
+            # A probe still running removes its LUN itself, one which
+            # finished just now leaves it to the caller
+            temp_lun = probes[(adapter, port)].abandon()
+            if temp_lun:
+                temp_luns[(adapter, port)] = temp_lun
+            wok_log.error("Unable to probe LUNs of port %s:%s, %s",
+                          adapter, port, error)
+        elif temp_lun:
+            temp_luns[(adapter, port)] = temp_lun
+
+    return temp_luns
+
+
+def _remove_temp_lun(discovery, adapter, port, temp_lun):
+    """
+    Get rid of the LUN added temporarily for discovery
+    :param discovery: LUNDiscovery holding the current discovery state
+    :param adapter: HBA adapter id
+    :param port: Remote port wwpn
+    :param temp_lun: LUN added by _probe_port
+    """
+    port_dir = adapter_dir + adapter + '/' + port + '/'
+    sg_dev = discovery.get_port_luns(adapter, port).get(temp_lun)
+    if not sg_dev:
+        return
+
+    try:
+        wok_log.info("Removing sg_device , %s", sg_dev)
+        with open(sg_dir + sg_dev + '/device/delete', "w") as txt_file:
+            txt_file.write("1")
+
+    except Exception as e:
+        wok_log.error("Unable to remove sg_device , %s", sg_dev)
+        raise OperationFailed("GS390XSTG00001", {'err': e.message})
+
+    try:
+        wok_log.info("Removing LUN %s, %s", temp_lun, port_dir)
+        with open(port_dir + 'unit_remove', "w") as txt_file:
+            txt_file.write(temp_lun)
+    except:
+        # Can be safely ingored, so not raising exception
+        wok_log.error("unable to remove LUN %s, %s", temp_lun, port_dir)
+
+
 def get_luns():
     """
     Get the list of all the LUNs including unconfigured ones
     :return: List of all the LUN paths
     """
     host_fcp_dict = _get_host_fcp_dict()
-    global lun_dict
-    lun_dict = _get_lun_dict()
+    discovery = LUNDiscovery()
     luns = []
 
-    # Loop over all HBA adapters
+    # Collect every remote port of all HBA adapters, skipping the ones
+    # which went offline or are not accessible.
+    ports = []
     for adapter in host_fcp_dict:
-        # Loop over every remote port for the given HBA adapter
         for port in host_fcp_dict[adapter]:
-            temp_luns = {}
             port_dir = adapter_dir + adapter + '/' + port + '/'
+            if _is_port_accessible(port_dir):
+                ports.append((adapter, port))
+
+    # If no LUNs are associated with a port, try adding LUN 0
+    # to initiate LUN discovery on that port
+    temp_luns = _probe_ports(
+        discovery, [(adapter, port) for adapter, port in ports
+                    if not discovery.has_port(adapter, port)])
+
+    # Probes which timed out may still be refreshing the discovery state
+    with discovery.lock:
+        for adapter, port in ports:
+            for lun in discovery.get_port_luns(adapter, port):
+                luns.append(adapter + ":" + port + ":" + lun)
 
-            # If port went offline or is not accessible, skip.
-            if not os.path.exists(port_dir):
-                continue
-
-            access_denied = open(
-                port_dir + 'access_denied').readline().rstrip()
-            if access_denied == "1":
-                continue
-
-            failed = open(port_dir + 'failed').readline().rstrip()
-            if failed == "1":
-                continue
-
-            in_recovery = open(port_dir + 'in_recovery').readline().rstrip()
-            if in_recovery == "1":
-                continue
+            temp_lun = temp_luns.get((adapter, port))
+            if temp_lun:
+                _remove_temp_lun(discovery, adapter, port, temp_lun)
 
-            # If no LUNs are associated with this port, try adding LUN 0
-            # to initiate LUN discovery on this port later
-            if adapter not in lun_dict or port not in lun_dict[adapter]:
-                try:
-                    with open(port_dir + 'unit_add', "w") as txt_file:
-                        txt_file.write(lun0)
-
-                    for _ in range(4):
-                        run_command(
-                            [udevadm, "settle",
-                             "--exit-if-exists=" + port_dir + lun0])
-                        lun_dict = _get_lun_dict()
-                        if port in lun_dict[adapter]:
-                            temp_luns[lun0] = True
-                            break
+    inquiry_cache.prune()
+    return luns
 
-                except Exception as e:
-                    wok_log.error("Unable to add LUN 0 , %s", port_dir + lun0)
-
-                if adapter not in lun_dict or port not in lun_dict[adapter]:
-                    try:
-                        with open(port_dir + 'unit_remove', "w") as txt_file:
-                            txt_file.write(lun0)
-                        temp_luns[lun0] = False
-
-                    except Exception as e:
-                        wok_log.error(
-                            "Unable to remove LUN 0 , %s", port_dir + lun0)
-
-                    try:
-                        with open(port_dir + 'unit_add', "w") as txt_file:
-                            txt_file.write(wlun)
-
-                        for _ in range(4):
-                            run_command(
-                                [udevadm, "settle",
-                                 "--exit-if-exists=" + port_dir + "/" + wlun])
-                            lun_dict = _get_lun_dict()
-                            if port in lun_dict[adapter]:
-                                temp_luns[wlun] = True
-                                break
-
-                    except Exception as e:
-                        wok_log.error(
-                            "Unable to add wlun , %s", port_dir + wlun)
-
-                    if adapter not in lun_dict or port not in lun_dict[
-                            adapter]:
-                        try:
-                            with open(port_dir + 'unit_remove', "w")\
-                                    as txt_file:
-                                txt_file.write(wlun)
-                            temp_luns[wlun] = False
-                            continue
-
-                        except Exception as e:
-                            wok_log.error(
-                                "Unable to remove wlun , %s", port_dir + wlun)
-
-            for lun in lun_dict[adapter][port]:
-
-                lun_dict = _get_lun_dict()
-                luns.append(adapter + ":" + port + ":" + lun)
 
-                # Get rid of the LUN if added temporarily for discovery
-                if lun in temp_luns and temp_luns[lun] is True:
-                    sg_dev = ''
-                    if port in lun_dict[
-                            adapter] and lun in lun_dict[adapter][port]:
-                        sg_dev = lun_dict[adapter][port][lun]
-
-                    if sg_dev:
-                        try:
-                            wok_log.info("Removing sg_device , %s", sg_dev)
-                            with open(sg_dir + sg_dev + '/device/delete', "w")\
-                                    as txt_file:
-                                txt_file.write("1")
-
-                        except Exception as e:
-                            wok_log.error(
-                                "Unable to remove sg_device , %s", sg_dev)
-                            raise OperationFailed(
-                                "GS390XSTG00001", {'err': e.message})
-
-                        try:
-                            wok_log.info("Removing LUN 0, %s", port_dir)
-                            with open(port_dir + 'unit_remove', "w")\
-                                    as txt_file:
-                                txt_file.write(lun0)
-                        except:
-                            wok_log.error(
-                                "unable to remove LUN 0, %s", port_dir)
-                            wok_log.info("Removing wlun,  %s", wlun)
-                            try:
-                                with open(port_dir + 'unit_remove', "w")\
-                                        as txt_file:
-                                    txt_file.write(wlun)
-                            except:
-                                # Can be safely ingored, so not raising
-                                # exception
-                                wok_log.error(
-                                    "unable to remove wlun, %s", port_dir)
-
-                    temp_luns[lun] = False
+class LUNInventory(object):
+    """
+    Cached list of the LUN paths returned by get_luns(). Once the list is
+    older than the TTL it is still served while a background thread
+    rebuilds it. Only one rebuild runs at any time. The details of the
+    LUNs returned by get_luns_info() are cached for the TTL as well, as
+    getting them for LUNs which are not configured means adding them
+    temporarily.
+    """
 
-    return luns
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.refreshed = threading.Condition(self.lock)
+        self.luns = None
+        self.timestamp = 0
+        self.generation = 0
+        self.refreshing = False
+        self.error = None
+        # (adapter, port, lun_id) -> (timestamp, LUN details)
+        self.info = {}
+        # LUNs whose details are being fetched by another thread
+        self.pending = set()
+
+    def _refresh(self, generation):
+        luns = None
+        error = None
+        try:
+            luns = get_luns()
+        except Exception as e:
+            wok_log.error("Refreshing list of LUNs failed, %s", e)
+            error = e
+
+        with self.lock:
+            self.refreshing = False
+            self.error = error
+            # Drop the result if the inventory got invalidated meanwhile,
+            # it may not reflect the change
+            if luns is not None and generation == self.generation:
+                self.luns = luns
+                self.timestamp = time.time()
+            self.refreshed.notify_all()
+
+    def _start_refresh(self):
+        self.refreshing = True
+        self.error = None
+        thread = threading.Thread(target=self._refresh,
+                                  args=(self.generation,))
+        thread.setDaemon(True)
+        thread.start()
+
+    def get(self):
+        """
+        :return: List of all the LUN paths
+        """
+        with self.lock:
+            while True:
+                if self.luns is not None and \
+                        time.time() - self.timestamp < self.ttl:
+                    return list(self.luns)
+
+                if not self.refreshing:
+                    self._start_refresh()
+
+                # stale data is served while the refresh is in flight
+                if self.luns is not None:
+                    return list(self.luns)
+
+                self.refreshed.wait()
+                if self.luns is None and self.error:
+                    raise self.error
+
+    def _cached_info(self, lun_path):
+        entry = self.info.get(lun_path)
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    def get_info(self, lun_paths):
+        """
+        :param lun_paths: List of (adapter, port, lun_id) tuples
+        :return: List of the dictionaries returned by get_luns_info() for
+                 the given LUNs, in the order of lun_paths
+        """
+        lun_paths = [tuple(lun_path) for lun_path in lun_paths]
+        with self.lock:
+            generation = self.generation
+            missing = [lun_path for lun_path in set(lun_paths)
+                       if lun_path not in self.pending and
+                       self._cached_info(lun_path) is None]
+            self.pending.update(missing)
+
+        luns_info = {}
+        try:
+            if missing:
+                luns_info = dict(zip(missing, get_luns_info(missing)))
+        finally:
+            with self.lock:
+                self.pending.difference_update(missing)
+                # Drop the details if the inventory got invalidated
+                # meanwhile, they may not reflect the change
+                if generation == self.generation:
+                    now = time.time()
+                    for lun_path, lun_info in luns_info.iteritems():
+                        self.info[lun_path] = (now, lun_info)
+                self.refreshed.notify_all()
+
+        # Wait for the LUNs fetched by other threads
+        with self.lock:
+            while any(lun_path in self.pending for lun_path in lun_paths):
+                self.refreshed.wait()
+            for lun_path in lun_paths:
+                if lun_path not in luns_info:
+                    lun_info = self._cached_info(lun_path)
+                    if lun_info is not None:
+                        luns_info[lun_path] = lun_info
+
+        # The other threads may have failed or got invalidated
+        missing = [lun_path for lun_path in set(lun_paths)
+                   if lun_path not in luns_info]
+        if missing:
+            luns_info.update(zip(missing, get_luns_info(missing)))
+
+        return [copy.deepcopy(luns_info[lun_path]) for lun_path in lun_paths]
+
+    def invalidate(self):
+        """
+        Drop the cached LUNs and their details, the next get() waits for
+        a fresh list
+        """
+        with self.lock:
+            self.luns = None
+            self.info = {}
+            self.generation += 1
+
+
+lun_inventory = LUNInventory(config["lun_cache_ttl"])
 
 
 def parse_sg_luns(sg_luns_output):
@@ -751,6 +1200,7 @@ def trigger_lun_scan(cb, params):
     try:
         wok_log.info('Triggering LUN scan using rescan-ssci-bus.sh')
         out, err, rc = run_command(['/usr/bin/rescan-scsi-bus.sh', '-a'])
+        lun_inventory.invalidate()
         if rc:
             wok_log.error('failed to trigger LUN scan,  %s', err)
             cb(err, False)
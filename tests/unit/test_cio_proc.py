@@ -0,0 +1,291 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import errno
+import json
+import mock
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from model import cio_proc, cio_ranges
+from model.cioignore import CIOIgnoreModel, IgnoreListIndex
+from model.cioignore import _remove_and_settle
+from model.cioignore import _remove_devices
+from wok.model.tasks import TaskModel
+from wok.objectstore import ObjectStore
+from wok.utils import add_task
+
+
+class FakeCIOIgnore(object):
+    """
+    Fake /proc/cio_ignore, a write of a rejected device id fails with
+    EINVAL like in the kernel
+    """
+
+    def __init__(self, ignored, rejected=()):
+        self.rejected = rejected
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'cio_ignore')
+        with open(self.path, 'w') as cio_ignore:
+            cio_ignore.write(''.join(line + '\n' for line in ignored))
+        self.writes = []
+
+    def write(self, fd, data):
+        self.writes.append(data)
+        if any(device in data for device in self.rejected):
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+        return len(data)
+
+    def cleanup(self):
+        shutil.rmtree(self.root)
+
+
+class CIOIgnoreProcUnitTests(unittest.TestCase):
+    """
+    unit tests for reading and writing the ignore list through
+    /proc/cio_ignore
+    """
+
+    def setUp(self):
+        self.proc = FakeCIOIgnore(['0.0.0011', '0.0.0013-0.0.0015'],
+                                  rejected=['0.0.0020'])
+        self.addCleanup(self.proc.cleanup)
+        patcher = mock.patch('model.cio_proc.cio_ignore_path',
+                             self.proc.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.cioignore.run_command', autospec=True)
+        self.mock_run_command = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.messages = []
+
+    def cb(self, msg, status=None):
+        self.messages.append((msg, status))
+
+    @mock.patch('model.cioignore.TaskModel', autospec=True)
+    def test_lookup(self, mock_task_model):
+        self.assertEqual(CIOIgnoreModel().lookup(None),
+                         {'ignored_devices': ['0.0.0011',
+                                              '0.0.0013-0.0.0015']})
+        self.assertFalse(self.mock_run_command.called)
+
+    def test_free_single_write(self):
+        """
+        unit test to validate that all devices are removed with one write
+        """
+        cio_proc.free('0.0.0011,0.0.0013-0.0.0015')
+        with open(self.proc.path) as cio_ignore:
+            self.assertTrue(cio_ignore.read().startswith(
+                'free 0.0.0011,0.0.0013-0.0.0015\n'))
+
+    def test_remove_devices(self):
+        with mock.patch('model.cio_proc.os.write',
+                        side_effect=self.proc.write):
+            _remove_devices(self.cb, ['0.0.0011', '13-15', '0.0.0016'])
+        self.assertEqual(self.proc.writes,
+                         ['free 0.0.0011,0.0.0013-0.0.0016\n'])
+        self.assertTrue(self.messages[-1][1])
+        self.assertFalse(self.mock_run_command.called)
+
+    def test_remove_invalid_devices(self):
+        """
+        unit test to validate that devices rejected by the kernel are
+        reported without falling back to cio_ignore
+        """
+        with mock.patch('model.cio_proc.os.write',
+                        side_effect=self.proc.write):
+            _remove_devices(self.cb, ['0.0.0011', '0.0.0020'])
+        self.assertEqual(self.proc.writes,
+                         ['free 0.0.0011,0.0.0020\n', 'free 0.0.0011\n',
+                          'free 0.0.0020\n'])
+        msg, status = self.messages[-1]
+        self.assertFalse(status)
+        self.assertIn('0.0.0020', msg)
+        self.assertFalse(self.mock_run_command.called)
+
+    def test_fallback_to_cio_ignore(self):
+        self.mock_run_command.return_value = ['', '', 0]
+        with mock.patch('model.cio_proc.os.open',
+                        side_effect=OSError(errno.EACCES, 'denied')):
+            _remove_devices(self.cb, ['0.0.0011'])
+        self.mock_run_command.assert_called_once_with(
+            ['cio_ignore', '-r', '0.0.0011'])
+        self.assertTrue(self.messages[-1][1])
+
+    @mock.patch('model.cioignore.TaskModel', autospec=True)
+    def test_query_devices(self, mock_task_model):
+        """
+        unit test to validate which of the queried devices are reported as
+        ignored, along with the counts
+        """
+        devices = ['0.0.%04x' % devno for devno in range(0, 10000)]
+        result = CIOIgnoreModel().query(None,
+                                        devices + ['0.0.0011', 'invalid'])
+        self.assertEqual(result, {
+            'ignored_devices': ['0.0.0011', '0.0.0013-0.0.0015'],
+            'ignored_count': 4, 'queried_count': 10000,
+            'total_ignored_count': 4,
+            'invalid_devices': {'invalid': 'invalid device id: invalid'}})
+        self.assertFalse(self.mock_run_command.called)
+
+    @mock.patch('model.cioignore.TaskModel', autospec=True)
+    @mock.patch('model.cioignore.cio_ranges.RangeIndex',
+                wraps=cio_ranges.RangeIndex)
+    def test_index_built_once(self, mock_range_index, mock_task_model):
+        """
+        unit test to validate that the index is only built again once
+        the ignore list changed
+        """
+        cio_model = CIOIgnoreModel()
+        with mock.patch('model.cioignore.ignore_index', IgnoreListIndex()):
+            cio_model.query(None, ['0.0.0011'])
+            cio_model.query(None, ['0.0.0012'])
+            self.assertEqual(mock_range_index.call_count, 1)
+            with open(self.proc.path, 'w') as cio_ignore:
+                cio_ignore.write('0.0.0012\n')
+            result = cio_model.query(None, ['0.0.0012'])
+        self.assertEqual(mock_range_index.call_count, 2)
+        self.assertEqual(result['ignored_devices'], ['0.0.0012'])
+
+
+class RemoveAndSettleUnitTests(unittest.TestCase):
+    """
+    unit tests for waiting until the devices removed from the ignore list
+    are registered
+    """
+
+    def setUp(self):
+        self.proc = FakeCIOIgnore(['0.0.0190-0.0.0193'])
+        self.addCleanup(self.proc.cleanup)
+        self.settle_path = os.path.join(self.proc.root, 'cio_settle')
+        with open(self.settle_path, 'w'):
+            pass
+        self.ccw_dir = os.path.join(self.proc.root, 'ccw') + '/'
+        os.mkdir(self.ccw_dir)
+        for target, value in (('cio_ignore_path', self.proc.path),
+                              ('cio_settle_path', self.settle_path)):
+            patcher = mock.patch('model.cio_proc.' + target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.cioignore.ccw_devices_dir', self.ccw_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.cio_proc.os.write',
+                             side_effect=self.write)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.messages = []
+
+    def write(self, fd, data):
+        if data.startswith('free'):
+            return self.proc.write(fd, data)
+        # the channel subsystem registers the devices while settling
+        self.add_devices(['0.0.0190', '0.0.0191', '0.0.0193'])
+        return len(data)
+
+    def add_devices(self, devices):
+        for device in devices:
+            os.mkdir(self.ccw_dir + device)
+
+    def cb(self, msg, status=None):
+        self.assertIsInstance(msg, basestring)
+        self.messages.append((msg, status))
+
+    def result(self):
+        msg, status = self.messages[-1]
+        return json.loads(msg), status
+
+    @mock.patch('model.cioignore.uevent.wait_until', autospec=True)
+    def test_settle(self, mock_wait_until):
+        _remove_and_settle(self.cb, ['0.0.0190-0.0.0193'])
+        self.assertEqual(self.result(),
+                         ({'ready_devices': ['0.0.0190-0.0.0191',
+                                             '0.0.0193'],
+                           'missing_devices': ['0.0.0192']}, True))
+        self.assertFalse(mock_wait_until.called)
+
+    @mock.patch('model.cioignore.uevent.wait_until', autospec=True)
+    def test_settle_task(self, mock_wait_until):
+        """
+        unit test to validate that the task run by wok finishes with the
+        readiness of the devices as its message
+        """
+        objstore = ObjectStore(os.path.join(self.proc.root, 'objstore'))
+        taskid = add_task('/plugins/gingers390x/cioignore/remove',
+                          _remove_and_settle, objstore,
+                          ['0.0.0190-0.0.0193'])
+        task_model = TaskModel(objstore=objstore)
+        for _ in range(100):
+            task = task_model.lookup(taskid)
+            if task['status'] != 'running':
+                break
+            time.sleep(0.1)
+        self.assertEqual(task['status'], 'finished', task['message'])
+        self.assertEqual(json.loads(task['message']),
+                         {'ready_devices': ['0.0.0190-0.0.0191',
+                                            '0.0.0193'],
+                          'missing_devices': ['0.0.0192']})
+
+    @mock.patch('model.cioignore.uevent.wait_until', autospec=True)
+    def test_settle_with_uevents(self, mock_wait_until):
+        """
+        unit test to validate that the devices are waited for, if the
+        channel subsystem can't be asked to settle
+        """
+        os.unlink(self.settle_path)
+
+        def wait_until(condition, timeout):
+            self.assertFalse(condition())
+            self.add_devices(['0.0.0190', '0.0.0191', '0.0.0192',
+                              '0.0.0193'])
+            return condition()
+        mock_wait_until.side_effect = wait_until
+        _remove_and_settle(self.cb, ['0.0.0190-0.0.0193'])
+        self.assertEqual(self.result(),
+                         ({'ready_devices': ['0.0.0190-0.0.0193'],
+                           'missing_devices': []}, True))
+        self.assertEqual(mock_wait_until.call_args[0][1], 30)
+
+    @mock.patch('model.cioignore.uevent.wait_until', autospec=True)
+    def test_settle_all(self, mock_wait_until):
+        """
+        unit test to validate that "all" is written to /proc/cio_ignore as
+        is and the devices which were ignored are waited for
+        """
+        _remove_and_settle(self.cb, ['all'])
+        self.assertEqual(self.proc.writes, ['free all\n'])
+        self.assertEqual(self.result(),
+                         ({'ready_devices': ['0.0.0190-0.0.0191',
+                                             '0.0.0193'],
+                           'missing_devices': ['0.0.0192']}, True))
+
+    def test_remove_fails(self):
+        """
+        unit test to validate that devices are not waited for if they
+        could not be removed
+        """
+        self.proc.rejected = ['0.0.0190']
+        _remove_and_settle(self.cb, ['0.0.0190'])
+        msg, status = self.messages[-1]
+        self.assertFalse(status)
+        self.assertIn('GS390XIOIG002E', msg)
+        self.assertEqual(os.listdir(self.ccw_dir), [])
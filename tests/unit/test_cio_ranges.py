@@ -0,0 +1,134 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import unittest
+
+from model import cio_ranges
+from model.cio_ranges import DeviceRange
+
+
+class DeviceRangeUnitTests(unittest.TestCase):
+    """
+    unit tests for parsing, merging and formatting ranges of device ids
+    """
+
+    def test_parse_device_id(self):
+        for device in ['0.0.0190', '190', '0x190', '0190', ' 0.0.190 ',
+                       '0X0190']:
+            self.assertEqual(cio_ranges.parse_device_id(device),
+                             (0, 0, 0x190))
+        self.assertEqual(cio_ranges.parse_device_id('fe.3.ABCD'),
+                         (0xfe, 3, 0xabcd))
+        for device in ['', '  ', '0.4.0190', '100.0.0190', '0.0.10000',
+                       '0.0.019g', 'device1', '0.0']:
+            self.assertRaises(ValueError, cio_ranges.parse_device_id, device)
+
+    def test_parse_range(self):
+        self.assertEqual(cio_ranges.parse_range('0.0.0190 - 0.0.01a0'),
+                         [DeviceRange((0, 0, 0x190), (0, 0, 0x1a0))])
+        self.assertEqual(cio_ranges.parse_range(25),
+                         [DeviceRange((0, 0, 0x25), (0, 0, 0x25))])
+        for devices in ['0.0.01a0-0.0.0190', '0.1.0190-0.0.0190',
+                        '0.0.0190-1.0.0190', '1-2-3', '0.0.0190-', 'all']:
+            self.assertRaises(ValueError, cio_ranges.parse_range, devices)
+
+    def test_parse_range_across_ssids(self):
+        """
+        unit test to validate that a range spanning subchannel sets is
+        split into one range per subchannel set
+        """
+        self.assertEqual(cio_ranges.parse_range('0.0.0000-0.1.ffff'),
+                         [DeviceRange((0, 0, 0), (0, 0, 0xffff)),
+                          DeviceRange((0, 1, 0), (0, 1, 0xffff))])
+        self.assertEqual(cio_ranges.parse_range('0.0.ff00-0.3.0010'),
+                         [DeviceRange((0, 0, 0xff00), (0, 0, 0xffff)),
+                          DeviceRange((0, 1, 0), (0, 1, 0xffff)),
+                          DeviceRange((0, 2, 0), (0, 2, 0xffff)),
+                          DeviceRange((0, 3, 0), (0, 3, 0x10))])
+        ranges, invalid = cio_ranges.parse_ranges(['0.0.0000-0.1.ffff',
+                                                   '0.1.0100'])
+        self.assertEqual(map(cio_ranges.format_range, ranges),
+                         ['0.0.0000-0.0.ffff', '0.1.0000-0.1.ffff'])
+        self.assertEqual(invalid, {})
+
+    def test_merge(self):
+        """
+        unit test to validate that overlapping and adjacent ranges are
+        merged, but not across subchannel sets
+        """
+        ranges, invalid = cio_ranges.parse_ranges(
+            ['0.0.0015', '0.0.0010-0.0.0013', '0.0.0014', '0.0.0012',
+             '0.0.0020-0.0.0030', '0.0.0025-0.0.0028', '0.1.0000',
+             '0.0.fffe-0.0.ffff', 'invalid'])
+        self.assertEqual([cio_ranges.format_range(device_range)
+                          for device_range in ranges],
+                         ['0.0.0010-0.0.0015', '0.0.0020-0.0.0030',
+                          '0.0.fffe-0.0.ffff', '0.1.0000'])
+        self.assertEqual(invalid.keys(), ['invalid'])
+
+    def test_merge_many_devices(self):
+        devices = ['0.0.%04x' % devno for devno in range(0x4000, 0x47d0)]
+        ranges, invalid = cio_ranges.parse_ranges(reversed(devices))
+        self.assertEqual(ranges, [DeviceRange((0, 0, 0x4000),
+                                              (0, 0, 0x47cf))])
+        self.assertEqual(invalid, {})
+
+
+class RangeIndexUnitTests(unittest.TestCase):
+    """
+    unit tests for the bisect-searchable index of device ranges
+    """
+
+    def setUp(self):
+        ranges, _ = cio_ranges.parse_ranges(['0.0.0011', '0.0.0013-0.0.0015',
+                                             '0.0.0100-0.0.01ff', '0.1.0000'])
+        self.index = cio_ranges.RangeIndex(ranges)
+
+    def test_contains(self):
+        for device in ['0.0.0011', '0.0.0014', '0.0.01ff', '0.1.0000']:
+            self.assertTrue(self.index.contains(
+                cio_ranges.parse_device_id(device)))
+        for device in ['0.0.0010', '0.0.0012', '0.0.0200', '0.1.0001',
+                       '0.2.0000']:
+            self.assertFalse(self.index.contains(
+                cio_ranges.parse_device_id(device)))
+
+    def test_intersect(self):
+        parts = self.index.intersect(
+            cio_ranges.parse_range('0.0.0012-0.0.0150')[0])
+        self.assertEqual(map(cio_ranges.format_range, parts),
+                         ['0.0.0013-0.0.0015', '0.0.0100-0.0.0150'])
+        self.assertEqual(self.index.intersect(
+            cio_ranges.parse_range('0.0.0016-0.0.00ff')[0]), [])
+
+    def test_count(self):
+        self.assertEqual(self.index.count, 1 + 3 + 0x100 + 1)
+        self.assertEqual(cio_ranges.RangeIndex([]).count, 0)
+
+    def test_difference(self):
+        ranges, _ = cio_ranges.parse_ranges(['0.0.0010-0.0.0020',
+                                             '0.0.fff0-0.0.ffff'])
+        parts, _ = cio_ranges.parse_ranges(['0.0.0010', '0.0.0014-0.0.0015',
+                                            '0.0.fffa-0.0.ffff', '0.0.0030'])
+        self.assertEqual(map(cio_ranges.format_range,
+                             cio_ranges.difference(ranges, parts)),
+                         ['0.0.0011-0.0.0013', '0.0.0016-0.0.0020',
+                          '0.0.fff0-0.0.fff9'])
+        self.assertEqual(cio_ranges.difference(ranges, ranges), [])
+        self.assertEqual(cio_ranges.difference(ranges, []), ranges)
@@ -21,8 +21,11 @@ import mock
 import unittest
 
 import wok.exception as exception
-from model.cioignore import CIOIgnoreModel
-from model.cioignore import _parse_ignore_output, _remove_devices
+from model import cio_ranges
+from model.cioignore import CIOIgnoreModel, MAX_DEVICES_ARG
+from model.cioignore import _batch_ranges, _parse_ignore_output
+from model.cioignore import _remove_and_settle
+from model.cioignore import _remove_devices
 
 CIO_IGNORE = "cio_ignore"
 IGNORED_DEVICES = 'ignored_devices'
@@ -84,10 +87,55 @@ class PostOperationUnitTests(unittest.TestCase):
                                                    'list. Input: %s' % device)
 
 
+    @mock.patch('model.cioignore.add_task', autospec=True)
+    @mock.patch('model.cioignore.TaskModel', autospec=True)
+    def test_model_remove_settle(self, mock_task_model, mock_add_task):
+        """
+        unit test to validate that remove() waits for the devices only if
+        settle is true
+        """
+        mock_add_task.return_value = 1
+        cio_model = CIOIgnoreModel(objstore='objstore')
+        cio_model.remove('', ['0.0.0190'], True)
+        cio_model.remove('', ['0.0.0190'], None)
+        self.assertEqual([call[0][1] for call in mock_add_task.call_args_list],
+                         [_remove_and_settle, _remove_devices])
+        self.assertRaises(exception.InvalidParameter, cio_model.remove,
+                          '', ['0.0.0190'], 'yes')
+
+    @mock.patch('model.cioignore.add_task', autospec=True)
+    @mock.patch('model.cioignore.TaskModel', autospec=True)
+    def test_model_query(self, mock_task_model, mock_add_task):
+        """
+        unit test to validate that query() returns the result right away
+        and rejects input which is not a list
+        """
+        cio_model = CIOIgnoreModel(objstore='objstore')
+        with mock.patch('model.cioignore.ignore_index') as mock_index:
+            mock_index.get.return_value = cio_ranges.RangeIndex(
+                cio_ranges.parse_range('0.0.0190'))
+            result = cio_model.query('', ['0.0.0190', '0.0.0191'])
+        self.assertEqual(result['ignored_devices'], ['0.0.0190'])
+        self.assertFalse(mock_add_task.called)
+        self.assertRaises(exception.InvalidParameter, cio_model.query,
+                          '', '0.0.0190')
+
+
 class RemoveDevicesUnitTests(unittest.TestCase):
     """
     unit tests for _remove_devices() method
     """
+    def setUp(self):
+        self.messages = []
+        # no /proc/cio_ignore, cio_ignore is run instead
+        patcher = mock.patch('model.cioignore.cio_proc.cio_ignore_path',
+                             '/nonexistent/cio_ignore')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cb(self, msg, status=None):
+        self.messages.append((msg, status))
+
     @mock.patch('model.cioignore.run_command', autospec=True)
     @mock.patch('model.cioignore.wok_log', autospec=True)
     def test_remove_devices_success_withoutrange(self, mock_wok_log,
@@ -99,19 +147,12 @@ class RemoveDevicesUnitTests(unittest.TestCase):
         mock_run_command: mock of wok.utils.run_command imported
                           in model.cioignore
         """
-        devices = ['device1', 'device2']
+        devices = ['0.0.0190', '0.0.0200']
         mock_run_command.return_value = ['', '', 0]
-
-        def cb(msg, status=None):
-            pass
-
-        _remove_devices(cb, devices)
-        calls_run_command = [([CIO_IGNORE, '-r', 'device1'],),
-                             ([CIO_IGNORE, '-r', 'device2'],)]
-        for i in range(0, 2):
-            x, y = mock_run_command.call_args_list[i]
-            assert x == calls_run_command[i]
-        assert mock_run_command.call_count == 2
+        _remove_devices(self.cb, devices)
+        mock_run_command.assert_called_once_with(
+            [CIO_IGNORE, '-r', '0.0.0190,0.0.0200'])
+        self.assertTrue(self.messages[-1][1])
         self.assertTrue(mock_wok_log.info.called,
                         msg='Expected call to mock_wok_log.info().'
                             ' Not called')
@@ -123,29 +164,19 @@ class RemoveDevicesUnitTests(unittest.TestCase):
         """
         unit test to validate _remove_devices() success scenario
         in which the device list includes range of devices
-        list includes combination of integer and string ids
+        list includes combination of integer and string ids, which are
+        merged into ranges
         mock_wok_log: mock of wok_log of model.cioignore
         mock_run_command: mock of wok.utils.run_command imported
                           in model.cioignore
         """
-        devices = ['dev1', 'dev2 - dev20', 25, 'dev26']
+        devices = ['1', '0.0.0002 - 0.0.0020', 25, '0x26', '0.1.0030']
         mock_run_command.return_value = ['', '', 0]
-
-        def cb(msg, status=None):
-            pass
-
-        _remove_devices(cb, devices)
-        calls_run_command = [([CIO_IGNORE, '-r', 'dev1'],),
-                             ([CIO_IGNORE, '-r', 'dev2-dev20'],),
-                             ([CIO_IGNORE, '-r', '25'],),
-                             ([CIO_IGNORE, '-r', 'dev26'],)]
-        for i in range(0, 2):
-            x, y = mock_run_command.call_args_list[i]
-            assert x == calls_run_command[i]
-        assert mock_run_command.call_count == 4
-        self.assertTrue(mock_wok_log.info.called,
-                        msg='Expected call to mock_wok_log.info().'
-                            ' Not called')
+        _remove_devices(self.cb, devices)
+        mock_run_command.assert_called_once_with(
+            [CIO_IGNORE, '-r', '0.0.0001-0.0.0020,0.0.0025-0.0.0026,'
+                               '0.1.0030'])
+        self.assertTrue(self.messages[-1][1])
 
     @mock.patch('model.cioignore.run_command', autospec=True)
     @mock.patch('model.cioignore.wok_log', autospec=True)
@@ -161,24 +192,101 @@ class RemoveDevicesUnitTests(unittest.TestCase):
         list and should throw operation failed exception and task fails
         with list of invalid devices
         """
-        devices = ['device1', 'invalid', '  ']
-        mock_run_command.side_effect = [['', '', 0],
-                                        ['', 'dummy_error', 1]]
-
-        def cb(msg, status=None):
-            pass
-
-        _remove_devices(cb, devices)
-        calls_run_command = [([CIO_IGNORE, '-r', 'device1'],),
-                             ([CIO_IGNORE, '-r', 'invalid'],)]
-        for i in range(0, 2):
-            x, y = mock_run_command.call_args_list[i]
-            assert x == calls_run_command[i]
-        assert mock_run_command.call_count == 2
+        devices = ['0.0.0190', 'invalid', '  ']
+        mock_run_command.return_value = ['', '', 0]
+        _remove_devices(self.cb, devices)
+        mock_run_command.assert_called_once_with(
+            [CIO_IGNORE, '-r', '0.0.0190'])
+        msg, status = self.messages[-1]
+        self.assertFalse(status)
+        self.assertIn('invalid', msg)
+        self.assertNotIn('0.0.0190', msg)
         self.assertTrue(mock_wok_log.error.called,
-                        msg='Expected call to mock_wok_log.info().'
+                        msg='Expected call to mock_wok_log.error().'
                             ' Not called')
 
+    @mock.patch('model.cioignore.run_command', autospec=True)
+    @mock.patch('model.cioignore.wok_log', autospec=True)
+    def test_remove_devices_batch_fails(self, mock_wok_log,
+                                        mock_run_command):
+        """
+        unit test to validate that the ranges are removed one by one if
+        the single cio_ignore call fails, to find the failing ones
+        """
+        def run_command(command):
+            if ',' in command[2] or command[2] == '0.0.0200':
+                return ['', 'cio_ignore: dummy_error', 1]
+            return ['', '', 0]
+        mock_run_command.side_effect = run_command
+        _remove_devices(self.cb, ['0.0.0190', '0.0.0200'])
+        self.assertEqual(mock_run_command.call_count, 3)
+        msg, status = self.messages[-1]
+        self.assertFalse(status)
+        self.assertIn('0.0.0200', msg)
+        self.assertNotIn('0.0.0190', msg)
+
+    @mock.patch('model.cioignore.run_command', autospec=True)
+    @mock.patch('model.cioignore.wok_log', autospec=True)
+    def test_remove_2000_devices(self, mock_wok_log, mock_run_command):
+        """
+        unit test to validate that 2,000 scattered devices are removed
+        with a single cio_ignore call
+        """
+        devices = ['0.0.%04x' % devno for devno in range(0, 8000, 4)]
+        mock_run_command.return_value = ['', '', 0]
+        _remove_devices(self.cb, devices)
+        mock_run_command.assert_called_once_with(
+            [CIO_IGNORE, '-r', ','.join(devices)])
+
+    @mock.patch('model.cioignore.run_command', autospec=True)
+    @mock.patch('model.cioignore.wok_log', autospec=True)
+    def test_remove_range_across_ssids(self, mock_wok_log, mock_run_command):
+        """
+        unit test to validate that a range spanning subchannel sets is
+        removed per subchannel set
+        """
+        mock_run_command.return_value = ['', '', 0]
+        _remove_devices(self.cb, ['0.0.0000-0.1.ffff'])
+        mock_run_command.assert_called_once_with(
+            [CIO_IGNORE, '-r', '0.0.0000-0.0.ffff,0.1.0000-0.1.ffff'])
+        self.assertTrue(self.messages[-1][1])
+
+    @mock.patch('model.cioignore.run_command', autospec=True)
+    @mock.patch('model.cioignore.wok_log', autospec=True)
+    def test_remove_all(self, mock_wok_log, mock_run_command):
+        """
+        unit test to validate that "all" is passed to cio_ignore as is
+        """
+        def run_command(command):
+            if command[1] == '-l':
+                return ['Ignored devices:\n=================\n'
+                        '0.0.0011\n0.0.0013-0.0.0015\n', '', 0]
+            return ['', '', 0]
+        mock_run_command.side_effect = run_command
+        _remove_devices(self.cb, [' ALL', '0.0.0190'])
+        mock_run_command.assert_called_with([CIO_IGNORE, '-r', 'all'])
+        self.assertTrue(self.messages[-1][1])
+
+        mock_run_command.side_effect = None
+        mock_run_command.return_value = ['', 'cio_ignore: dummy_error', 1]
+        _remove_devices(self.cb, ['all'])
+        msg, status = self.messages[-1]
+        self.assertFalse(status)
+        self.assertIn('dummy_error', msg)
+
+    def test_batch_ranges(self):
+        """
+        unit test to validate that the ranges are split into batches only
+        if they don't fit in a single cio_ignore call
+        """
+        ranges, _ = cio_ranges.parse_ranges(
+            ['0.0.%04x' % devno for devno in range(0, 0x10000, 2)])
+        batches = _batch_ranges(ranges)
+        self.assertEqual(sum(len(batch) for batch in batches), 0x8000)
+        self.assertEqual(len(batches), 5)
+        for batch in batches:
+            self.assertLessEqual(len(','.join(batch)), MAX_DEVICES_ARG)
+
 
 class ParseIgnoreOutput(unittest.TestCase):
     """
@@ -210,6 +318,13 @@ class LookUpUnitTests(unittest.TestCase):
     """
     unit tests to validate lookup() method of CIOIgnoreModel
     """
+    def setUp(self):
+        # no /proc/cio_ignore, cio_ignore is run instead
+        patcher = mock.patch('model.cioignore.cio_proc.cio_ignore_path',
+                             '/nonexistent/cio_ignore')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch('model.cioignore.TaskModel', autospec=True)
     @mock.patch('model.cioignore.wok_log', autospec=True)
     @mock.patch('model.cioignore.run_command', autospec=True)
@@ -299,6 +414,7 @@ class LookUpUnitTests(unittest.TestCase):
         mock_run_command.assert_called_once_with(command)
         self.assertFalse(mock_parse_ignore_output.called,
                          msg='Unexpected call to mock_parse_ignore_output()')
+        self.assertTrue(mock_wok_log.warning.called)
         mock_wok_log.error.assert_called_once_with('failed to retrieve ignore'
                                                    ' list using \'cio_ignore '
                                                    '-l\'. Error: dummy_error')
@@ -0,0 +1,144 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from model import css_sysfs
+from model import storagedevices
+
+LSCSS_OUT = """\
+Device   Subchan.  DevType CU Type Use  PIM PAM POM  CHPIDs
+----------------------------------------------------------------------
+0.0.0200 0.0.0000  3390/0a 3990/e9 yes  e0  e0  ff   b0b10d00 00000000
+0.0.0201 0.0.0001  3390/0a 3990/e9      f0  e0  ff   b0b10d0e 00000000
+0.0.1900 0.0.0002  1732/03 1731/03 yes  80  80  ff   18000000 00000000
+"""
+
+
+def create_subchannel(css_dir, subchannel, attrs, device=None,
+                      device_attrs=None):
+    """
+    Create a fake /sys/bus/css/devices/<subchannel>/ entry with the
+    ccw device attached to it, if any.
+    """
+    sch_dir = os.path.join(css_dir, subchannel)
+    os.makedirs(sch_dir)
+    entries = [(sch_dir, attrs)]
+    if device:
+        os.mkdir(os.path.join(sch_dir, device))
+        entries.append((os.path.join(sch_dir, device), device_attrs))
+    for path, values in entries:
+        for attr, value in values.iteritems():
+            with open(os.path.join(path, attr), 'w') as attr_file:
+                attr_file.write(value + '\n')
+
+
+def _device_attrs(devtype, cutype, online):
+    return {'devtype': devtype, 'cutype': cutype, 'online': online}
+
+
+class CSSSysfsTests(unittest.TestCase):
+    """
+    unit tests for reading the channel subsystem from sysfs
+    """
+
+    def setUp(self):
+        self.css_dir = tempfile.mkdtemp() + '/'
+        create_subchannel(self.css_dir, '0.0.0000',
+                          {'pimpampom': 'e0 e0 ff',
+                           'chpids': 'b0 b1 0d 00 00 00 00 00'},
+                          '0.0.0200',
+                          _device_attrs('3390/0a', '3990/e9', '1'))
+        create_subchannel(self.css_dir, '0.0.0001',
+                          {'pimpampom': 'f0 e0 ff',
+                           'chpids': 'b0 b1 0d 0e 00 00 00 00'},
+                          '0.0.0201',
+                          _device_attrs('3390/0a', '3990/e9', '0'))
+        create_subchannel(self.css_dir, '0.0.0002',
+                          {'pimpampom': '80 80 ff',
+                           'chpids': '18 00 00 00 00 00 00 00'},
+                          '0.0.1900',
+                          _device_attrs('1732/03', '1731/03', '1'))
+        # I/O subchannel without device and a CHSC subchannel
+        create_subchannel(self.css_dir, '0.0.0003',
+                          {'pimpampom': '80 80 ff',
+                           'chpids': '18 00 00 00 00 00 00 00'})
+        create_subchannel(self.css_dir, '0.0.ff00', {'type': '1'})
+        patcher = mock.patch('model.css_sysfs.css_dir', self.css_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.css_dir)
+
+    def test_read_devices(self):
+        devices = css_sysfs.read_devices()
+        self.assertEqual(sorted(devices), ['0.0.0200', '0.0.0201',
+                                           '0.0.1900'])
+        device = devices['0.0.0201']
+        self.assertEqual(device.subchannel, '0.0.0001')
+        self.assertEqual(device.devtype, '3390/0a')
+        self.assertFalse(device.online)
+        self.assertEqual((device.pim, device.pam, device.pom),
+                         ('f0', 'e0', 'ff'))
+        self.assertEqual(device.chpids[:4], ['b0', 'b1', '0d', '0e'])
+
+    def test_missing_css(self):
+        shutil.rmtree(self.css_dir)
+        self.assertRaises(OSError, css_sysfs.read_devices)
+        os.mkdir(self.css_dir)
+
+    def test_read_wanted_devices(self):
+        devices = css_sysfs.read_devices(set(['0.0.0201', '0.0.0300']))
+        self.assertEqual(devices.keys(), ['0.0.0201'])
+
+    @mock.patch('model.storagedevices.utils.run_command_lines',
+                autospec=True)
+    def test_equivalent_to_lscss(self, mock_run_command_lines):
+        """
+        unit test to validate that the table read from sysfs is the same
+        as the one parsed from the lscss output
+        """
+        mock_run_command_lines.side_effect = \
+            lambda cmd: iter(LSCSS_OUT.splitlines())
+        self.assertEqual(storagedevices._get_sysfs_table(),
+                         storagedevices._get_lscss_table())
+        wanted = set(['0.0.0201', '0.0.1900'])
+        self.assertEqual(storagedevices._get_sysfs_table(wanted),
+                         storagedevices._get_lscss_table(wanted))
+        self.assertEqual(sorted(storagedevices._get_lscss_table(wanted)),
+                         sorted(wanted))
+
+    @mock.patch('model.storagedevices.utils.run_command_lines',
+                autospec=True)
+    def test_lscss_fallback(self, mock_run_command_lines):
+        """
+        unit test to validate that lscss is run only if sysfs can't be read
+        """
+        mock_run_command_lines.side_effect = \
+            lambda cmd: iter(LSCSS_OUT.splitlines())
+        table = storagedevices._get_device_table()
+        self.assertFalse(mock_run_command_lines.called)
+        with mock.patch('model.css_sysfs.css_dir', '/nonexistent/'):
+            self.assertEqual(storagedevices._get_device_table(), table)
+        mock_run_command_lines.assert_called_once_with(['lscss'])
@@ -18,12 +18,19 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
 import mock
+import os
 import re
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 
 import model.fc_luns as fc_luns
 from wok.exception import InvalidOperation, InvalidParameter, MissingParameter
-from model import utils
+from wok.exception import OperationFailed
+from model import fc_sysfs, persistence, utils
+from test_fc_sysfs import create_sg_device
 
 
 class FCLUNsTests(unittest.TestCase):
@@ -163,3 +170,673 @@ root=/dev/disk/by-path/ccw-0.0.5184-part1 rd_DASD=0.0.5184"""
         pattern = r'.+zfcp\.allow_lun_scan=(\d)'
         m = re.search(pattern, boot_params_str)
         self.assertTrue(int(m.group(1)))
+
+
+class FCLUNsListTests(unittest.TestCase):
+    """
+    unit tests for filtering and paginating the list of FC LUNs
+    """
+
+    luns = ['0.0.1900:0x500507630300c562:0x4010400000000000',
+            '0.0.1900:0x500507630300c562:0x4010400100000000',
+            '0.0.1900:0x500507630303c562:0x4010400000000000',
+            '0.0.1940:0x500507630300c562:0x4010400200000000']
+
+    def setUp(self):
+        patcher = mock.patch('model.fc_luns.utils.lun_inventory',
+                             autospec=True)
+        self.mock_inventory = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_inventory.get.return_value = self.luns
+
+        patcher = mock.patch('model.fc_luns.utils.is_lun_configured',
+                             autospec=True)
+        self.mock_configured = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_configured.side_effect = \
+            lambda adapter, port, lun_id: lun_id != '0x4010400100000000'
+
+        self.mock_luns_info = self.mock_inventory.get_info
+        self.mock_luns_info.side_effect = lambda lun_paths: [
+            {'hbaId': adapter, 'remoteWwpn': port, 'lunId': lun_id,
+             'type': 'tape' if adapter == '0.0.1940' else 'disk'}
+            for adapter, port, lun_id in lun_paths]
+
+        self.lun_model = fc_luns.FCLUNsModel()
+
+    def test_path_filters(self):
+        luns_info = self.lun_model.get_list(
+            _hbaId='0.0.1900', _remoteWwpn='0x500507630300c562')
+        self.assertEqual([lun['lunId'] for lun in luns_info],
+                         ['0x4010400000000000', '0x4010400100000000'])
+
+    def test_configured_filter(self):
+        luns_info = self.lun_model.get_list(_configured='false')
+        self.assertEqual(len(luns_info), 1)
+        self.assertEqual(luns_info[0]['lunId'], '0x4010400100000000')
+        self.assertRaises(InvalidParameter, self.lun_model.get_list,
+                          _configured='maybe')
+
+    def test_paginate_before_inquiry(self):
+        luns_info = self.lun_model.get_list(_offset='1', _limit='2')
+        self.assertEqual(len(luns_info), 2)
+        # only the requested page is inquired
+        self.mock_luns_info.assert_called_once_with(
+            [('0.0.1900', '0x500507630300c562', '0x4010400100000000'),
+             ('0.0.1900', '0x500507630303c562', '0x4010400000000000')])
+
+    def test_paginate_after_type_filter(self):
+        luns_info = self.lun_model.get_list(_type='disk', _offset='2')
+        self.assertEqual(len(luns_info), 1)
+        self.assertEqual(luns_info[0]['remoteWwpn'], '0x500507630303c562')
+        self.assertEqual(self.lun_model.get_list(_type='tape')[0]['hbaId'],
+                         '0.0.1940')
+
+    def test_invalid_pagination(self):
+        self.assertRaises(InvalidParameter, self.lun_model.get_list,
+                          _limit='ten')
+        self.assertRaises(InvalidParameter, self.lun_model.get_list,
+                          _offset='-1')
+
+
+class BulkLUNsTests(unittest.TestCase):
+    """
+    unit tests for adding and removing many LUNs at once
+    """
+
+    port = '0x500507630300c562'
+
+    def setUp(self):
+        self.adapter_dir = tempfile.mkdtemp() + '/'
+        self.port_dir = os.path.join(self.adapter_dir, '0.0.1900',
+                                     self.port) + '/'
+        os.makedirs(self.port_dir)
+        self.zfcp_conf = self.adapter_dir + 'zfcp.conf'
+        with open(self.zfcp_conf, 'w') as conf:
+            conf.write('0.0.1940 %s 0x4010400000000000\n' % self.port)
+        os.chmod(self.zfcp_conf, 0o644)
+        self.luns = [('0.0.1900', self.port, '0x40%02d400000000000' % i)
+                     for i in range(3)]
+        for target, value in [('utils.adapter_dir', self.adapter_dir),
+                              ('persistence.zfcp_conf.path', self.zfcp_conf)]:
+            patcher = mock.patch('model.' + target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.uevent._open_listener')
+        self.listener = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.listener.wait.side_effect = self._zfcp_adds_units
+        self.cb = mock.Mock()
+
+    def tearDown(self):
+        shutil.rmtree(self.adapter_dir)
+
+    def _zfcp_adds_units(self, timeout):
+        # the kernel creates a LUN directory for each unit_add write
+        with open(self.port_dir + 'unit_add') as unit_add:
+            for lun_id in re.findall(r'0x[0-9a-f]{16}', unit_add.read()):
+                if not os.path.exists(self.port_dir + lun_id):
+                    os.mkdir(self.port_dir + lun_id)
+        return {'ACTION': 'add'}
+
+    def _read_conf(self):
+        with open(self.zfcp_conf) as conf:
+            return conf.read().splitlines()
+
+    @mock.patch('model.utils.open', create=True)
+    def test_add_luns_pipelined(self, mock_open):
+        unit_add_writes = []
+
+        def fake_open(path, mode='r'):
+            if path.endswith('unit_add'):
+                # keep all the LUN ids written for _zfcp_adds_units
+                unit_add_writes.append(path)
+                mode = 'a'
+            return open(path, mode)
+
+        mock_open.side_effect = fake_open
+        with mock.patch('model.persistence.zfcp_conf.update',
+                        wraps=persistence.zfcp_conf.update) as mock_update:
+            utils.add_luns(self.cb, self.luns)
+            mock_update.assert_called_once_with(
+                add=[' '.join(lun) for lun in self.luns])
+
+        self.assertEqual(len(unit_add_writes), 3)
+        # all the unit_add writes are done before waiting once
+        self.assertEqual(self.listener.wait.call_count, 1)
+        self.assertEqual(self._read_conf()[1:],
+                         [' '.join(lun) for lun in self.luns])
+        self.cb.assert_called_with(mock.ANY, True)
+
+    def test_add_luns_partly_failed(self):
+        os.mkdir(self.port_dir + self.luns[0][2])
+        luns = self.luns[:1] + [('0.0.1900', '0x500507630300ffff',
+                                 '0x4010400000000000')]
+        utils.add_luns(self.cb, luns)
+        message, success = self.cb.call_args[0]
+        self.assertFalse(success)
+        self.assertIn('0x500507630300ffff', message)
+        # the LUN which was present already is not persisted again
+        self.assertEqual(len(self._read_conf()), 1)
+
+    @mock.patch('model.utils.fc_sysfs.take_snapshot', autospec=True)
+    def test_remove_luns(self, mock_snapshot):
+        sg_dir = tempfile.mkdtemp() + '/'
+        self.addCleanup(shutil.rmtree, sg_dir)
+        for index, lun in enumerate(self.luns):
+            os.mkdir(self.port_dir + lun[2])
+            os.makedirs(sg_dir + 'sg%d/device' % index)
+        persistence.zfcp_conf.update(add=[' '.join(lun) for lun in self.luns])
+        mock_snapshot.return_value.lookup.side_effect = \
+            lambda adapter, port, lun_id: 'sg%d' % int(lun_id[4:6])
+
+        with mock.patch('model.utils.sg_dir', sg_dir):
+            utils.remove_luns(self.cb, self.luns[1:])
+
+        self.cb.assert_called_with(mock.ANY, True)
+        self.assertEqual(self._read_conf()[1:], [' '.join(self.luns[0])])
+        with open(self.port_dir + 'unit_remove') as unit_remove:
+            self.assertEqual(unit_remove.read(), self.luns[2][2])
+        with open(sg_dir + 'sg1/device/delete') as delete:
+            self.assertEqual(delete.read(), '1')
+
+    @mock.patch('model.fc_luns.add_task', autospec=True)
+    @mock.patch('model.fc_luns.utils.is_lun_scan_enabled', autospec=True)
+    def test_bulk_model(self, mock_scan_enabled, mock_add_task):
+        mock_scan_enabled.return_value = {'current': False}
+        bulk_model = fc_luns.FCLUNsBulkModel(objstore=mock.Mock())
+        bulk_model.task = mock.Mock()
+        luns = [{'hbaId': lun[0], 'remoteWwpn': lun[1], 'lunId': lun[2]}
+                for lun in self.luns]
+        bulk_model.add(None, luns)
+        mock_add_task.assert_called_once_with(
+            '/plugins/gingers390x/fcluns/bulk/add', utils.add_luns,
+            bulk_model.objstore, self.luns)
+
+        self.assertRaises(InvalidParameter, bulk_model.remove, None,
+                          luns[0])
+        self.assertRaises(InvalidParameter, bulk_model.remove, None,
+                          [{'hbaId': '0.0.1900'}])
+        mock_scan_enabled.return_value = {'current': True}
+        self.assertRaises(InvalidOperation, bulk_model.add, None, luns)
+
+
+class LUNInventoryTests(unittest.TestCase):
+    """
+    unit tests for the cached LUN inventory
+    """
+
+    def setUp(self):
+        self.inventory = utils.LUNInventory(30)
+        patcher = mock.patch('model.utils.get_luns', autospec=True)
+        self.mock_get_luns = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _wait_idle(self):
+        while self.inventory.refreshing:
+            time.sleep(0.01)
+
+    def test_served_from_cache(self):
+        self.mock_get_luns.return_value = ['lun1']
+        self.assertEqual(self.inventory.get(), ['lun1'])
+        self.assertEqual(self.inventory.get(), ['lun1'])
+        self.assertEqual(self.mock_get_luns.call_count, 1)
+
+    def test_stale_while_revalidate(self):
+        self.mock_get_luns.return_value = ['lun1']
+        self.inventory.get()
+        self.inventory.timestamp -= 60
+
+        release = threading.Event()
+
+        def slow_get_luns():
+            release.wait()
+            return ['lun1', 'lun2']
+
+        self.mock_get_luns.side_effect = slow_get_luns
+        # the expired list is served, a single refresh is in flight
+        self.assertEqual(self.inventory.get(), ['lun1'])
+        self.assertEqual(self.inventory.get(), ['lun1'])
+        release.set()
+        self._wait_idle()
+        self.assertEqual(self.mock_get_luns.call_count, 2)
+        self.assertEqual(self.inventory.get(), ['lun1', 'lun2'])
+
+    def test_invalidate(self):
+        self.mock_get_luns.return_value = ['lun1']
+        self.inventory.get()
+        self.mock_get_luns.return_value = []
+        self.inventory.invalidate()
+        self.assertEqual(self.inventory.get(), [])
+        self.assertEqual(self.mock_get_luns.call_count, 2)
+
+    def test_concurrent_gets_share_refresh(self):
+        release = threading.Event()
+
+        def slow_get_luns():
+            release.wait()
+            return ['lun1']
+
+        self.mock_get_luns.side_effect = slow_get_luns
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(self.inventory.get()))
+            for i in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [['lun1']] * 5)
+        self.assertEqual(self.mock_get_luns.call_count, 1)
+
+    def test_refresh_error(self):
+        self.mock_get_luns.side_effect = OperationFailed('GS390XSTG00007')
+        self.assertRaises(OperationFailed, self.inventory.get)
+
+    @mock.patch('model.utils.get_luns_info', autospec=True)
+    def test_info_served_from_cache(self, mock_luns_info):
+        """
+        unit test to validate that the details of the LUNs are only
+        fetched for the LUNs not cached yet, until the TTL expired or the
+        inventory got invalidated
+        """
+        mock_luns_info.side_effect = lambda lun_paths: [
+            {'lunId': lun_id, 'configured': 'false'}
+            for adapter, port, lun_id in lun_paths]
+        lun1 = ('0.0.1900', '0x500507630300c562', '0x4010400000000000')
+        lun2 = ('0.0.1900', '0x500507630300c562', '0x4010400100000000')
+        self.assertEqual(self.inventory.get_info([lun1])[0]['lunId'],
+                         lun1[2])
+        luns_info = self.inventory.get_info([lun2, lun1])
+        self.assertEqual([lun_info['lunId'] for lun_info in luns_info],
+                         [lun2[2], lun1[2]])
+        self.assertEqual(mock_luns_info.call_args_list,
+                         [mock.call([lun1]), mock.call([lun2])])
+
+        # callers can't change the cached details
+        luns_info[0]['lunId'] = None
+        self.assertEqual(self.inventory.get_info([lun2])[0]['lunId'],
+                         lun2[2])
+        self.assertEqual(mock_luns_info.call_count, 2)
+
+        self.inventory.info[lun1] = (time.time() - 60,
+                                     self.inventory.info[lun1][1])
+        self.inventory.get_info([lun1, lun2])
+        mock_luns_info.assert_called_with([lun1])
+        self.inventory.invalidate()
+        self.inventory.get_info([lun1, lun2])
+        self.assertEqual(mock_luns_info.call_count, 4)
+
+    @mock.patch('model.utils.get_luns_info', autospec=True)
+    def test_concurrent_info_shared(self, mock_luns_info):
+        """
+        unit test to validate that concurrent listings wait for the
+        details being fetched instead of adding the same LUNs again
+        """
+        release = threading.Event()
+
+        def slow_luns_info(lun_paths):
+            release.wait()
+            return [{'lunId': lun_id} for _, _, lun_id in lun_paths]
+
+        mock_luns_info.side_effect = slow_luns_info
+        lun = ('0.0.1900', '0x500507630300c562', '0x4010400000000000')
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(self.inventory.get_info([lun])))
+            for i in range(5)]
+        for thread in threads:
+            thread.start()
+        while not self.inventory.pending:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [[{'lunId': lun[2]}]] * 5)
+        self.assertEqual(mock_luns_info.call_count, 1)
+
+
+class InquiryCacheTests(unittest.TestCase):
+    """
+    unit tests for the cache of sg_inq data
+    """
+
+    sg_inq_output = """standard INQUIRY:
+  PQual=0  Device_type=0  RMB=0  version=0x05  [SPC-3]
+    length=160 (0xa0)   Peripheral device type: disk
+ Vendor identification: IBM
+ Product identification: 2107900
+ Product revision level: .217
+ Unit serial number: 75DXP71000C
+"""
+
+    def setUp(self):
+        self.sg_dir = tempfile.mkdtemp() + '/'
+        self.devices = [('0.0.1900', '0x500507630300c562',
+                         '0x40%02d400000000000' % i, 'sg%d' % i)
+                        for i in range(4)]
+        for adapter, port, lun, sg_dev in self.devices:
+            create_sg_device(self.sg_dir, sg_dev, adapter, port, lun)
+        for target in ['model.utils.sg_dir', 'model.fc_sysfs.sg_dir']:
+            patcher = mock.patch(target, self.sg_dir)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.utils.run_command', autospec=True)
+        self.mock_run_command = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_run_command.return_value = [self.sg_inq_output, '', 0]
+        self.cache = utils.InquiryCache(2)
+
+    def tearDown(self):
+        shutil.rmtree(self.sg_dir)
+
+    def test_batch_inquiry(self):
+        inquiry = self.cache.get_many(self.devices)
+        self.assertEqual(sorted(inquiry.keys()), self.devices)
+        self.assertEqual(inquiry[self.devices[0]]['vendor'], 'IBM')
+        self.assertEqual(self.mock_run_command.call_count, 4)
+
+        # served from cache from now on
+        self.cache.get_many(self.devices)
+        self.assertEqual(self.cache.get(*self.devices[1])['product'],
+                         '2107900')
+        self.assertEqual(self.mock_run_command.call_count, 4)
+
+    def test_recreated_sg_device(self):
+        self.cache.get_many(self.devices)
+        shutil.rmtree(self.sg_dir + 'sg0')
+        self.assertEqual(self.cache.get_many(self.devices[:1]), {})
+        self.assertNotIn(self.devices[0], self.cache.entries)
+
+        # the new sg devices get created before the old ones are gone,
+        # so they don't end up with the inodes of the old ones
+        create_sg_device(self.sg_dir, 'sg0', *self.devices[0][:3])
+        create_sg_device(self.sg_dir, 'new', *self.devices[1][:3])
+        shutil.rmtree(self.sg_dir + 'sg1')
+        os.rename(self.sg_dir + 'new', self.sg_dir + 'sg1')
+        self.mock_run_command.reset_mock()
+        self.cache.get_many(self.devices)
+        self.assertEqual(self.mock_run_command.call_count, 2)
+
+    def test_prune(self):
+        self.cache.get_many(self.devices)
+        shutil.rmtree(self.sg_dir + 'sg2')
+        self.cache.prune()
+        self.assertEqual(len(self.cache.entries), 3)
+
+    def test_get_luns_info(self):
+        adapter_dir = tempfile.mkdtemp() + '/'
+        self.addCleanup(shutil.rmtree, adapter_dir)
+        for adapter, port, lun, sg_dev in self.devices[:2]:
+            os.makedirs(os.path.join(adapter_dir, adapter, port, lun))
+        unconfigured = ('0.0.1900', '0x500507630300c562',
+                        '0x4099400000000000')
+
+        with mock.patch('model.utils.adapter_dir', adapter_dir), \
+                mock.patch('model.fc_sysfs.sg_dir', self.sg_dir), \
+                mock.patch('model.utils.inquiry_cache', self.cache), \
+                mock.patch('model.utils.get_lun_info',
+                           autospec=True) as mock_lun_info:
+            mock_lun_info.return_value = {'configured': 'false',
+                                          'type': 'disk'}
+            luns_info = utils.get_luns_info(
+                [unconfigured] + [device[:3] for device in self.devices])
+
+        self.assertEqual(luns_info[0]['lunId'], '0x4099400000000000')
+        self.assertEqual(luns_info[0]['type'], 'disk')
+        self.assertEqual(mock_lun_info.call_count, 3)
+        mock_lun_info.assert_any_call(*unconfigured)
+        self.assertEqual(luns_info[1]['sgDev'], 'sg0')
+        self.assertEqual(luns_info[1]['configured'], 'true')
+        self.assertEqual(luns_info[2]['vendor'], 'IBM')
+        self.assertEqual(luns_info[3]['configured'], 'false')
+        # one sg_inq for each configured LUN only
+        self.assertEqual(self.mock_run_command.call_count, 2)
+
+    def test_failed_inquiry_not_cached(self):
+        self.mock_run_command.return_value = ['', 'error', 1]
+        self.assertIsNone(self.cache.get(*self.devices[0]))
+        self.assertEqual(self.cache.entries, {})
+
+
+class GetLUNInfoTests(unittest.TestCase):
+    """
+    unit tests for getting the info of LUNs which are not configured
+    """
+
+    adapter = '0.0.1900'
+    port = '0x500507630300c562'
+    luns = ['0x4010400000000000', '0x4010400100000000']
+
+    def setUp(self):
+        self.adapter_dir = tempfile.mkdtemp() + '/'
+        self.addCleanup(shutil.rmtree, self.adapter_dir)
+        self.port_dir = os.path.join(self.adapter_dir, self.adapter,
+                                     self.port) + '/'
+        os.makedirs(self.port_dir)
+        for attr in ['unit_add', 'unit_remove']:
+            open(self.port_dir + attr, 'w').close()
+        for target, value in [('adapter_dir', self.adapter_dir),
+                              ('uevent.wait_for_paths', lambda paths: [])]:
+            patcher = mock.patch('model.utils.' + target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @mock.patch('model.utils._wait_for_sg_dev', autospec=True)
+    def test_no_sg_device(self, mock_wait_for_sg_dev):
+        """
+        unit test to validate that the LUN is removed again and the
+        failure is reported if its sg_device never showed up
+        """
+        mock_wait_for_sg_dev.return_value = ''
+        self.assertRaises(OperationFailed, utils.get_lun_info,
+                          self.adapter, self.port, self.luns[0])
+        with open(self.port_dir + 'unit_remove') as unit_remove:
+            self.assertEqual(unit_remove.read(), self.luns[0])
+
+    @mock.patch('model.utils.get_lun_info', autospec=True)
+    def test_failed_lun_of_port(self, mock_lun_info):
+        """
+        unit test to validate that the LUNs of a port after a failing one
+        still get their info
+        """
+        mock_lun_info.side_effect = [KeyError('sgDev'), {'type': 'disk'}]
+        luns_info = utils.get_luns_info(
+            [(self.adapter, self.port, lun) for lun in self.luns])
+        self.assertEqual(mock_lun_info.call_count, 2)
+        self.assertNotIn('type', luns_info[0])
+        self.assertEqual(luns_info[1]['type'], 'disk')
+
+
+class ProbePortTests(unittest.TestCase):
+    """
+    unit tests for probing a remote port without LUNs
+    """
+    adapter = '0.0.1900'
+    port = '0x5005076303ffffff'
+
+    def setUp(self):
+        self.adapter_dir = tempfile.mkdtemp() + '/'
+        self.addCleanup(shutil.rmtree, self.adapter_dir)
+        self.port_dir = os.path.join(self.adapter_dir, self.adapter,
+                                     self.port) + '/'
+        os.makedirs(self.port_dir)
+        for attr in ['unit_add', 'unit_remove']:
+            open(self.port_dir + attr, 'w').close()
+        patcher = mock.patch('model.utils.adapter_dir', self.adapter_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.uevent._open_listener',
+                             return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.discovery = mock.Mock(lock=threading.Lock())
+        self.discovery.has_port.return_value = False
+
+    def _add_unit(self, lun, failed):
+        unit_dir = self.port_dir + lun + '/'
+        os.mkdir(unit_dir)
+        for attr, value in [('failed', failed), ('in_recovery', '0')]:
+            with open(unit_dir + attr, 'w') as attr_file:
+                attr_file.write(value + '\n')
+
+    def test_failed_units(self):
+        """
+        unit test to validate that a port with neither LUN 0 nor the
+        well known LUN is given up as soon as their unit scans failed
+        """
+        self._add_unit(utils.lun0, '1')
+        self._add_unit(utils.wlun, '1')
+        start = time.time()
+        self.assertIsNone(utils._probe_port(self.discovery, self.adapter,
+                                            self.port))
+        self.assertLess(time.time() - start, utils.TEMP_LUN_TIMEOUT)
+        with open(self.port_dir + 'unit_remove') as unit_remove:
+            self.assertEqual(unit_remove.read(), utils.wlun)
+
+    @mock.patch('model.utils.uevent.wait_until', autospec=True)
+    def test_wait_timeout(self, mock_wait_until):
+        """
+        unit test to validate that each LUN added temporarily is waited
+        for well below half of lun_probe_timeout
+        """
+        mock_wait_until.return_value = None
+        utils._probe_port(self.discovery, self.adapter, self.port)
+        self.assertEqual(mock_wait_until.call_count, 2)
+        for args, kwargs in mock_wait_until.call_args_list:
+            self.assertLessEqual(args[1],
+                                 utils.config['lun_probe_timeout'] / 4.0)
+
+    def test_lun_found(self):
+        self._add_unit(utils.lun0, '0')
+        self.discovery.has_port.return_value = True
+        self.assertEqual(utils._probe_port(self.discovery, self.adapter,
+                                           self.port), utils.lun0)
+
+    @mock.patch('model.utils._remove_temp_lun', autospec=True)
+    @mock.patch('model.utils.uevent.wait_until', autospec=True)
+    def test_probe_outlives_deadline(self, mock_wait_until,
+                                     mock_remove_temp_lun):
+        """
+        unit test to validate that a probe finishing after the deadline
+        of _probe_ports() removes the LUN it added itself
+        """
+        release = threading.Event()
+        finished = threading.Event()
+
+        def slow_wait(condition, timeout):
+            release.wait()
+            return 'found'
+
+        mock_wait_until.side_effect = slow_wait
+        mock_remove_temp_lun.side_effect = lambda *args: finished.set()
+        with mock.patch.dict(utils.config, {'lun_probe_timeout': 0.1}):
+            temp_luns = utils._probe_ports(self.discovery,
+                                           [(self.adapter, self.port)])
+        self.assertEqual(temp_luns, {})
+        release.set()
+        self.assertTrue(finished.wait(5))
+        mock_remove_temp_lun.assert_called_once_with(
+            self.discovery, self.adapter, self.port, utils.lun0)
+
+    def test_probe_finished_after_deadline(self):
+        """
+        unit test to validate that the LUN of a probe finishing between
+        the deadline and giving it up is left to the caller
+        """
+        probe = utils.PortProbe()
+        self.assertTrue(probe.keep(utils.lun0))
+        self.assertEqual(probe.abandon(), utils.lun0)
+        self.assertFalse(utils.PortProbe().abandon())
+        probe = utils.PortProbe()
+        probe.abandon()
+        self.assertFalse(probe.keep(utils.lun0))
+
+
+class LUNDiscoveryBenchmark(unittest.TestCase):
+    """
+    Regression benchmark for get_luns() on a fake sysfs tree with 5,000
+    configured LUNs behind 50 remote ports and one port without LUNs
+    """
+
+    adapters = ['0.0.1900', '0.0.1940']
+    ports_per_adapter = 25
+    luns_per_port = 100
+    empty_port = '0x5005076303ffffff'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sg_dir = tempfile.mkdtemp() + '/'
+        cls.adapter_dir = tempfile.mkdtemp() + '/'
+        cls.port_luns = {}
+        sg_count = 0
+        for adapter in cls.adapters:
+            for port_no in range(cls.ports_per_adapter):
+                port = '0x50050763030%05d' % port_no
+                cls._create_port(adapter, port)
+                luns = ['0x%04d000000000000' % i
+                        for i in range(cls.luns_per_port)]
+                for lun in luns:
+                    create_sg_device(cls.sg_dir, 'sg%d' % sg_count,
+                                     adapter, port, lun)
+                    sg_count += 1
+                cls.port_luns['sg%d' % (sg_count - len(luns))] = luns
+        cls._create_port(cls.adapters[0], cls.empty_port)
+        # the unit of LUN 0 is still being scanned once it was added
+        unit_dir = os.path.join(cls.adapter_dir, cls.adapters[0],
+                                cls.empty_port, utils.lun0)
+        os.mkdir(unit_dir)
+        for attr, value in [('failed', '1'), ('in_recovery', '1')]:
+            with open(os.path.join(unit_dir, attr), 'w') as attr_file:
+                attr_file.write(value + '\n')
+        cls.sg_count = sg_count
+
+    @classmethod
+    def _create_port(cls, adapter, port):
+        port_dir = os.path.join(cls.adapter_dir, adapter, port)
+        os.makedirs(port_dir)
+        for attr in ['access_denied', 'failed', 'in_recovery']:
+            with open(os.path.join(port_dir, attr), 'w') as attr_file:
+                attr_file.write('0\n')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.sg_dir)
+        shutil.rmtree(cls.adapter_dir)
+
+    def fake_run_command(self, cmd):
+        sg_dev = cmd[1].split('/')[-1]
+        luns = self.port_luns.get(sg_dev, [])
+        out = ''.join('    %s\n' % lun[2:] for lun in luns)
+        return out, '', 0
+
+    def fake_uevent(self, timeout):
+        # LUN 0 shows up on the probed empty port
+        if not os.path.exists(self.sg_dir + 'sgprobe'):
+            create_sg_device(self.sg_dir, 'sgprobe', self.adapters[0],
+                             self.empty_port, utils.lun0)
+            self.port_luns['sgprobe'] = [utils.lun0, '0x0001000000000000']
+        return {'ACTION': 'add'}
+
+    def test_get_luns_5000_luns(self):
+        with mock.patch('model.utils.adapter_dir', self.adapter_dir), \
+                mock.patch('model.utils.sg_dir', self.sg_dir), \
+                mock.patch('model.fc_sysfs.sg_dir', self.sg_dir), \
+                mock.patch('model.utils.run_command',
+                           side_effect=self.fake_run_command) as mock_run, \
+                mock.patch('model.fc_sysfs._read_sg_device',
+                           wraps=fc_sysfs._read_sg_device) as mock_read, \
+                mock.patch('model.uevent._open_listener') as mock_listener:
+            mock_listener.return_value.wait.side_effect = self.fake_uevent
+            luns = utils.get_luns()
+
+        self.assertEqual(len(luns), self.sg_count + 2)
+        self.assertEqual(len(set(luns)), len(luns))
+
+        # every sg device is read exactly once, the probed one included
+        self.assertEqual(mock_read.call_count, self.sg_count + 1)
+
+        # sg_luns only runs for the LUN 0 devices, once per port
+        self.assertEqual(mock_run.call_count,
+                         len(self.adapters) * self.ports_per_adapter + 1)
@@ -0,0 +1,106 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from model import fc_sysfs
+
+
+def create_sg_device(sg_dir, sg_dev, hba_id=None, wwpn=None, fcp_lun=None):
+    """
+    Create a fake /sys/class/scsi_generic/<sg_dev>/device/ entry.
+    Attributes which are None are not created, which mimics
+    non FC attached devices.
+    """
+    device_dir = os.path.join(sg_dir, sg_dev, 'device')
+    os.makedirs(device_dir)
+    for attr, value in (('hba_id', hba_id), ('wwpn', wwpn),
+                        ('fcp_lun', fcp_lun)):
+        if value is not None:
+            with open(os.path.join(device_dir, attr), 'w') as attr_file:
+                attr_file.write(value + '\n')
+
+
+class SGSnapshotTests(unittest.TestCase):
+    """
+    unit tests for the FC sg device snapshot
+    """
+
+    def setUp(self):
+        self.sg_dir = tempfile.mkdtemp() + '/'
+        create_sg_device(self.sg_dir, 'sg0', '0.0.1900',
+                         '0x500507630300c562', '0x0000000000000000')
+        create_sg_device(self.sg_dir, 'sg1', '0.0.1900',
+                         '0x500507630300c562', '0x4010400000000000')
+        create_sg_device(self.sg_dir, 'sg2')
+        patcher = mock.patch('model.fc_sysfs.sg_dir', self.sg_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.sg_dir)
+
+    def test_snapshot_skips_non_fc_devices(self):
+        snapshot = fc_sysfs.take_snapshot()
+        self.assertEqual(sorted(snapshot.names()), ['sg0', 'sg1'])
+
+    def test_snapshot_lookup(self):
+        snapshot = fc_sysfs.take_snapshot()
+        self.assertEqual(snapshot.lookup('0.0.1900', '0x500507630300c562',
+                                         '0x4010400000000000'), 'sg1')
+        self.assertEqual(snapshot.lookup('0.0.1900', '0x500507630300c562',
+                                         '0x4010400100000000'), '')
+        self.assertEqual(snapshot.by_name['sg0'].fcp_lun,
+                         '0x0000000000000000')
+
+    @mock.patch('model.fc_sysfs.open', create=True)
+    def test_snapshot_reads_each_attribute_once(self, mock_open):
+        mock_open.return_value.__enter__.return_value.readline.return_value = \
+            'value\n'
+        fc_sysfs.take_snapshot()
+        # three attributes for each of the three devices, sg2 included
+        self.assertEqual(mock_open.call_count, 9)
+
+    def test_refresh_recreated_device(self):
+        """
+        unit test to validate that a sg device re-created under the same
+        name is read again, while the unchanged ones are not
+        """
+        snapshot = fc_sysfs.take_snapshot()
+        # the new sg device gets created before the old one is gone, so
+        # it doesn't end up with the inode of the old one
+        create_sg_device(self.sg_dir, 'new', '0.0.1940',
+                         '0x500507630300c562', '0x4010400100000000')
+        shutil.rmtree(self.sg_dir + 'sg1')
+        os.rename(self.sg_dir + 'new', self.sg_dir + 'sg1')
+
+        with mock.patch('model.fc_sysfs._read_sg_device',
+                        wraps=fc_sysfs._read_sg_device) as mock_read:
+            changed = snapshot.refresh()
+        mock_read.assert_called_once_with('sg1')
+        self.assertEqual(changed, set([('0.0.1900', '0x500507630300c562'),
+                                       ('0.0.1940', '0x500507630300c562')]))
+        self.assertEqual(snapshot.lookup('0.0.1900', '0x500507630300c562',
+                                         '0x4010400000000000'), '')
+        self.assertEqual(snapshot.lookup('0.0.1940', '0x500507630300c562',
+                                         '0x4010400100000000'), 'sg1')
@@ -17,12 +17,20 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import itertools
 import mock
+import os
+import re
+import subprocess
+import threading
+import time
 import unittest
 
 import wok.exception as exception
-from model.model_utils import get_directories, get_dirname
-from model.model_utils import get_row_data, get_rows_info
+from model.model_utils import collect_rows, get_directories, get_dirname
+from model.model_utils import get_row_data, get_rows_info, get_table_parser
+from model.model_utils import run_command_lines, run_in_pool, TableParser
+from model.storagedevices import DEVICE_PATTERN, HEADER_PATTERN
 
 
 class GetDirectoriesDirnameUnitTests(unittest.TestCase):
@@ -249,3 +257,289 @@ class GetRowsInfoUnitTests(unittest.TestCase):
                                 hdr_index=0, val_start_index=1)
         self.assertEqual(devices, {'0000': {"dummy": "0000",
                                    "output": "output"}})
+
+
+class TableParserUnitTests(unittest.TestCase):
+    """
+    unit tests for TableParser and get_table_parser()
+    """
+    out = "name value\n----\nab 01\ncd 02\nnot a row\nef 03"
+    header_pattern = r'(name)\s(value)'
+    value_pattern = r'^(\w{2})\s(\d+)$'
+
+    def test_parser_is_shared(self):
+        parser = get_table_parser(self.header_pattern, self.value_pattern)
+        self.assertIs(get_table_parser(self.header_pattern,
+                                       self.value_pattern), parser)
+        self.assertIsNot(get_table_parser(self.header_pattern, r'(\w+)'),
+                         parser)
+
+    def test_iter_rows(self):
+        parser = TableParser(self.header_pattern, self.value_pattern)
+        self.assertEqual(list(parser.iter_rows(self.out)),
+                         [{'name': 'ab', 'value': '01'},
+                          {'name': 'cd', 'value': '02'},
+                          {'name': 'ef', 'value': '03'}])
+
+    def test_iter_rows_is_lazy(self):
+        """
+        unit test to validate that the rows are matched only when they
+        are consumed
+        """
+        parser = TableParser(self.header_pattern, self.value_pattern)
+        parser.val_pattern = mock.Mock(wraps=parser.val_pattern)
+        rows = parser.iter_rows(self.out)
+        self.assertFalse(parser.val_pattern.search.called)
+        self.assertEqual(next(rows), {'name': 'ab', 'value': '01'})
+        self.assertEqual(parser.val_pattern.search.call_count, 1)
+
+    @mock.patch('model.model_utils.wok_log', autospec=True)
+    def test_iter_rows_no_header_match(self, mock_log):
+        """
+        unit test to validate that a wrong header is reported before any
+        row is consumed
+        """
+        parser = TableParser(r'(unknown)', self.value_pattern)
+        self.assertRaises(exception.OperationFailed,
+                          parser.iter_rows, self.out)
+
+    def test_header_columns_are_cached(self):
+        parser = TableParser(self.header_pattern, self.value_pattern)
+        parser.hdr_pattern = mock.Mock(wraps=parser.hdr_pattern)
+        list(parser.iter_rows(self.out))
+        list(parser.iter_rows(self.out))
+        self.assertEqual(parser.hdr_pattern.search.call_count, 1)
+
+    def test_find_row_condition(self):
+        parser = TableParser(self.header_pattern, self.value_pattern)
+        self.assertEqual(parser.find_row(self.out,
+                                         lambda row: row['name'] == 'cd'),
+                         {'name': 'cd', 'value': '02'})
+        self.assertEqual(parser.find_row(self.out,
+                                         lambda row: row['name'] == 'xx'),
+                         {})
+
+    def test_iter_line_rows(self):
+        """
+        unit test to validate that the lines skipped by keep are not
+        matched against the value pattern
+        """
+        parser = TableParser(self.header_pattern, self.value_pattern)
+        parser.val_pattern = mock.Mock(wraps=parser.val_pattern)
+        rows = parser.iter_line_rows(iter(self.out.split('\n')),
+                                     keep=lambda line: line[0] != 'c')
+        self.assertEqual([row['name'] for row in rows], ['ab', 'ef'])
+        self.assertEqual(parser.val_pattern.search.call_count, 3)
+
+    def test_collect_rows(self):
+        rows = [{'name': 'ab', 'value': '01'}, {'name': 'cd', 'value': '02'}]
+        self.assertEqual(collect_rows(iter(rows), unique_col='name'),
+                         {'ab': rows[0], 'cd': rows[1]})
+        self.assertEqual(collect_rows(iter(rows)), rows)
+
+
+class RunCommandLinesUnitTests(unittest.TestCase):
+    """
+    unit tests for run_command_lines() method
+    """
+    def test_lines(self):
+        lines = run_command_lines(['printf', 'a\\nb b\\n\\nc'])
+        self.assertEqual(list(lines), ['a', 'b b', '', 'c'])
+
+    @mock.patch('model.model_utils.wok_log', autospec=True)
+    def test_failure_after_output(self, mock_log):
+        """
+        unit test to validate that the lines are yielded before the
+        failure of the command is raised
+        """
+        lines = run_command_lines(['sh', '-c', 'echo out; echo err >&2; '
+                                               'exit 3'])
+        self.assertEqual(next(lines), 'out')
+        with self.assertRaises(exception.OperationFailed) as cm:
+            next(lines)
+        self.assertEqual(cm.exception.params['rc'], 3)
+        self.assertEqual(cm.exception.params['reason'], 'err')
+
+    @mock.patch('model.model_utils.wok_log', autospec=True)
+    def test_missing_command(self, mock_log):
+        lines = run_command_lines(['/nonexistent/command'])
+        self.assertRaises(exception.OperationFailed, list, lines)
+
+    def test_stop_reading(self):
+        """
+        unit test to validate that the command is stopped once the
+        caller stops reading
+        """
+        procs = []
+        real_popen = subprocess.Popen
+
+        def popen(*args, **kwargs):
+            procs.append(real_popen(*args, **kwargs))
+            return procs[-1]
+
+        with mock.patch('model.model_utils.subprocess.Popen',
+                        side_effect=popen):
+            lines = run_command_lines(['yes'])
+            self.assertEqual(list(itertools.islice(lines, 3)),
+                             ['y', 'y', 'y'])
+            lines.close()
+        self.assertIsNotNone(procs[0].returncode)
+
+
+class LscssParseBenchmark(unittest.TestCase):
+    """
+    Micro-benchmark of parsing the lscss output of 65,536 devices, with
+    the patterns searched line by line as done before and with the shared
+    compiled parser. The timings are only taken and compared if
+    GINGERS390X_BENCHMARK is set.
+    """
+
+    device_count = 65536
+
+    @classmethod
+    def setUpClass(cls):
+        lines = ['Device   Subchan.  DevType CU Type Use  PIM PAM POM  CHPIDs',
+                 '-' * 70]
+        for devno in range(cls.device_count):
+            lines.append('0.0.%04x 0.0.%04x  3390/0c 3990/e9 %s  f0  f0  ff'
+                         '   %02x%02x1112 00000000'
+                         % (devno, devno, 'yes' if devno % 2 else '   ',
+                            devno % 256, devno / 256))
+        cls.lscss_out = '\n'.join(lines)
+
+    def _parse_per_line(self):
+        command_out = self.lscss_out.strip().split("\n")
+        header = re.search(HEADER_PATTERN, command_out[0], re.M | re.I)
+        devices = {}
+        for row in command_out[2:]:
+            value = re.search(DEVICE_PATTERN, row, re.M | re.I)
+            if value and header.group() != value.group() and \
+                    len(header.groups()) == len(value.groups()):
+                row_data = {}
+                for cnt in range(1, len(header.groups()) + 1):
+                    row_data[header.group(cnt)] = value.group(cnt)
+                devices[row_data['Device']] = row_data
+        return devices
+
+    def test_parse_lscss_65536_devices(self):
+        devices = get_rows_info(self.lscss_out, HEADER_PATTERN,
+                                DEVICE_PATTERN, unique_col='Device')
+        self.assertEqual(len(devices), self.device_count)
+        self.assertEqual(devices, self._parse_per_line())
+
+    @unittest.skipUnless(os.environ.get('GINGERS390X_BENCHMARK'),
+                         'set GINGERS390X_BENCHMARK=1 to run benchmarks')
+    def test_parse_lscss_65536_devices_timing(self):
+        start = time.time()
+        self._parse_per_line()
+        per_line = time.time() - start
+
+        start = time.time()
+        get_rows_info(self.lscss_out, HEADER_PATTERN, DEVICE_PATTERN,
+                      unique_col='Device')
+        compiled = time.time() - start
+
+        self.assertLess(compiled, per_line,
+                        'parse lscss of %d devices: per line %.0fms, '
+                        'compiled %.0fms' % (self.device_count,
+                                             per_line * 1000,
+                                             compiled * 1000))
+
+
+class RunInPoolUnitTests(unittest.TestCase):
+    """
+    unit tests for run_in_pool() method
+    """
+    def test_results_in_order(self):
+        results = run_in_pool(lambda item: item * 2, [3, 1, 2], 2)
+        self.assertEqual(results, [(6, None), (2, None), (4, None)])
+
+    def test_error_is_reported_per_item(self):
+        def func(item):
+            if item == 'bad':
+                raise ValueError(item)
+            return item
+
+        results = run_in_pool(func, ['good', 'bad'], 4)
+        self.assertEqual(results[0], ('good', None))
+        self.assertTrue(isinstance(results[1][1], ValueError))
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def func(item):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            threading.Event().wait(0.01)
+            with lock:
+                running[0] -= 1
+
+        run_in_pool(func, range(20), 3)
+        self.assertTrue(peak[0] <= 3)
+
+    @mock.patch('model.model_utils.wok_log', autospec=True)
+    def test_stuck_item_times_out(self, mock_log):
+        release = threading.Event()
+
+        def func(item):
+            if item == 'stuck':
+                release.wait()
+            return item
+
+        results = run_in_pool(func, ['stuck', 'a', 'b'], 2, timeout=0.2)
+        release.set()
+        self.assertTrue(isinstance(results[0][1],
+                                   exception.TimeoutExpired))
+        self.assertEqual(results[1:], [('a', None), ('b', None)])
+        self.assertTrue(mock_log.error.called)
+
+    @mock.patch('model.model_utils.wok_log', autospec=True)
+    def test_stuck_item_single_worker(self, mock_log):
+        """
+        unit test to validate that the items queued after a stuck one are
+        processed by a new thread, with their timeout counted from when
+        they started
+        """
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def func(item):
+            if item == 'stuck':
+                release.wait()
+            else:
+                time.sleep(0.15)
+            return item
+
+        results = run_in_pool(func, ['stuck', 'a', 'b', 'c'], 1,
+                              timeout=0.2)
+        self.assertTrue(isinstance(results[0][1],
+                                   exception.TimeoutExpired))
+        self.assertEqual(results[1:], [('a', None), ('b', None),
+                                       ('c', None)])
+
+    @mock.patch('model.model_utils.wok_log', autospec=True)
+    def test_timed_out_thread_stops(self, mock_log):
+        """
+        unit test to validate that the thread of a timed out item takes
+        no more items once it finished, so the concurrency stays bounded
+        """
+        threads = {}
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def func(item):
+            threads[item] = threading.current_thread()
+            if item == 'stuck':
+                release.wait()
+            else:
+                release.set()
+                time.sleep(0.01)
+            return item
+
+        results = run_in_pool(func, ['stuck'] + range(20), 1, timeout=0.1)
+        self.assertEqual(results[1:], [(item, None) for item in range(20)])
+        self.assertNotIn(threads['stuck'],
+                         [threads[item] for item in range(20)])
@@ -17,18 +17,27 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import augeas
 import mock
+import os
 import re
+import shutil
+import tempfile
+import time
 import unittest
 
 import wok.exception as exception
 from model.nwdevices import _bring_offline, _bring_online
-from model.nwdevices import _configure_interface, _create_ifcfg_file
+from model.nwdevices import _configure_interface, _configure_interfaces
+from model.nwdevices import _create_ifcfg_file
 from model.nwdevices import _format_znetconf, _get_configured_devices
 from model.nwdevices import _get_unconfigured_devices, _is_interface_online
-from model.nwdevices import NetworkDeviceModel, NetworkDevicesModel
+from model.nwdevices import IfcfgAugeas, NetworkDeviceInventory
+from model.nwdevices import NetworkDeviceModel
+from model.nwdevices import NetworkDevicesBulkModel, NetworkDevicesModel
 from model.nwdevices import _persist_interface
-from model.nwdevices import _unconfigure_interface, _unpersist_interface
+from model.nwdevices import _unconfigure_interface, _unconfigure_interfaces
+from model.nwdevices import _unpersist_interface
 from model.nwdevices import _validate_device, _write_ifcfg_params
 
 ifcfg_path = 'etc/sysconfig/network-scripts/ifcfg-enccw<deviceid>'
@@ -81,6 +90,20 @@ class GetListUnitTests(unittest.TestCase):
     unit tests for get_list() method of NetworkDevicesModel()
     using mock module
     """
+    def setUp(self):
+        patcher = mock.patch('model.nwdevices.nw_inventory',
+                             NetworkDeviceInventory(10))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # no qeth devices in sysfs, znetconf is run instead
+        patcher = mock.patch('model.nwdevices.qeth_sysfs.ccwgroup_dir',
+                             '/nonexistent/qeth/')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.nwdevices.uevent.watch', autospec=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
     @mock.patch('model.nwdevices._get_unconfigured_devices', autospec=True)
     @mock.patch('model.nwdevices.wok_log')
@@ -123,16 +146,16 @@ class GetListUnitTests(unittest.TestCase):
                                        method in model.nwdevices()
         mock_get_configured_devices: mock of _get_configured_devices()
                                      method in model.nwdevices
-        get_list() should call only _get_configured_devices() method
+        get_list() should return only the configured devices
         """
         configured = 'True'
         networkdevicesmodel = NetworkDevicesModel()
-        mock_get_configured_devices.return_value = ['dummy_device']
-        expected_out = ['dummy_device']
+        mock_get_configured_devices.return_value = [{'name': 'dummy_device'}]
+        mock_get_unconfigured_devices.return_value = [{'name': 'device2'}]
+        expected_out = [{'name': 'dummy_device'}]
         actual_out = networkdevicesmodel.get_list(configured)
         mock_get_configured_devices.assert_called_once_with()
-        self.assertFalse(mock_get_unconfigured_devices.called,
-                         msg='Unexpected call to mock_get_configured_devices')
+        mock_get_unconfigured_devices.assert_called_once_with()
         self.assertTrue(mock_wok_log.info.called, msg='Expected call to'
                         ' mock_wok_log.info(). Not called')
         self.assertEqual(actual_out, expected_out)
@@ -151,16 +174,15 @@ class GetListUnitTests(unittest.TestCase):
                                        method in model.nwdevices()
         mock_get_configured_devices: mock of _get_configured_devices()
                                      method in model.nwdevices
-        get_list() should call only _get_unconfigured_devices() method
+        get_list() should return only the un-configured devices
         """
         configured = 'False'
         networkdevicesmodel = NetworkDevicesModel()
-        mock_get_unconfigured_devices.return_value = ['dummy_device']
-        expected_out = ['dummy_device']
+        mock_get_configured_devices.return_value = [{'name': 'device1'}]
+        mock_get_unconfigured_devices.return_value = [{'name': 'dummy_device'}]
+        expected_out = [{'name': 'dummy_device'}]
         actual_out = networkdevicesmodel.get_list(configured)
         mock_get_unconfigured_devices.assert_called_once_with()
-        self.assertFalse(mock_get_configured_devices.called,
-                         msg='Unexpected call to mock_get_configured_devices')
         self.assertTrue(mock_wok_log.info.called, msg='Expected call to'
                         ' mock_wok_log.info(). Not called')
         self.assertEqual(actual_out, expected_out)
@@ -181,25 +203,42 @@ class GetListUnitTests(unittest.TestCase):
         mock_get_configured_devices: mock of _get_configured_devices()
                                      method in model.nwdevices
         get_list() should call _get_configured_devices() and
-        _get_unconfigured_devices()
+        _get_unconfigured_devices() once, later calls are served from
+        the inventory
         """
         configured = None
         networkdevicesmodel = NetworkDevicesModel()
-        mock_get_configured_devices.return_value = ['dummy_device1']
-        mock_get_unconfigured_devices.return_value = ['dummy_device2']
-        expected_out = ['dummy_device1', 'dummy_device2']
+        mock_get_configured_devices.return_value = [{'name': 'device1'}]
+        mock_get_unconfigured_devices.return_value = [{'name': 'device2'}]
+        expected_out = [{'name': 'device1'}, {'name': 'device2'}]
         actual_out = networkdevicesmodel.get_list(configured)
+        actual_out[0]['name'] = 'changed'
+        self.assertEqual(networkdevicesmodel.get_list(configured),
+                         expected_out)
         mock_get_unconfigured_devices.assert_called_once_with()
         mock_get_configured_devices.assert_called_once_with()
         self.assertTrue(mock_wok_log.info.called, msg='Expected call to'
                         ' mock_wok_log.info(). Not called')
-        self.assertEqual(actual_out, expected_out)
 
 
 class NetworkDeviceLookUpUnitTests(unittest.TestCase):
     """
     unit tests for lookup() method of NetworkDeviceModel using mock module
     """
+    def setUp(self):
+        patcher = mock.patch('model.nwdevices.nw_inventory',
+                             NetworkDeviceInventory(10))
+        self.inventory = patcher.start()
+        self.addCleanup(patcher.stop)
+        # no qeth devices in sysfs, znetconf is run instead
+        patcher = mock.patch('model.nwdevices.qeth_sysfs.ccwgroup_dir',
+                             '/nonexistent/qeth/')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.nwdevices.uevent.watch', autospec=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch('model.nwdevices.TaskModel', autospec=True)
     @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
     @mock.patch('model.nwdevices._get_unconfigured_devices', autospec=True)
@@ -224,13 +263,13 @@ class NetworkDeviceLookUpUnitTests(unittest.TestCase):
         lookup() should raise InvalidParameter exception
         """
         device = 'dummy_device'
-        mock_get_unconfigured_devices.return_value = {'device1': 'dummy_data'}
-        mock_get_configured_devices.return_value = {'device2': 'dummy_data'}
+        mock_get_unconfigured_devices.return_value = [{'name': 'device1'}]
+        mock_get_configured_devices.return_value = [{'name': 'device2'}]
         nwmodel = NetworkDeviceModel(kargs=None)
         self.assertRaises(exception.InvalidParameter, nwmodel.lookup, device)
         mock_validate_device.assert_called_once_with(device)
-        mock_get_configured_devices.assert_called_once_with(UNIQUE_COL_NAME)
-        mock_get_unconfigured_devices.assert_called_once_with(UNIQUE_COL_NAME)
+        mock_get_configured_devices.assert_called_once_with()
+        mock_get_unconfigured_devices.assert_called_once_with()
         mock_wok_log.error.assert_called_once_with('Given device is not '
                                                    'of type OSA. Device: '
                                                    '%s', device)
@@ -294,18 +333,17 @@ class NetworkDeviceLookUpUnitTests(unittest.TestCase):
         lookup() should output returned from _get_configured_devices()
         """
         device = 'dummy_device'
-        expected_out = {device: 'device_found'}
-        mock_get_configured_devices.return_value = expected_out
+        expected_out = {'name': device, 'state': 'Online'}
+        mock_get_configured_devices.return_value = [expected_out]
+        mock_get_unconfigured_devices.return_value = [
+            {'name': device, 'state': 'Unconfigured'}]
         nwmodel = NetworkDeviceModel(kargs=None)
         actual_out = nwmodel.lookup(device)
         mock_validate_device.assert_called_once_with(device)
-        mock_get_configured_devices.assert_called_once_with(UNIQUE_COL_NAME)
-        self.assertFalse(mock_get_unconfigured_devices.called,
-                         msg='Unexpected call to '
-                             'mock_get_unconfigured_devices()')
+        mock_get_configured_devices.assert_called_once_with()
         self.assertTrue(mock_wok_log.info.called, msg='Expected call to '
                         'mock_wok_log.info(). Not called')
-        self.assertEqual(actual_out, expected_out[device])
+        self.assertEqual(actual_out, expected_out)
 
     @mock.patch('model.nwdevices.TaskModel', autospec=True)
     @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
@@ -331,17 +369,99 @@ class NetworkDeviceLookUpUnitTests(unittest.TestCase):
         lookup() should output returned from _get_unconfigured_devices()
         """
         device = 'dummy_device'
-        expected_out = {device: 'device_found'}
-        mock_get_configured_devices.return_value = {'dev1': 'not_found'}
-        mock_get_unconfigured_devices.return_value = expected_out
+        expected_out = {'name': device}
+        mock_get_configured_devices.return_value = [{'name': 'dev1'}]
+        mock_get_unconfigured_devices.return_value = [expected_out]
         nwmodel = NetworkDeviceModel(kargs=None)
         actual_out = nwmodel.lookup(device)
         mock_validate_device.assert_called_once_with(device)
-        mock_get_configured_devices.assert_called_once_with(UNIQUE_COL_NAME)
-        mock_get_unconfigured_devices.assert_called_once_with(UNIQUE_COL_NAME)
+        mock_get_configured_devices.assert_called_once_with()
+        mock_get_unconfigured_devices.assert_called_once_with()
         self.assertTrue(mock_wok_log.info.called, msg='Expected call to '
                         'mock_wok_log.info(). Not called')
-        self.assertEqual(actual_out, expected_out[device])
+        self.assertEqual(actual_out, expected_out)
+
+
+class NetworkDeviceInventoryUnitTests(unittest.TestCase):
+    """
+    unit tests for the inventory of configured and un-configured devices
+    """
+    def setUp(self):
+        # no qeth devices in sysfs, znetconf is run instead
+        patcher = mock.patch('model.nwdevices.qeth_sysfs.ccwgroup_dir',
+                             '/nonexistent/qeth/')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.nwdevices.uevent.watch', autospec=True)
+        self.mock_watch = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.inventory = NetworkDeviceInventory(10)
+
+    @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
+    @mock.patch('model.nwdevices._get_unconfigured_devices', autospec=True)
+    def test_lookup_miss_refreshes_once(self, mock_get_unconfigured_devices,
+                                        mock_get_configured_devices):
+        """
+        unit test to validate that lookups are served from memory and a
+        miss refreshes the inventory once
+        """
+        mock_get_configured_devices.return_value = [{'name': 'enccw0.0.1530'}]
+        mock_get_unconfigured_devices.return_value = []
+        self.assertEqual(self.inventory.lookup('enccw0.0.1530'),
+                         {'name': 'enccw0.0.1530'})
+        self.assertEqual(self.inventory.lookup('enccw0.0.1530'),
+                         {'name': 'enccw0.0.1530'})
+        self.assertEqual(mock_get_configured_devices.call_count, 1)
+        self.assertIsNone(self.inventory.lookup('enccw0.0.1540'))
+        self.assertEqual(mock_get_configured_devices.call_count, 2)
+        self.assertEqual(mock_get_unconfigured_devices.call_count, 2)
+        self.mock_watch.assert_called_once_with(self.inventory.invalidate,
+                                                ['ccw', 'ccwgroup'])
+
+    @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
+    @mock.patch('model.nwdevices._get_unconfigured_devices', autospec=True)
+    def test_refresh_failure(self, mock_get_unconfigured_devices,
+                             mock_get_configured_devices):
+        """
+        unit test to validate that a failing znetconf fails the listing
+        and the inventory is collected again on the next call
+        """
+        mock_get_configured_devices.return_value = []
+        mock_get_unconfigured_devices.side_effect = \
+            exception.OperationFailed('GS390XCMD0001E')
+        self.assertRaises(exception.OperationFailed, self.inventory.get_list)
+        mock_get_unconfigured_devices.side_effect = None
+        mock_get_unconfigured_devices.return_value = [{'name': 'dev1'}]
+        self.assertEqual(self.inventory.get_list(), [{'name': 'dev1'}])
+
+    @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
+    @mock.patch('model.nwdevices._get_unconfigured_devices', autospec=True)
+    def test_invalidate(self, mock_get_unconfigured_devices,
+                        mock_get_configured_devices):
+        """
+        unit test to validate that the inventory is collected again once
+        invalidated or expired
+        """
+        mock_get_configured_devices.return_value = []
+        mock_get_unconfigured_devices.return_value = []
+        self.inventory.get_list()
+        self.inventory.invalidate()
+        self.inventory.get_list()
+        self.inventory.timestamp -= 10
+        self.inventory.get_list(configured=True)
+        self.assertEqual(mock_get_configured_devices.call_count, 3)
+
+    @mock.patch('model.nwdevices.nw_inventory', autospec=True)
+    @mock.patch('model.nwdevices._is_interface_online', autospec=True)
+    def test_invalidated_by_configure(self, mock_is_interface_online,
+                                      mock_nw_inventory):
+        """
+        unit test to validate that configuring a device invalidates the
+        inventory, even on failure
+        """
+        mock_is_interface_online.side_effect = Exception('dummy')
+        _configure_interface(mock.Mock(), '0.0.1530')
+        mock_nw_inventory.invalidate.assert_called_once_with()
 
 
 class PostOperationsNetworkDeviceModel(unittest.TestCase):
@@ -621,6 +741,16 @@ class WriteIfcfgParamsUnitTests(unittest.TestCase):
     """
     unit tests for _write_ifcfg_params() method using  mock module
     """
+    def setUp(self):
+        # fresh augeas handle, not shared with the other tests
+        patcher = mock.patch('model.nwdevices.ifcfg_augeas', IfcfgAugeas())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.nwdevices._use_augeas',
+                             return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
     @mock.patch('model.nwdevices.augeas', autospec=True)
     @mock.patch('model.nwdevices.wok_log', autospec=True)
@@ -644,15 +774,16 @@ class WriteIfcfgParamsUnitTests(unittest.TestCase):
         # returning attributes which are used by _write_ifcfg_params()
 
         _write_ifcfg_params(device)
-        parser_mock = mock_augeas.Augeas('/')
-        calls = [(ifcfg_file_pattern+'DEVICE', device_name,),
-                 (ifcfg_file_pattern+'ONBOOT', 'yes',),
-                 (ifcfg_file_pattern+'NETTYPE', 'qeth',),
-                 (ifcfg_file_pattern+'SUBCHANNELS', 'dummy_ids',)]
-        for i in range(0, 3):
-            x, y = parser_mock.set.call_args_list[i]
-            assert x == calls[i]
-        assert parser_mock.set.call_count == 4
+        parser_mock = mock_augeas.Augeas.return_value
+        calls = [mock.call(ifcfg_file_pattern+'DEVICE', device_name),
+                 mock.call(ifcfg_file_pattern+'ONBOOT', 'yes'),
+                 mock.call(ifcfg_file_pattern+'NETTYPE', 'qeth'),
+                 mock.call(ifcfg_file_pattern+'SUBCHANNELS', 'dummy_ids')]
+        parser_mock.set.assert_has_calls(calls, any_order=True)
+        # the lens and the single ifcfg file to be loaded
+        assert parser_mock.set.call_count == 6
+        parser_mock.set.assert_any_call('/augeas/load/Ifcfg/incl[1]',
+                                        '/' + ifcfg_file_pattern[:-1])
         parser_mock.load.assert_called_once_with()
         parser_mock.save.assert_called_once_with()
         self.assertTrue(mock_wok_log.info.called, msg='Expected call to '
@@ -678,22 +809,20 @@ class WriteIfcfgParamsUnitTests(unittest.TestCase):
         mock_get_configured_devices.return_value = \
             {device_name: {'name': device_name, 'device_ids': ['dummy_ids']}}
         # returning attributes which are used by _write_ifcfg_params()
-        parser_mock = mock_augeas.Augeas('/')
+        parser_mock = mock_augeas.Augeas.return_value
         parser_mock.load.side_effect = Exception('dummy_error')
 
         self.assertRaises(exception.OperationFailed,
                           _write_ifcfg_params, device)
         parser_mock.load.assert_called_once_with()
-        self.assertFalse(parser_mock.set.called, msg='Unexpected call to '
-                                                     'parser_mock.set()')
         self.assertFalse(parser_mock.save.called, msg='Unexpected call to '
                                                       'parser_mock.save()')
+        parser_mock.close.assert_called_once_with()
         self.assertTrue(mock_wok_log.info.called, msg='Expected call to '
                         'mock_wok_log.info(). Not called')
-        mock_wok_log.error.assert_called_once_with('Failedd to write device '
-                                                   'attributes to ifcfg file'
-                                                   ' using augeas tool. '
-                                                   'Error: dummy_error')
+        mock_wok_log.error.assert_called_once_with(
+            'Failed to write device attributes to ifcfg file /%s. '
+            'Error: dummy_error' % ifcfg_path.replace('<deviceid>', device))
 
     @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
     @mock.patch('model.nwdevices.augeas', autospec=True)
@@ -711,7 +840,7 @@ class WriteIfcfgParamsUnitTests(unittest.TestCase):
                             KeyError exception
         """
         device = '0.0.0101'
-        parser_mock = mock_augeas.Augeas('/')
+        parser_mock = mock_augeas.Augeas.return_value
         mock_get_configured_devices.return_value = {'dummy': 'dict'}
 
         self.assertRaises(KeyError, _write_ifcfg_params, device)
@@ -725,6 +854,137 @@ class WriteIfcfgParamsUnitTests(unittest.TestCase):
                         'mock_wok_log.info(). Not called')
 
 
+class IfcfgAugeasUnitTests(unittest.TestCase):
+    """
+    unit tests for the shared augeas handle writing ifcfg files
+    """
+    @mock.patch('model.nwdevices.augeas', autospec=True)
+    def test_handle_reused(self, mock_augeas):
+        """
+        unit test to validate that nothing is loaded on creating the
+        handle, it is created once and each write only loads its own files
+        """
+        mock_augeas.Augeas.NO_LOAD = 32
+        mock_augeas.Augeas.NO_MODL_AUTOLOAD = 64
+        ifcfg = IfcfgAugeas()
+        ifcfg.write({'etc/ifcfg-a': {'ONBOOT': 'yes'}})
+        ifcfg.write({'etc/ifcfg-b': {'ONBOOT': 'no'}})
+        mock_augeas.Augeas.assert_called_once_with('/', flags=96)
+        parser = mock_augeas.Augeas.return_value
+        self.assertEqual(parser.remove.call_args_list,
+                         [mock.call('/augeas/load/Ifcfg')] * 2)
+        self.assertEqual(parser.set.call_args_list[-3:], [
+            mock.call('/augeas/load/Ifcfg/lens', 'Shellvars.lns'),
+            mock.call('/augeas/load/Ifcfg/incl[1]', '/etc/ifcfg-b'),
+            mock.call('etc/ifcfg-b/ONBOOT', 'no')])
+        self.assertEqual(parser.save.call_count, 2)
+
+    @mock.patch('model.nwdevices.augeas', autospec=True)
+    def test_handle_dropped_on_error(self, mock_augeas):
+        """
+        unit test to validate that a failed write doesn't leave unsaved
+        changes in the handle used by the next write
+        """
+        parser = mock_augeas.Augeas.return_value
+        parser.save.side_effect = [IOError('dummy_error'), None]
+        ifcfg = IfcfgAugeas()
+        self.assertRaises(IOError, ifcfg.write,
+                          {'etc/ifcfg-a': {'ONBOOT': 'yes'}})
+        parser.close.assert_called_once_with()
+        ifcfg.write({'etc/ifcfg-a': {'ONBOOT': 'yes'}})
+        self.assertEqual(mock_augeas.Augeas.call_count, 2)
+
+
+class IfcfgPersistBenchmark(unittest.TestCase):
+    """
+    Micro-benchmark of persisting network devices one by one into their
+    ifcfg files, with a full augeas load per device as done before and
+    with the shared handle loading only the ifcfg file being written.
+    Needs the augeas library, skipped otherwise. The timings are only
+    taken and compared if GINGERS390X_BENCHMARK is set.
+    """
+
+    devices = ['0.0.%04x' % devno for devno in range(0xf500, 0xf600, 8)]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        try:
+            augeas.Augeas(self.root, flags=augeas.Augeas.NO_LOAD).close()
+        except Exception as e:
+            self.skipTest('augeas is not available: %s' % e)
+
+        scripts_dir = os.path.join(self.root, os.path.dirname(ifcfg_path))
+        os.makedirs(scripts_dir)
+        self._create_etc_files()
+
+    def _create_etc_files(self):
+        etc_files = {'etc/hosts': '127.0.0.1 localhost\n',
+                     'etc/fstab': '/dev/dasda1 / ext4 defaults 1 1\n',
+                     'etc/sysctl.conf': 'vm.swappiness = 10\n',
+                     'etc/sysconfig/network': 'NETWORKING=yes\n'}
+        for device in self.devices:
+            etc_files[ifcfg_path.replace('<deviceid>', device)] = \
+                'BOOTPROTO=dhcp\n'
+        for path, content in etc_files.iteritems():
+            with open(os.path.join(self.root, path), 'w') as etc_file:
+                etc_file.write(content)
+
+    def _params(self, device):
+        return {'DEVICE': ENCCW + device, 'ONBOOT': 'yes',
+                'SUBCHANNELS': device, 'NETTYPE': 'qeth'}
+
+    def _persist_full_load(self, device):
+        parser = augeas.Augeas(self.root)
+        parser.load()
+        for key, value in self._params(device).iteritems():
+            parser.set(ifcfg_path.replace('<deviceid>', device) + '/' + key,
+                       value)
+        parser.save()
+        parser.close()
+
+    def _read_ifcfg_files(self):
+        contents = {}
+        for device in self.devices:
+            path = os.path.join(self.root,
+                                ifcfg_path.replace('<deviceid>', device))
+            with open(path) as ifcfg_file:
+                contents[device] = sorted(ifcfg_file.read().splitlines())
+        return contents
+
+    def _persist_scoped(self):
+        ifcfg = IfcfgAugeas(self.root)
+        for device in self.devices:
+            ifcfg.write({ifcfg_path.replace('<deviceid>', device):
+                         self._params(device)})
+
+    def test_persist_per_device(self):
+        for device in self.devices:
+            self._persist_full_load(device)
+        expected = self._read_ifcfg_files()
+
+        self._create_etc_files()
+        self._persist_scoped()
+        self.assertEqual(self._read_ifcfg_files(), expected)
+
+    @unittest.skipUnless(os.environ.get('GINGERS390X_BENCHMARK'),
+                         'set GINGERS390X_BENCHMARK=1 to run benchmarks')
+    def test_persist_per_device_timing(self):
+        start = time.time()
+        for device in self.devices:
+            self._persist_full_load(device)
+        full_load = (time.time() - start) / len(self.devices)
+
+        self._create_etc_files()
+        start = time.time()
+        self._persist_scoped()
+        scoped = (time.time() - start) / len(self.devices)
+
+        self.assertLess(scoped, full_load,
+                        'persist per device: full load %.2fms, scoped '
+                        '%.2fms' % (full_load * 1000, scoped * 1000))
+
+
 class IsInterfaceOnlineUnitTests(unittest.TestCase):
     """
     unit tests for _is_interface_online() method using mock module
@@ -838,12 +1098,12 @@ class CreateIfcfgFileUnitTests(unittest.TestCase):
         """
         device = 'dummy_device'
         ifcfg_file_path = '/' + ifcfg_path.replace('<deviceid>', device)
-        command = 'chmod 644 ' + ifcfg_file_path
         open_mock = mock.mock_open()
         with mock.patch('model.nwdevices.open', open_mock, create=True):
             _create_ifcfg_file(device)
             open_mock.assert_called_once_with(ifcfg_file_path, 'w+')
-            mock_os.system.assert_called_once_with(command)
+            mock_os.fchmod.assert_called_once_with(
+                open_mock.return_value.fileno.return_value, 0o644)
             self.assertTrue(mock_wok_log.info.called, msg='Expected call to '
                             'mock_wok_log.info(). Not called')
 
@@ -865,8 +1125,8 @@ class CreateIfcfgFileUnitTests(unittest.TestCase):
             self.assertRaises(exception.OperationFailed,
                               _create_ifcfg_file, device)
             open_mock.assert_called_once_with(ifcfg_file_path, 'w+')
-            self.assertFalse(mock_os.system.called, msg='Unexpected '
-                             'call to mock_os.system()')
+            self.assertFalse(mock_os.fchmod.called, msg='Unexpected '
+                             'call to mock_os.fchmod()')
             mock_wok_log.error.assert_called_once_with(
                 'failed to create file %s for network device'
                 ' %s. Error: dummy_error' % (ifcfg_file_path, device))
@@ -875,24 +1135,24 @@ class CreateIfcfgFileUnitTests(unittest.TestCase):
 
     @mock.patch('model.nwdevices.wok_log', autospec=True)
     @mock.patch('model.nwdevices.os', autospec=True)
-    def test_create_os_systemexception(self, mock_os, mock_wok_log):
+    def test_create_os_fchmodexception(self, mock_os, mock_wok_log):
         """
         unit test to validate _create_ifcfg_file() method when
-        os.system() raises an exception
+        os.fchmod() raises an exception
         mock_os: mock of os module imported in model.nwdevices
         mock_wok_log: mock of wok_log in model.nwdevices
         expected behaviour: should raise OperationFailed exception
         """
         device = 'dummy_device'
         ifcfg_file_path = '/' + ifcfg_path.replace('<deviceid>', device)
-        command = 'chmod 644 ' + ifcfg_file_path
-        mock_os.system.side_effect = Exception('dummy_error')
+        mock_os.fchmod.side_effect = Exception('dummy_error')
         open_mock = mock.mock_open()
         with mock.patch('model.nwdevices.open', open_mock, create=True):
             self.assertRaises(exception.OperationFailed,
                               _create_ifcfg_file, device)
             open_mock.assert_called_once_with(ifcfg_file_path, 'w+')
-            mock_os.system.assert_called_once_with(command)
+            self.assertTrue(mock_os.fchmod.called, msg='Expected call to '
+                            'mock_os.fchmod(). Not called')
             mock_wok_log.error.assert_called_once_with(
                 'failed to create file %s for network device'
                 ' %s. Error: dummy_error' % (ifcfg_file_path, device))
@@ -1039,6 +1299,182 @@ class UnconfigureInterfaceUnitTests(unittest.TestCase):
         mock_unpersist_interface.assert_called_once_with(interface)
 
 
+class BulkConfigureUnitTests(unittest.TestCase):
+    """
+    unit tests for the bulk configure/unconfigure of network devices
+    """
+    def setUp(self):
+        self.messages = []
+        patcher = mock.patch('model.nwdevices.nw_inventory', autospec=True)
+        self.mock_inventory = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.nwdevices.ifcfg_augeas', IfcfgAugeas())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.nwdevices._use_augeas',
+                             return_value=True)
+        self.mock_use_augeas = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cb(self, msg, status=None):
+        self.messages.append((msg, status))
+
+    @mock.patch('model.nwdevices.add_task', autospec=True)
+    def test_configure_validates_devices(self, mock_add_task):
+        """
+        unit test to validate that the device ids are validated and
+        duplicates are dropped before the task is started
+        """
+        mock_add_task.return_value = 1
+        model = NetworkDevicesBulkModel(objstore=mock.Mock())
+        model.configure('configure', ['0.0.1530', 'enccw0.0.1530',
+                                      '0.0.1540'])
+        mock_add_task.assert_called_once_with(
+            '/plugins/gingers390x/nwdevices/bulk/configure',
+            _configure_interfaces, model.objstore, ['0.0.1530', '0.0.1540'])
+        self.assertRaises(exception.InvalidParameter, model.configure,
+                          'configure', '0.0.1530')
+        self.assertRaises(exception.InvalidParameter, model.unconfigure,
+                          'unconfigure', ['0.0.1530', 'invalid'])
+
+    @mock.patch('model.nwdevices.augeas', autospec=True)
+    @mock.patch('model.nwdevices._get_devices', autospec=True)
+    @mock.patch('model.nwdevices.os', autospec=True)
+    @mock.patch('model.nwdevices._bring_offline', autospec=True)
+    @mock.patch('model.nwdevices._bring_online', autospec=True)
+    @mock.patch('model.nwdevices._is_interface_online', autospec=True)
+    def test_configure_success(self, mock_is_interface_online,
+                               mock_bring_online, mock_bring_offline,
+                               mock_os, mock_get_devices, mock_augeas):
+        """
+        unit test to validate that the configured devices are read once
+        and all ifcfg files are written in a single augeas session
+        """
+        interfaces = ['0.0.1530', '0.0.1540']
+        mock_is_interface_online.return_value = False
+        mock_os.path.isfile.return_value = True
+        mock_get_devices.return_value = (
+            [{'name': ENCCW + interface,
+              'device_ids': [interface]} for interface in interfaces], [])
+        _configure_interfaces(self.cb, interfaces)
+        self.assertEqual(mock_bring_online.call_count, 2)
+        mock_get_devices.assert_called_once_with()
+        self.assertEqual(mock_augeas.Augeas.call_count, 1)
+        parser = mock_augeas.Augeas.return_value
+        parser.load.assert_called_once_with()
+        parser.save.assert_called_once_with()
+        # lens, two files to be loaded and four attributes per file
+        self.assertEqual(parser.set.call_count, 11)
+        parser.set.assert_any_call(
+            ifcfg_path.replace('<deviceid>', '0.0.1540') + '/DEVICE',
+            'enccw0.0.1540')
+        self.assertFalse(mock_bring_offline.called)
+        self.assertTrue(self.messages[-1][1])
+        self.mock_inventory.invalidate.assert_called_once_with()
+
+    @mock.patch('model.nwdevices.augeas', autospec=True)
+    @mock.patch('model.nwdevices._get_devices', autospec=True)
+    @mock.patch('model.nwdevices.os', autospec=True)
+    @mock.patch('model.nwdevices._bring_offline', autospec=True)
+    @mock.patch('model.nwdevices._bring_online', autospec=True)
+    @mock.patch('model.nwdevices._is_interface_online', autospec=True)
+    def test_configure_rollback(self, mock_is_interface_online,
+                                mock_bring_online, mock_bring_offline,
+                                mock_os, mock_get_devices, mock_augeas):
+        """
+        unit test to validate that only the failed devices are rolled back
+        and reported
+        """
+        interfaces = ['0.0.1530', '0.0.1540', '0.0.1550']
+        mock_is_interface_online.return_value = False
+        mock_os.path.isfile.return_value = True
+
+        def bring_online(interface):
+            if interface == '0.0.1530':
+                raise exception.OperationFailed('GS390XIONW001E',
+                                                {'device': interface,
+                                                 'error': 'failed'})
+        mock_bring_online.side_effect = bring_online
+        # 0.0.1550 went online but did not show up as configured device
+        mock_get_devices.return_value = (
+            [{'name': 'enccw0.0.1540', 'device_ids': ['0.0.1540']}], [])
+        _configure_interfaces(self.cb, interfaces)
+        mock_bring_offline.assert_called_once_with('0.0.1550')
+        parser = mock_augeas.Augeas.return_value
+        self.assertEqual(parser.set.call_count, 6)
+        msg, status = self.messages[-1]
+        self.assertFalse(status)
+        self.assertIn('0.0.1530', msg)
+        self.assertIn('0.0.1550', msg)
+        self.assertNotIn('0.0.1540', msg)
+
+    @mock.patch('model.nwdevices.persistence.write_ifcfg', autospec=True)
+    @mock.patch('model.nwdevices.augeas', autospec=True)
+    @mock.patch('model.nwdevices._get_devices', autospec=True)
+    @mock.patch('model.nwdevices.os', autospec=True)
+    @mock.patch('model.nwdevices._bring_offline', autospec=True)
+    @mock.patch('model.nwdevices._bring_online', autospec=True)
+    @mock.patch('model.nwdevices._is_interface_online', autospec=True)
+    def test_configure_native_writer(self, mock_is_interface_online,
+                                     mock_bring_online, mock_bring_offline,
+                                     mock_os, mock_get_devices, mock_augeas,
+                                     mock_write_ifcfg):
+        """
+        unit test to validate that the native writer persists each device
+        on its own and augeas is not used
+        """
+        self.mock_use_augeas.return_value = False
+        interfaces = ['0.0.1530', '0.0.1540']
+        mock_is_interface_online.return_value = True
+        mock_os.path.isfile.return_value = True
+        mock_get_devices.return_value = (
+            [{'name': ENCCW + interface,
+              'device_ids': [interface]} for interface in interfaces], [])
+
+        def write_ifcfg(path, params):
+            if path.endswith('0.0.1540'):
+                raise IOError(28, 'No space left on device')
+        mock_write_ifcfg.side_effect = write_ifcfg
+        _configure_interfaces(self.cb, interfaces)
+        mock_write_ifcfg.assert_any_call(
+            '/' + ifcfg_path.replace('<deviceid>', '0.0.1530'),
+            {'DEVICE': 'enccw0.0.1530', 'ONBOOT': 'yes',
+             'SUBCHANNELS': '0.0.1530', 'NETTYPE': 'qeth'})
+        self.assertFalse(mock_augeas.Augeas.called)
+        msg, status = self.messages[-1]
+        self.assertFalse(status)
+        self.assertIn('0.0.1540', msg)
+        self.assertNotIn('0.0.1530', msg)
+
+    @mock.patch('model.nwdevices._unpersist_interface', autospec=True)
+    @mock.patch('model.nwdevices._bring_online', autospec=True)
+    @mock.patch('model.nwdevices._bring_offline', autospec=True)
+    @mock.patch('model.nwdevices._is_interface_online', autospec=True)
+    def test_unconfigure_rollback(self, mock_is_interface_online,
+                                  mock_bring_offline, mock_bring_online,
+                                  mock_unpersist_interface):
+        """
+        unit test to validate that a device failing to be unpersisted is
+        brought back online
+        """
+        mock_is_interface_online.return_value = True
+
+        def unpersist(interface):
+            if interface == '0.0.1540':
+                raise exception.OperationFailed('GS390XIONW004E',
+                                                {'device': interface,
+                                                 'ifcfg_file_path': 'path',
+                                                 'error': 'failed'})
+        mock_unpersist_interface.side_effect = unpersist
+        _unconfigure_interfaces(self.cb, ['0.0.1530', '0.0.1540'])
+        self.assertEqual(mock_bring_offline.call_count, 2)
+        mock_bring_online.assert_called_once_with('0.0.1540')
+        msg, status = self.messages[-1]
+        self.assertFalse(status)
+        self.assertIn('0.0.1540', msg)
+        self.mock_inventory.invalidate.assert_called_once_with()
+
+
 class GetConfiguredDevicesUnitTests(unittest.TestCase):
     """
     unit tests for _get_configured_devices() method using mock module
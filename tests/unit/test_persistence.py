@@ -0,0 +1,157 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from model import persistence
+
+
+class ConfFileUnitTests(unittest.TestCase):
+    """
+    unit tests for the indexed configuration files
+    """
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.conf_dir, 'dasd.conf')
+        with open(self.path, 'w') as conf:
+            conf.write('# persistent DASDs\n0.0.0190 use_diag=1\n0.0.0191\n')
+        os.chmod(self.path, 0o640)
+        self.conf = persistence.ConfFile(self.path, persistence._dasd_key)
+
+    def tearDown(self):
+        shutil.rmtree(self.conf_dir)
+
+    def _read(self):
+        with open(self.path) as conf:
+            return conf.read().splitlines()
+
+    def test_contains(self):
+        self.assertTrue(self.conf.contains('0.0.0190'))
+        self.assertTrue(self.conf.contains('0.0.0191'))
+        self.assertFalse(self.conf.contains('0.0.0192'))
+        self.assertFalse(self.conf.contains('#'))
+
+    def test_index_parsed_once(self):
+        self.conf.contains('0.0.0190')
+        with mock.patch.object(self.conf, '_index') as mock_index:
+            self.conf.contains('0.0.0191')
+            self.assertFalse(mock_index.called)
+
+        # changes made by others are picked up
+        with open(self.path, 'a') as conf:
+            conf.write('0.0.0192\n')
+        self.assertTrue(self.conf.contains('0.0.0192'))
+
+    def test_batched_update(self):
+        self.assertTrue(self.conf.update(add=['0.0.0192', '0.0.0190'],
+                                         remove=['0.0.0191', '0.0.0193']))
+        self.assertEqual(self._read(), ['# persistent DASDs',
+                                        '0.0.0190 use_diag=1', '0.0.0192'])
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.conf_dir), ['dasd.conf'])
+        self.assertTrue(self.conf.contains('0.0.0192'))
+        self.assertFalse(self.conf.update(add=['0.0.0192']))
+
+    def test_remove_case_insensitive(self):
+        self.conf.update(remove=['0.0.019A', '0.0.0190'])
+        self.conf.update(add=['0.0.019a'])
+        self.conf.update(remove=['0.0.019A'])
+        self.assertEqual(self._read(), ['# persistent DASDs', '0.0.0191'])
+
+    def test_missing_file(self):
+        os.unlink(self.path)
+        self.assertFalse(self.conf.contains('0.0.0190'))
+        self.assertFalse(os.path.exists(self.path))
+        self.conf.update(add=['0.0.0190'])
+        self.assertEqual(self._read(), ['0.0.0190'])
+
+    def test_update_failure_keeps_file(self):
+        with mock.patch('model.persistence.os.rename',
+                        side_effect=OSError(28, 'No space left')):
+            self.assertRaises(OSError, self.conf.update, add=['0.0.0192'])
+        self.assertEqual(len(self._read()), 3)
+        self.assertEqual(os.listdir(self.conf_dir), ['dasd.conf'])
+
+    def test_zfcp_conf(self):
+        conf = persistence.ConfFile(self.path, persistence._zfcp_key)
+        lun = '0.0.1900 0x500507630300c562 0x4010400000000000'
+        conf.update(add=[lun, lun.upper()])
+        self.assertTrue(conf.contains(lun))
+        conf.update(remove=[lun])
+        self.assertFalse(conf.contains(lun))
+
+
+class WriteIfcfgUnitTests(unittest.TestCase):
+    """
+    unit tests for the native ifcfg file writer
+    """
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.conf_dir, 'ifcfg-enccw0.0.f500')
+        self.params = {'DEVICE': 'enccw0.0.f500', 'ONBOOT': 'yes',
+                       'SUBCHANNELS': '0.0.f500,0.0.f501,0.0.f502',
+                       'NETTYPE': 'qeth'}
+
+    def tearDown(self):
+        shutil.rmtree(self.conf_dir)
+
+    def _read(self):
+        with open(self.path) as ifcfg:
+            return ifcfg.read().splitlines()
+
+    def test_new_file(self):
+        self.assertTrue(persistence.write_ifcfg(self.path, self.params))
+        self.assertEqual(self._read(), ['DEVICE=enccw0.0.f500',
+                                        'NETTYPE=qeth', 'ONBOOT=yes',
+                                        'SUBCHANNELS=0.0.f500,0.0.f501,'
+                                        '0.0.f502'])
+        self.assertEqual(os.stat(self.path).st_mode & 0o7777, 0o644)
+        self.assertFalse(persistence.write_ifcfg(self.path, self.params))
+
+    def test_keeps_unknown_keys(self):
+        with open(self.path, 'w') as ifcfg:
+            ifcfg.write('# generated\nBOOTPROTO=dhcp\nONBOOT=no\n'
+                        'export ONBOOT=no\nIPADDR="10.0.0.1"')
+        os.chmod(self.path, 0o600)
+        persistence.write_ifcfg(self.path, {'ONBOOT': 'yes',
+                                            'NAME': 'System eth0'})
+        self.assertEqual(self._read(), ['# generated', 'BOOTPROTO=dhcp',
+                                        'ONBOOT=yes', 'IPADDR="10.0.0.1"',
+                                        'NAME="System eth0"'])
+        self.assertEqual(os.stat(self.path).st_mode & 0o7777, 0o600)
+
+    def test_quoting(self):
+        persistence.write_ifcfg(self.path, {'OPTIONS': 'a="$b"'})
+        self.assertEqual(self._read(), ['OPTIONS="a=\\"\\$b\\""'])
+
+    def test_failure_keeps_file(self):
+        persistence.write_ifcfg(self.path, self.params)
+        with mock.patch('model.persistence.os.rename',
+                        side_effect=OSError(28, 'No space left')):
+            self.assertRaises(OSError, persistence.write_ifcfg, self.path,
+                              {'ONBOOT': 'no'})
+        self.assertIn('ONBOOT=yes', self._read())
+        self.assertEqual(os.listdir(self.conf_dir),
+                         [os.path.basename(self.path)])
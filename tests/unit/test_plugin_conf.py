@@ -0,0 +1,76 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cherrypy.lib.reprconf import Parser
+
+from wok.plugins.gingers390x.config import _get_config, DEFAULT_CONFIG
+
+CONF_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '..', '..', 'gingers390x.conf')
+
+
+class PluginConfTests(unittest.TestCase):
+    """
+    unit tests for the shipped gingers390x.conf
+    """
+
+    def test_parsed_by_wok(self):
+        """
+        unit test to validate that the plugin conf loads with the parser
+        wok uses for it, which takes Python literals only
+        """
+        conf = Parser().dict_from_file(CONF_FILE)
+        self.assertTrue(conf['wok']['enable'])
+        self.assertTrue(conf['gingers390x'])
+
+    def test_tunables(self):
+        """
+        unit test to validate that the shipped conf sets every tunable,
+        with a value of the same type as its default
+        """
+        config = _get_config(CONF_FILE)
+        self.assertEqual(sorted(config), sorted(DEFAULT_CONFIG))
+        for option, value in config.iteritems():
+            self.assertEqual(type(value), type(DEFAULT_CONFIG[option]),
+                             option)
+
+    def test_defaults(self):
+        """
+        unit test to validate that tunables missing in the conf get their
+        defaults and the other sections are ignored
+        """
+        conf_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, conf_dir)
+        conf_file = os.path.join(conf_dir, 'gingers390x.conf')
+        with open(conf_file, 'w') as conf:
+            conf.write("[gingers390x]\nlun_probe_workers = 2\n"
+                       "ifcfg_augeas = True\n\n"
+                       "[/]\ntools.sessions.name = 'wok'\n")
+        config = _get_config(conf_file)
+        self.assertEqual(config['lun_probe_workers'], 2)
+        self.assertTrue(config['ifcfg_augeas'])
+        self.assertEqual(config['lun_probe_timeout'],
+                         DEFAULT_CONFIG['lun_probe_timeout'])
+        self.assertNotIn('tools.sessions.name', config)
+        self.assertEqual(_get_config('/nonexistent.conf'), DEFAULT_CONFIG)
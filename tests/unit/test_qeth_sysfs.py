@@ -0,0 +1,174 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from model import nwdevices
+from model import qeth_sysfs
+
+# recorded from a system having the same devices as the sysfs fixture,
+# the header lines of znetconf end with a blank
+ZNETCONF_C_OUT = '\n'.join([
+    'Device IDs                 Type    Card Type      CHPID Drv. '
+    'Name          State ',
+    '-' * 80,
+    '0.0.f500,0.0.f501,0.0.f502 1731/01 OSD_1000          76 qeth '
+    'enccw0.0.f500 online'])
+
+ZNETCONF_U_OUT = '\n'.join([
+    'Scanning for network devices...',
+    'Device IDs                 Type    Card Type      CHPID Drv. ',
+    '-' * 60,
+    '0.0.f503,0.0.f504,0.0.f505 1731/01 OSA (QDIO)        76 qeth',
+    '0.0.f600,0.0.f601,0.0.f602 1731/01 OSA (QDIO)        77 qeth'])
+
+
+class QethSysfsFixture(object):
+    """
+    Fake /sys/devices/css0 tree along with the /sys/bus/ccw/devices and
+    /sys/bus/ccwgroup/drivers/qeth views of it
+    """
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp()
+        self.css_dir = os.path.join(self.root, 'css0')
+        self.ccw_dir = os.path.join(self.root, 'ccw') + '/'
+        self.ccwgroup_dir = os.path.join(self.root, 'qeth') + '/'
+        os.makedirs(self.ccw_dir)
+        os.makedirs(self.ccwgroup_dir)
+        with open(self.ccwgroup_dir + 'uevent', 'w'):
+            pass
+        self.subchannel = 0
+
+    def _write(self, path, attrs):
+        for attr, value in attrs.iteritems():
+            with open(os.path.join(path, attr), 'w') as attr_file:
+                attr_file.write(value + '\n')
+
+    def add_device(self, device, cutype, chpid):
+        subchannel_dir = os.path.join(self.css_dir,
+                                      '0.0.%04x' % self.subchannel)
+        self.subchannel += 1
+        device_dir = os.path.join(subchannel_dir, device)
+        os.makedirs(device_dir)
+        self._write(subchannel_dir, {'chpids': chpid + ' 00 00 00 00 00 00 '
+                                               '00'})
+        self._write(device_dir, {'cutype': cutype, 'online': '0'})
+        os.symlink(device_dir, self.ccw_dir + device)
+
+    def add_group(self, devices, attrs):
+        group_dir = self.ccwgroup_dir + devices[0]
+        os.mkdir(group_dir)
+        self._write(group_dir, attrs)
+        for index, device in enumerate(devices):
+            device_dir = os.path.realpath(self.ccw_dir + device)
+            os.symlink(device_dir, os.path.join(group_dir, 'cdev%d' % index))
+            os.symlink(group_dir, os.path.join(device_dir, 'group_device'))
+
+    def cleanup(self):
+        shutil.rmtree(self.root)
+
+
+class QethSysfsTests(unittest.TestCase):
+    """
+    unit tests for reading the qeth devices from sysfs
+    """
+
+    def setUp(self):
+        self.sysfs = QethSysfsFixture()
+        for devno in range(0xf500, 0xf507):
+            self.sysfs.add_device('0.0.%04x' % devno, '1731/01', '76')
+        for devno in range(0xf600, 0xf603):
+            self.sysfs.add_device('0.0.%04x' % devno, '1731/01', '77')
+        for devno in range(0x7000, 0x7003):
+            self.sysfs.add_device('0.0.%04x' % devno, '1731/05', 'fc')
+        self.sysfs.add_device('0.0.0200', '3990/e9', '40')
+        self.sysfs.add_group(['0.0.f500', '0.0.f501', '0.0.f502'],
+                             {'card_type': 'OSD_1000', 'chpid': '76',
+                              'if_name': 'enccw0.0.f500', 'online': '1'})
+        for target, value in (('ccw_dir', self.sysfs.ccw_dir),
+                              ('ccwgroup_dir', self.sysfs.ccwgroup_dir)):
+            patcher = mock.patch('model.qeth_sysfs.' + target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.sysfs.cleanup()
+
+    def test_read_configured_devices(self):
+        devices = qeth_sysfs.read_configured_devices()
+        self.assertEqual(devices, [qeth_sysfs.QethDevice(
+            ['0.0.f500', '0.0.f501', '0.0.f502'], '1731/01', 'OSD_1000', '76',
+            'enccw0.0.f500', True)])
+
+    def test_read_unconfigured_devices(self):
+        """
+        unit test to validate that the devices are grouped per CHPID and
+        the incomplete group 0.0.f506 is skipped
+        """
+        devices = qeth_sysfs.read_unconfigured_devices()
+        self.assertEqual([device.device_ids for device in devices],
+                         [['0.0.7000', '0.0.7001', '0.0.7002'],
+                          ['0.0.f503', '0.0.f504', '0.0.f505'],
+                          ['0.0.f600', '0.0.f601', '0.0.f602']])
+        self.assertEqual(devices[0].card_type, 'HiperSockets')
+        self.assertEqual(devices[1].card_type, 'OSA (QDIO)')
+        self.assertEqual(devices[2].chpid, '77')
+
+    def test_write_device_follows_read_device(self):
+        """
+        unit test to validate that no group is formed if the write device
+        does not follow the read device
+        """
+        shutil.rmtree(os.path.realpath(self.sysfs.ccw_dir + '0.0.f504'))
+        os.unlink(self.sysfs.ccw_dir + '0.0.f504')
+        devices = qeth_sysfs.read_unconfigured_devices()
+        self.assertEqual([device.device_ids for device in devices
+                          if device.chpid == '76'], [])
+
+    @mock.patch('model.nwdevices.run_command', autospec=True)
+    def test_equivalent_to_znetconf(self, mock_run_command):
+        """
+        unit test to validate that the devices read from sysfs are the
+        same as the ones parsed from the znetconf output
+        """
+        mock_run_command.side_effect = lambda cmd: \
+            [ZNETCONF_C_OUT if cmd[1] == '-c' else ZNETCONF_U_OUT, '', 0]
+        configured, unconfigured = nwdevices._get_sysfs_devices()
+        self.assertEqual([len(configured), len(unconfigured)], [1, 2])
+        self.assertEqual((configured, unconfigured),
+                         nwdevices._get_znetconf_devices())
+
+    @mock.patch('model.nwdevices.run_command', autospec=True)
+    def test_znetconf_fallback(self, mock_run_command):
+        """
+        unit test to validate that znetconf is run only if sysfs can't be
+        read
+        """
+        mock_run_command.side_effect = lambda cmd: \
+            [ZNETCONF_C_OUT if cmd[1] == '-c' else ZNETCONF_U_OUT, '', 0]
+        devices = nwdevices._get_devices()
+        self.assertFalse(mock_run_command.called)
+        with mock.patch('model.qeth_sysfs.ccwgroup_dir', '/nonexistent/'):
+            self.assertEqual(nwdevices._get_devices(), devices)
+        self.assertEqual(mock_run_command.call_count, 2)
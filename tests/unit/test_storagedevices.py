@@ -17,26 +17,32 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import binascii
 import mock
+import os
+import time
 import unittest
 
 import wok.exception as exception
+from model.storagedevices import _bring_device_offline, _bring_device_online
 from model.storagedevices import _bring_offline, _bring_online
-from model.storagedevices import _byte_to_binary, _device_offline
-from model.storagedevices import _device_online, _format_lscss
-from model.storagedevices import _get_dasdeckd_devices, _get_deviceinfo
-from model.storagedevices import _get_paths, _get_zfcp_devices
-from model.storagedevices import _hex_to_binary, _is_dasdeckd_device
+from model.storagedevices import _device_offline
+from model.storagedevices import _device_online, _devices_offline
+from model.storagedevices import _devices_online, _format_lscss
+from model.storagedevices import _get_deviceinfo, _get_paths
+from model.storagedevices import _is_dasdeckd_device
 from model.storagedevices import _is_dasdeckd_persisted, _is_online
 from model.storagedevices import _is_zfcp_device, _list_devicesinfo
 from model.storagedevices import _persist_dasdeckd_device
-from model.storagedevices import StorageDeviceModel, StorageDevicesModel
+from model.storagedevices import StorageDeviceCache, StorageDeviceModel
+from model.storagedevices import StorageDevicesBulkModel, StorageDevicesModel
 from model.storagedevices import _unpersist_dasdeckd_device, _validate_device
+from model.storagedevices import DEVICE_PATTERN, HEADER_PATTERN
+from model.storagedevices import PATH_OFFSETS
 
 
 syspath_eckd = "/sys/bus/ccw/drivers/dasd-eckd/0.*/"
 syspath_zfcp = "/sys/bus/ccw/drivers/zfcp/0.*/"
-DASD_CONF = '/etc/dasd.conf'
 
 
 class ListDevicesInfoUnitTests(unittest.TestCase):
@@ -204,106 +210,163 @@ class GetPathsUnitTests(unittest.TestCase):
     def test_get_paths_success(self):
         """
         unit test to test for a valid scenario valid chipids
-        and binary value of pam to get the installed paths
+        and pam mask to get the installed paths
         """
         chipid = 'fa000000 00000000'
-        bin_pam = '10000000'
         installed_paths = ['fa']
-        out = _get_paths(bin_pam, chipid)
+        out = _get_paths(0x80, chipid)
         self.assertEqual(installed_paths, out)
 
-    def test_get_paths_invalid_binaryval(self):
+    def test_get_paths_invalid_mask(self):
         """
         unit test to test for a invalid scenario for valid chipids
-        and invalid binary value of pam to get the installed paths
+        and invalid pam mask to get the installed paths
         """
         chipid = 'fa000000 00000000'
-        bin_pam = '11000000'
-        out = _get_paths(bin_pam, chipid)
+        out = _get_paths(0xc0, chipid)
         installed_paths = ['fa']
         self.assertNotEqual(installed_paths, out)
 
     def test_get_paths_invalid_chipid(self):
         """
         unit test to test for a valid scenario for invalid chipids
-        and valid binary value of pam to get the installed paths
+        and valid pam mask to get the installed paths
         """
         chipid = 'ds0000 00000000'
-        bin_pam = '10000000'
-        out = _get_paths(bin_pam, chipid)
+        out = _get_paths(0x80, chipid)
         installed_paths = ['fa']
         self.assertNotEqual(installed_paths, out)
 
-    def test_byte_to_binary_success(self):
-        """
-        unit test to test the conversion of byte in binary value to get the
-        valid binary value for the corresponding byte
-        """
-        val = '\x80'
-        binaryval = '10000000'
-        out = _byte_to_binary(ord(val))
-        self.assertEqual(binaryval, out)
+    def test_get_paths_several(self):
+        chipid = 'b0b10d0e 00000000'
+        self.assertEqual(_get_paths(0xe0, chipid), ['b0', 'b1', '0d'])
+        self.assertEqual(_get_paths(0x50, chipid), ['b1', '0e'])
+        self.assertEqual(_get_paths(0, chipid), [])
 
-    def test_byte_to_binary_failure(self):
+    def test_path_offsets(self):
         """
-        unit test to test the conversion of byte in binary value to get the
-        invalid binary value for the corresponding byte
+        unit test to validate the lookup table of the path masks against
+        the bits of each mask
         """
-        val = '\x80'
-        binaryval = '1230000'
-        out = _byte_to_binary(ord(val))
-        self.assertNotEqual(binaryval, out)
+        self.assertEqual(len(PATH_OFFSETS), 256)
+        for mask, offsets in enumerate(PATH_OFFSETS):
+            bits = format(mask, '08b')
+            self.assertEqual(offsets, tuple(2 * path for path, bit
+                                            in enumerate(bits)
+                                            if bit == '1'))
 
-    def test_hex_to_binary_success(self):
-        """
-        unit test to test the conversion of a hexadecimal value to binary
-        for a valid hexadecimal value to fetch the the corresponding binary
-        value
-        """
-        val = '80'
-        binaryval = '10000000'
-        out = _hex_to_binary(val)
-        self.assertEqual(binaryval, out)
 
-    def test_hex_to_binary_failure(self):
-        """
-        unit test to test the conversion of a hexadecimal value to binary
-        for a valid hexadecimal value to fetch the the corresponding
-        invalid binary value
-        """
-        val = 'e0'
-        binaryval = '10000000'
-        out = _hex_to_binary(val)
-        self.assertNotEqual(binaryval, out)
+class ChpidDecodeBenchmark(unittest.TestCase):
+    """
+    Micro-benchmark of decoding the PIM and PAM of 10,000 devices into
+    their CHPIDs, with the masks converted to strings of bits as done
+    before and with integer masks and the lookup table. The timings are
+    only taken and compared if GINGERS390X_BENCHMARK is set.
+    """
+
+    device_count = 10000
+
+    def setUp(self):
+        self.devices = []
+        for index in range(self.device_count):
+            pim = 0xff - (index % 16)
+            self.devices.append({
+                "Device": "0.0.%04x" % index, "Subchan": "0.0.%04x" % index,
+                "DevType": "3390/0c", "CU Type": "3990/e9", "Use": "yes",
+                "PIM": "%02x" % pim, "PAM": "%02x" % (pim & ~(index % 8)),
+                "POM": "ff", "CHPIDs": "%02x%02x1112 00000000"
+                                       % (index % 256, index / 256)})
+
+    def _decode_bit_strings(self, device):
+        def hex_to_binary(h):
+            return ''.join(
+                ''.join(str((ord(b) & (1 << i)) and 1)
+                        for i in reversed(range(8)))
+                for b in binascii.unhexlify(h))
+
+        def get_paths(mask, chipid):
+            chipids = [chipid[i:i+2] for i in range(0, len(chipid), 2)]
+            return [chipids[index] for index, bit in enumerate(mask)
+                    if bit == '1']
+
+        return (get_paths(hex_to_binary(device["PAM"]), device["CHPIDs"]),
+                get_paths(hex_to_binary(device["PIM"]), device["CHPIDs"]))
+
+    def _decode_masks(self, device):
+        chipid = device["CHPIDs"]
+        return (_get_paths(int(device["PAM"], 16), chipid),
+                _get_paths(int(device["PIM"], 16), chipid))
+
+    def test_decode_10000_devices(self):
+        expected = map(self._decode_bit_strings, self.devices)
+        self.assertEqual(map(self._decode_masks, self.devices), expected)
+
+        # the listing is the same as before
+        formatted = [_format_lscss(dict(device)) for device in self.devices]
+        self.assertEqual([(device['enabled_chipids'],
+                           device['installed_chipids'])
+                          for device in formatted], expected)
+
+    @unittest.skipUnless(os.environ.get('GINGERS390X_BENCHMARK'),
+                         'set GINGERS390X_BENCHMARK=1 to run benchmarks')
+    def test_decode_10000_devices_timing(self):
+        start = time.time()
+        map(self._decode_bit_strings, self.devices)
+        bit_strings = time.time() - start
+
+        start = time.time()
+        map(self._decode_masks, self.devices)
+        masks = time.time() - start
+
+        self.assertLess(masks, bit_strings,
+                        'decode CHPIDs per %d devices: bit strings %.0fms, '
+                        'masks %.0fms' % (self.device_count,
+                                          bit_strings * 1000, masks * 1000))
 
 
 class GetDeviceInfoUnitTests(unittest.TestCase):
     """
     unit tests for _get_deviceinfo() method
     """
-    @mock.patch('model.storagedevices.utils', autospec=True)
     @mock.patch('model.storagedevices._format_lscss', autospec=True)
-    def test_get_deviceinfo_somedevice(self, mock_format_lscss, mock_utils):
+    def test_get_deviceinfo_somedevice(self, mock_format_lscss):
         """
         unit test to validate _get_deviceinfo() method with
         matching device
-        _get_deviceinfo() should return _format_lscss() o/p
-        """
-        device = "xxx"
-        header_pattern = "(Device)\s+(Subchan)\.\s+(DevType)\s+(CU\ Type)\s+" \
-                         "(Use)\s+(PIM)\s+(PAM)\s+(POM)\s+(CHPIDs)$"
-        device_pattern = "(xxx)\s+(\d\.\d\.[0-9a-fA-F]{4})\s+(\w+\/\w+)" \
-                         "\s+(\w+\/\w+)\s(\s{3}|yes)\s+([0-9a-fA-F]{2})\s+" \
-                         "([0-9a-fA-F]{2})\s+([0-9a-fA-F]{2})\s+(\w+\s\w+)"
-        mock_utils.get_row_data.return_value = {}
+        _get_deviceinfo() should return _format_lscss() o/p of the row of
+        the device
+        """
+        lscss_out = '\n'.join([
+            'Device   Subchan.  DevType CU Type Use  PIM PAM POM  CHPIDs',
+            '-' * 61,
+            '0.0.0190 0.0.0000  3390/0c 3990/e9      f0  f0  ff   '
+            '01021112 00000000',
+            '0.0.019A 0.0.0001  3390/0c 3990/e9 yes  f0  f0  ff   '
+            '01021112 00000000'])
         mock_format_lscss.return_value = {}
-        deviceinfo = _get_deviceinfo('', device)
-        mock_utils.get_row_data.assert_called_with('', header_pattern,
-                                                   device_pattern)
-        mock_format_lscss.assert_called_with(mock_utils.get_row_data.
-                                             return_value)
+        deviceinfo = _get_deviceinfo(lscss_out, '0.0.019a')
+        mock_format_lscss.assert_called_once_with(
+            {'Device': '0.0.019A', 'Subchan': '0.0.0001',
+             'DevType': '3390/0c', 'CU Type': '3990/e9', 'Use': 'yes',
+             'PIM': 'f0', 'PAM': 'f0', 'POM': 'ff',
+             'CHPIDs': '01021112 00000000'})
         self.assertEqual(deviceinfo, {})
 
+    @mock.patch('model.storagedevices._format_lscss', autospec=True)
+    def test_get_deviceinfo_nodevice(self, mock_format_lscss):
+        """
+        unit test to validate _get_deviceinfo() with the device missing in
+        the lscss output
+        _get_deviceinfo() should pass an empty row to _format_lscss()
+        """
+        lscss_out = '\n'.join([
+            'Device   Subchan.  DevType CU Type Use  PIM PAM POM  CHPIDs',
+            '-' * 61,
+            '0.0.0190 0.0.0000  3390/0c 3990/e9      f0  f0  ff   '
+            '01021112 00000000'])
+        _get_deviceinfo(lscss_out, '0.0.0191')
+        mock_format_lscss.assert_called_once_with({})
+
     @mock.patch('model.storagedevices.utils', autospec=True)
     @mock.patch('model.storagedevices._format_lscss', autospec=True)
     def test_get_deviceinfo_emptydevice(self, mock_format_lscss, mock_utils):
@@ -313,8 +376,9 @@ class GetDeviceInfoUnitTests(unittest.TestCase):
         """
         device = ""
         deviceinfo = _get_deviceinfo('', device)
-        self.assertFalse(mock_utils.get_row_data.called,
-                         msg='Unexpected call to mock_utils.get_row_data()')
+        self.assertFalse(mock_utils.get_table_parser.called,
+                         msg='Unexpected call to '
+                             'mock_utils.get_table_parser()')
         self.assertFalse(mock_format_lscss.called,
                          msg='Unexpected call to mock_format_lscss()')
         self.assertEqual(deviceinfo, device)
@@ -328,7 +392,8 @@ class GetDeviceInfoUnitTests(unittest.TestCase):
         unit test to validate _get_deviceinfo() with key error raised
         by format lscss
         """
-        mock_utils.get_row_data.return_value = {"key": "value"}
+        mock_utils.get_table_parser.return_value.find_row.return_value = \
+            {"key": "value"}
         mock_format_lscss.side_effect = KeyError
         self.assertRaises(KeyError, _get_deviceinfo, '', 'gdhdh')
         mock_log.error.assert_called_with('lscss column key not found')
@@ -338,44 +403,48 @@ class GetListUnitTests(unittest.TestCase):
     """
     unit tests for get_list() of StorageDevicesModel()
     """
+    def setUp(self):
+        patcher = mock.patch('model.storagedevices.device_cache',
+                             StorageDeviceCache(30))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # no channel subsystem in sysfs, lscss is run instead
+        patcher = mock.patch('model.storagedevices.css_sysfs.css_dir',
+                             '/nonexistent/css/devices/')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('model.storagedevices.uevent.watch',
+                             autospec=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch('model.storagedevices.utils', autospec=True)
-    @mock.patch('model.storagedevices.run_command', autospec=True)
     @mock.patch('model.storagedevices._format_lscss', autospec=True)
     @mock.patch('model.storagedevices._list_devicesinfo', autospec=True)
     def test_get_list_type_none(self, mock_list_deviceinfo,
-                                mock_format_lscss,
-                                mock_run_command, mock_utils):
+                                mock_format_lscss, mock_utils):
         """
         unit test to validate get_list() of StorageDevicesModel()
         with flag filter None
         """
         storagedevicesmodel = StorageDevicesModel()
-        command = ["lscss"]
-        header_pattern = "(Device)\s+(Subchan)\." \
-                         "\s+(DevType)\s+(CU\ Type)\s+" \
-                         "(Use)\s+(PIM)\s+(PAM)" \
-                         "\s+(POM)\s+(CHPIDs)$"
-        device_pattern = "(\d\.\d\.[0-9a-fA-F]{4})" \
-                         "\s+(\d\.\d\.[0-9a-fA-F]{4})\s+" \
-                         "(\w+\/\w+)\s+(\w+\/\w+)" \
-                         "\s(\s{3}|yes)\s+([0-9a-fA-F]{2})\s+" \
-                         "([0-9a-fA-F]{2})\s+([0-9a-fA-F]{2})" \
-                         "\s+(\w+\s\w+)"
         mock_utils.get_directories.return_value = ["abc"]
-        mock_utils.get_rows_info.return_value = {}
-        mock_run_command.return_value = ["", "", 0]
+        mock_utils.collect_rows.return_value = {}
         storagedevicesmodel.get_list()
         calls = [('/sys/bus/ccw/drivers/dasd-eckd/0.*/',),
                  ('/sys/bus/ccw/drivers/zfcp/0.*/',)]
-        for i in range(0, 1):
+        for i in range(0, 2):
             x, y = mock_utils.get_directories.call_args_list[i]
             assert x == calls[i]
         assert mock_utils.get_directories.call_count == 2
-        mock_run_command.assert_called_with(command)
-        mock_utils.get_rows_info.assert_called_once_with(
-            "",
-            header_pattern,
-            device_pattern,
+        mock_utils.run_command_lines.assert_called_once_with(["lscss"])
+        mock_utils.get_table_parser.assert_called_once_with(HEADER_PATTERN,
+                                                            DEVICE_PATTERN)
+        parser = mock_utils.get_table_parser.return_value
+        parser.iter_line_rows.assert_called_once_with(
+            mock_utils.run_command_lines.return_value, keep=mock.ANY)
+        mock_utils.collect_rows.assert_called_once_with(
+            parser.iter_line_rows.return_value,
             unique_col='device',
             format_data=mock_format_lscss)
         mock_list_deviceinfo.assert_called_once_with({}, ["abc", "abc"])
@@ -397,80 +466,59 @@ class GetListUnitTests(unittest.TestCase):
         assert returns == []
 
     @mock.patch('model.storagedevices.utils', autospec=True)
-    @mock.patch('model.storagedevices.run_command', autospec=True)
     @mock.patch('model.storagedevices._format_lscss', autospec=True)
     @mock.patch('model.storagedevices._list_devicesinfo', autospec=True)
     def test_get_list_type_dasd(self, mock_list_deviceinfo,
-                                mock_format_lscss,
-                                mock_run_command, mock_utils):
+                                mock_format_lscss, mock_utils):
         """
         unit test to validate get_list() of StorageDevicesModel()
         with flag filter dasd-eckd
         """
         storagedevicesmodel = StorageDevicesModel()
-        command = ["lscss"]
-        header_pattern = "(Device)\s+(Subchan)\." \
-                         "\s+(DevType)\s+(CU\ Type)\s+" \
-                         "(Use)\s+(PIM)\s+(PAM)" \
-                         "\s+(POM)\s+(CHPIDs)$"
-        device_pattern = "(\d\.\d\.[0-9a-fA-F]{4})" \
-                         "\s+(\d\.\d\.[0-9a-fA-F]{4})\s+" \
-                         "(\w+\/\w+)\s+(\w+\/\w+)" \
-                         "\s(\s{3}|yes)\s+([0-9a-fA-F]{2})\s+" \
-                         "([0-9a-fA-F]{2})\s+([0-9a-fA-F]{2})" \
-                         "\s+(\w+\s\w+)"
         mock_utils.get_directories.return_value = ["abc"]
-        mock_utils.get_rows_info.return_value = {}
-        mock_run_command.return_value = ["", "", 0]
+        mock_utils.collect_rows.return_value = {}
         storagedevicesmodel.get_list("dasd-eckd")
-        calls = '/sys/bus/ccw/drivers/dasd-eckd/0.*/'
-        mock_utils.get_directories.assert_called_once_with(calls)
-        mock_run_command.assert_called_with(command)
-        mock_utils.get_rows_info.assert_called_once_with(
-            "",
-            header_pattern,
-            device_pattern,
+        calls = ['/sys/bus/ccw/drivers/dasd-eckd/0.*/',
+                 '/sys/bus/ccw/drivers/zfcp/0.*/']
+        mock_utils.get_directories.assert_has_calls(
+            [mock.call(calls[0])], any_order=True)
+        mock_utils.run_command_lines.assert_called_once_with(["lscss"])
+        mock_utils.get_table_parser.assert_called_once_with(HEADER_PATTERN,
+                                                            DEVICE_PATTERN)
+        parser = mock_utils.get_table_parser.return_value
+        parser.iter_line_rows.assert_called_once_with(
+            mock_utils.run_command_lines.return_value, keep=mock.ANY)
+        mock_utils.collect_rows.assert_called_once_with(
+            parser.iter_line_rows.return_value,
             unique_col='device',
             format_data=mock_format_lscss)
         mock_list_deviceinfo.assert_called_once_with({}, ["abc"])
 
     @mock.patch('model.storagedevices.utils', autospec=True)
-    @mock.patch('model.storagedevices.run_command', autospec=True)
     @mock.patch('model.storagedevices._format_lscss', autospec=True)
     @mock.patch('model.storagedevices._list_devicesinfo', autospec=True)
     def test_get_list_type_zfcp(self, mock_list_deviceinfo,
-                                mock_format_lscss,
-                                mock_run_command, mock_utils):
+                                mock_format_lscss, mock_utils):
         """
         unit test to validate get_list() of StorageDevicesModel()
         with flag filter as zfcp
         """
         storagedevicesmodel = StorageDevicesModel()
-        command = ["lscss"]
-        header_pattern = "(Device)\s+(Subchan)\." \
-                         "\s+(DevType)\s+(CU\ Type)\s+" \
-                         "(Use)\s+(PIM)\s+(PAM)\s+(POM)" \
-                         "\s+(CHPIDs)$"
-        device_pattern = r'(\d\.\d\.[0-9a-fA-F]{4})\s+' \
-                         r'(\d\.\d\.[0-9a-fA-F]{4})\s+' \
-                         r'(\w+\/\w+)\s+' \
-                         r'(\w+\/\w+)\s' \
-                         r'(\s{3}|yes)\s+' \
-                         r'([0-9a-fA-F]{2})\s+' \
-                         r'([0-9a-fA-F]{2})\s+' \
-                         r'([0-9a-fA-F]{2})\s+' \
-                         r'(\w+\s\w+)'
         mock_utils.get_directories.return_value = ["abc"]
-        mock_run_command.return_value = ["", "", 0]
-        mock_utils.get_rows_info.return_value = {}
+        mock_utils.collect_rows.return_value = {}
         storagedevicesmodel.get_list("zfcp")
-        calls = '/sys/bus/ccw/drivers/zfcp/0.*/'
-        mock_utils.get_directories.assert_called_once_with(calls)
-        mock_run_command.assert_called_with(command)
-        mock_utils.get_rows_info.assert_called_once_with(
-            "",
-            header_pattern,
-            device_pattern,
+        calls = ['/sys/bus/ccw/drivers/dasd-eckd/0.*/',
+                 '/sys/bus/ccw/drivers/zfcp/0.*/']
+        mock_utils.get_directories.assert_has_calls(
+            [mock.call(calls[1])], any_order=True)
+        mock_utils.run_command_lines.assert_called_once_with(["lscss"])
+        mock_utils.get_table_parser.assert_called_once_with(HEADER_PATTERN,
+                                                            DEVICE_PATTERN)
+        parser = mock_utils.get_table_parser.return_value
+        parser.iter_line_rows.assert_called_once_with(
+            mock_utils.run_command_lines.return_value, keep=mock.ANY)
+        mock_utils.collect_rows.assert_called_once_with(
+            parser.iter_line_rows.return_value,
             unique_col='device',
             format_data=mock_format_lscss)
         mock_list_deviceinfo.assert_called_once_with({}, ["abc"])
@@ -492,25 +540,77 @@ class GetListUnitTests(unittest.TestCase):
         mock_log.error.assert_called_with("Invalid _type given. _type: abc")
 
     @mock.patch('model.storagedevices.utils', autospec=True)
-    @mock.patch('model.storagedevices.run_command', autospec=True)
-    @mock.patch('model.storagedevices.wok_log', autospec=True)
-    def test_get_list_rc_1(self, mock_log, mock_run_command, mock_utils):
+    def test_get_list_rc_1(self, mock_utils):
         """
         unit test to validate get_list() of StorageDevicesModel()
-        when run_command has non zero return code
+        when lscss has non zero return code
         """
         storagedevicesmodel = StorageDevicesModel()
         mock_utils.get_directories.return_value = ["abc"]
-        mock_run_command.return_value = ["dummy_out", "dummy_err", 1]
+        mock_utils.collect_rows.side_effect = \
+            exception.OperationFailed("GS390XCMD0001E")
         self.assertRaises(exception.OperationFailed,
                           storagedevicesmodel.get_list)
-        mock_log.error.assert_called_with("dummy_err")
+
+    @mock.patch('model.storagedevices.utils.run_command_lines',
+                autospec=True)
+    @mock.patch('model.storagedevices.utils.get_directories', autospec=True)
+    def test_get_list_drops_other_devices(self, mock_get_directories,
+                                          mock_run_command_lines):
+        """
+        unit test to validate that rows of devices other than the
+        dasd-eckd and zfcp devices are not formatted
+        """
+        mock_get_directories.side_effect = lambda pattern: \
+            ['/sys/bus/ccw/drivers/dasd-eckd/0.0.0200/'] \
+            if 'dasd-eckd' in pattern else []
+        mock_run_command_lines.return_value = iter([
+            'Device   Subchan.  DevType CU Type Use  PIM PAM POM  CHPIDs',
+            '-' * 70,
+            '0.0.0200 0.0.0000  3390/0a 3990/e9 yes  e0  e0  ff   '
+            'b0b10d00 00000000',
+            '0.0.1900 0.0.0002  1732/03 1731/03 yes  80  80  ff   '
+            '18000000 00000000'])
+        with mock.patch('model.storagedevices._format_lscss',
+                        wraps=_format_lscss) as mock_format_lscss:
+            devices = StorageDevicesModel().get_list()
+        self.assertEqual([device['device'] for device in devices],
+                         ['0.0.0200'])
+        self.assertEqual(mock_format_lscss.call_count, 1)
 
 
 class GetStoragedeviceUnitTests(unittest.TestCase):
     """
     unit tests for get_storagedevice() and lookup() of StorageDeviceModel()
     """
+    def setUp(self):
+        patcher = mock.patch('model.storagedevices.device_cache',
+                             autospec=True)
+        self.mock_device_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_device_cache.get_device.return_value = None
+
+    @mock.patch('model.storagedevices._validate_device', autospec=True)
+    @mock.patch('model.storagedevices._is_dasdeckd_device', autospec=True)
+    @mock.patch('model.storagedevices.run_command', autospec=True)
+    def test_get_storagedevice_cached(self, mock_run_command,
+                                      mock_is_dasdeckd_device,
+                                      mock_validate_device):
+        """
+        unittest to validate get_storagedevice() method, when the
+        device is found in the cached lscss table no command is run
+        """
+        mock_validate_device.return_value = "0.0.0190"
+        mock_is_dasdeckd_device.return_value = True
+        self.mock_device_cache.get_device.return_value = {
+            'device': '0.0.0190'}
+        storagedevicemodel = StorageDeviceModel()
+        return_value = storagedevicemodel.get_storagedevice('0.0.0190')
+        self.mock_device_cache.get_device.assert_called_once_with('0.0.0190')
+        self.assertFalse(mock_run_command.called,
+                         msg='Unexpected call to mock_run_command()')
+        self.assertEqual(return_value, {'device': '0.0.0190'})
+
     @mock.patch('model.storagedevices._validate_device', autospec=True)
     @mock.patch('model.storagedevices._is_dasdeckd_device', autospec=True)
     @mock.patch('model.storagedevices._is_zfcp_device', autospec=True)
@@ -699,32 +799,37 @@ class StorageDevicePostOperationUnitTests(unittest.TestCase):
     Unit tests for post operation on single
     resource - online() and  offline() using mock.patch
     """
+    @mock.patch('model.storagedevices.add_task', autospec=True)
+    @mock.patch('model.storagedevices.TaskModel', autospec=True)
     @mock.patch('model.storagedevices._validate_device', autospec=True)
-    @mock.patch('model.storagedevices._device_online', autospec=True)
-    def test_online_valid_device(self, mock_device_online,
-                                 mock_validate_device):
+    def test_online_valid_device(self, mock_validate_device,
+                                 mock_task_model, mock_add_task):
         """
         unit test to validate online operation with valid device id
-        (_validate_device and _device_online goes fine)
+        (_validate_device goes fine and a task is created)
         mock_validate_device: mock of _validate_device model.storagedevices
-        mock_device_online: mock of _device_online model.storagedevices
+        mock_add_task: mock of add_task imported in model.storagedevices
         """
         device = 'dummy_device'
         mock_validate_device.return_value = 'dummy_device'
-        storage_device_model = StorageDeviceModel()
+        mock_add_task.return_value = 1
+        storage_device_model = StorageDeviceModel(objstore='objstore')
         storage_device_model.online(device)
         mock_validate_device.assert_called_once_with(device)
-        mock_device_online.assert_called_once_with(device)
+        mock_add_task.assert_called_once_with(
+            '/plugins/gingers390x/storagedevices/dummy_device/online',
+            _bring_device_online, 'objstore', device)
+        mock_task_model.return_value.lookup.assert_called_once_with(1)
 
+    @mock.patch('model.storagedevices.add_task', autospec=True)
     @mock.patch('model.storagedevices._validate_device', autospec=True)
-    @mock.patch('model.storagedevices._device_online', autospec=True)
-    def test_online_invalid_device(self, mock_device_online,
-                                   mock_validate_device):
+    def test_online_invalid_device(self, mock_validate_device,
+                                   mock_add_task):
         """
         unit test to validate online operation with invalid device id
         (_validate_device raises an exception for invalid device id)
         mock_validate_device: mock of _validate_device model.storagedevices
-        mock_device_online: mock of _device_online model.storagedevices
+        mock_add_task: mock of add_task imported in model.storagedevices
         """
         device = 'dummy_device'
         mock_validate_device.side_effect = exception.OperationFailed
@@ -732,35 +837,38 @@ class StorageDevicePostOperationUnitTests(unittest.TestCase):
         self.assertRaises(exception.OperationFailed,
                           storage_device_model.online, device)
         mock_validate_device.assert_called_once_with(device)
-        self.assertFalse(mock_device_online.called,
-                         msg='Unexpected call to mock_device_online()')
+        self.assertFalse(mock_add_task.called,
+                         msg='Unexpected call to mock_add_task()')
 
+    @mock.patch('model.storagedevices.add_task', autospec=True)
+    @mock.patch('model.storagedevices.TaskModel', autospec=True)
     @mock.patch('model.storagedevices._validate_device', autospec=True)
-    @mock.patch('model.storagedevices._device_offline', autospec=True)
-    def test_offline_valid_device(self, mock_device_offline,
-                                  mock_validate_device):
+    def test_offline_valid_device(self, mock_validate_device,
+                                  mock_task_model, mock_add_task):
         """
         unit test to validate offline operation with valid device id
-        (_validate_device and _device_offline goes fine)
+        (_validate_device goes fine and a task is created)
         mock_validate_device: mock of _validate_device model.storagedevices
-        mock_device_offline: mock of _device_offline model.storagedevices
+        mock_add_task: mock of add_task imported in model.storagedevices
         """
         device = 'dummy_device'
         mock_validate_device.return_value = 'dummy_device'
-        storage_device_model = StorageDeviceModel()
+        storage_device_model = StorageDeviceModel(objstore='objstore')
         storage_device_model.offline(device)
         mock_validate_device.assert_called_once_with(device)
-        mock_device_offline.assert_called_once_with(device)
+        mock_add_task.assert_called_once_with(
+            '/plugins/gingers390x/storagedevices/dummy_device/offline',
+            _bring_device_offline, 'objstore', device)
 
+    @mock.patch('model.storagedevices.add_task', autospec=True)
     @mock.patch('model.storagedevices._validate_device', autospec=True)
-    @mock.patch('model.storagedevices._device_offline', autospec=True)
-    def test_offline_invalid_device(self, mock_device_offline,
-                                    mock_validate_device):
+    def test_offline_invalid_device(self, mock_validate_device,
+                                    mock_add_task):
         """
         unit test to validate offline operation with invalid device id
         (_validate_device raises OperationFailed exception)
         mock_validate_device: mock of _validate_device model.storagedevices
-        mock_device_offline: mock of _device_offline model.storagedevices
+        mock_add_task: mock of add_task imported in model.storagedevices
         """
         device = 'dummy_device'
         mock_validate_device.side_effect = exception.OperationFailed
@@ -768,8 +876,44 @@ class StorageDevicePostOperationUnitTests(unittest.TestCase):
         self.assertRaises(exception.OperationFailed,
                           storage_device_model.offline, device)
         mock_validate_device.assert_called_once_with(device)
-        self.assertFalse(mock_device_offline.called,
-                         msg='Unexpected call to mock_device_offline()')
+        self.assertFalse(mock_add_task.called,
+                         msg='Unexpected call to mock_add_task()')
+
+
+class DeviceTaskUnitTests(unittest.TestCase):
+    """
+    Unit tests for the tasks bringing a single device online or offline
+    """
+    @mock.patch('model.storagedevices.device_cache', autospec=True)
+    @mock.patch('model.storagedevices._device_online', autospec=True)
+    def test_online_task_success(self, mock_device_online,
+                                 mock_device_cache):
+        """
+        unit test to validate the task reports success once the device
+        is online and persisted
+        """
+        cb = mock.Mock()
+        _bring_device_online(cb, '0.0.0190')
+        mock_device_online.assert_called_once_with('0.0.0190')
+        cb.assert_any_call('Bringing device 0.0.0190 online')
+        cb.assert_called_with('Successfully brought device 0.0.0190 online',
+                              True)
+        mock_device_cache.invalidate.assert_called_once_with()
+
+    @mock.patch('model.storagedevices.device_cache', autospec=True)
+    @mock.patch('model.storagedevices._device_offline', autospec=True)
+    def test_offline_task_failure(self, mock_device_offline,
+                                  mock_device_cache):
+        """
+        unit test to validate the task reports the failure of bringing the
+        device offline
+        """
+        cb = mock.Mock()
+        mock_device_offline.side_effect = exception.OperationFailed(
+            'GS390XIOST003E', {'device': '0.0.0190'})
+        _bring_device_offline(cb, '0.0.0190')
+        self.assertFalse(cb.call_args[0][1])
+        mock_device_cache.invalidate.assert_called_once_with()
 
 
 class ValidateDeviceUnitTests(unittest.TestCase):
@@ -947,134 +1091,6 @@ class DeviceOfflineUnitTests(unittest.TestCase):
         # Fix me mock rollback fails
 
 
-class GetDasdEckdDevicesUnitTests(unittest.TestCase):
-    """
-    Unit tests for _get_dasd_eckd_device() method
-    """
-    @mock.patch('model.storagedevices.utils', autospec=True)
-    def test_get_dasdeckd_devices_success(self, mock_utils):
-        """
-        unit test to validate get_dasdeckd_devices with success scenario
-        mock_utils: mock of model_utils imported as
-                    utils in model.storagedevices
-        get_dasdeckd_devices should return list of outputs returned by
-        utils.get_dirname() which is not None or empty string
-        """
-        mock_utils.get_directories.return_value = ['/path1/device1',
-                                                   'path1/device2',
-                                                   '']
-        mock_utils.get_dirname.side_effect = ["device1", "device2", '']
-        expected_out = ['device1', 'device2']
-        actual_out = _get_dasdeckd_devices()
-        mock_utils.get_directories.assert_called_once_with(syspath_eckd)
-        calls_get_dirname = [('/path1/device1',),
-                             ('path1/device2',),
-                             ('',)]
-        for i in range(0, 2):
-            x, y = mock_utils.get_dirname.call_args_list[i]
-            assert x == calls_get_dirname[i]
-        assert mock_utils.get_dirname.call_count == 3
-        self.assertEqual(actual_out, expected_out)
-
-    @mock.patch('model.storagedevices.utils', autospec=True)
-    def test_get_dasdeckd_devices_empty_dir(self, mock_utils):
-        """
-        unit test to validate get_dasdeckd_devices with
-        get_directories of model_utils returning empty list
-        mock_utils: mock of model_utils imported as
-                    utils in model.storagedevices
-        get_dasdeckd_devices should return empty list
-        """
-        mock_utils.get_directories.return_value = []
-        expected_out = []
-        actual_out = _get_dasdeckd_devices()
-        mock_utils.get_directories.assert_called_once_with(syspath_eckd)
-        self.assertFalse(mock_utils.get_dirname.called,
-                         msg='Unexpected call to mock_utils.get_dirname()')
-        self.assertEqual(actual_out, expected_out)
-
-    @mock.patch('model.storagedevices.utils', autospec=True)
-    def test_get_dasdeckd_devices_withnoneout_get_dirname(self, mock_utils):
-        """
-        unit test to validate get_dasdeckd_devices with
-        get_dirname of model_utils returning None
-        mock_utils: mock of model_utils imported as
-                    utils in model.storagedevices
-        get_dasdeckd_devices should return empty list
-        """
-        mock_utils.get_directories.return_value = ['dummy_path']
-        mock_utils.get_dirname.return_value = None
-        expected_out = []
-        actual_out = _get_dasdeckd_devices()
-        mock_utils.get_directories.assert_called_once_with(syspath_eckd)
-        mock_utils.get_dirname.assert_called_once_with('dummy_path')
-        self.assertEqual(actual_out, expected_out)
-
-
-class GetzFCPDevicesUnitTests(unittest.TestCase):
-    """
-    Unit tests for _get_zfcp_device() method
-    """
-    @mock.patch('model.storagedevices.utils', autospec=True)
-    def test_get_zfcp_devices_success(self, mock_utils):
-        """
-        unit test to validate get_zfcp_devices with success scenario
-        mock_utils: mock of model_utils imported as
-                    utils in model.storagedevices
-        get_zfcp_devices should return list of outputs returned by
-        utils.get_dirname() which is not None or empty string
-        """
-        mock_utils.get_directories.return_value = ['/path1/device1',
-                                                   'path1/device2',
-                                                   '']
-        mock_utils.get_dirname.side_effect = ["device1", "device2", '']
-        expected_out = ['device1', 'device2']
-        actual_out = _get_zfcp_devices()
-        mock_utils.get_directories.assert_called_once_with(syspath_zfcp)
-        calls_get_dirname = [('/path1/device1',),
-                             ('path1/device2',),
-                             ('',)]
-        for i in range(0, 2):
-            x, y = mock_utils.get_dirname.call_args_list[i]
-            assert x == calls_get_dirname[i]
-        assert mock_utils.get_dirname.call_count == 3
-        self.assertEqual(actual_out, expected_out)
-
-    @mock.patch('model.storagedevices.utils', autospec=True)
-    def test_get_zfcp_devices_withempty_ofget_directories(self, mock_utils):
-        """
-        unit test to validate get_zfcp_devices with
-        get_directories of model_utils returning empty list
-        mock_utils: mock of model_utils imported as
-                    utils in model.storagedevices
-        get_zfcp_devices should return empty list
-        """
-        mock_utils.get_directories.return_value = []
-        expected_out = []
-        actual_out = _get_zfcp_devices()
-        mock_utils.get_directories.assert_called_once_with(syspath_zfcp)
-        self.assertFalse(mock_utils.get_dirname.called,
-                         msg='Unexpected call to mock_utils.get_dirname()')
-        self.assertEqual(actual_out, expected_out)
-
-    @mock.patch('model.storagedevices.utils', autospec=True)
-    def test_get_zfcp_devices_withnoneout_get_dirname(self, mock_utils):
-        """
-        unit test to validate get_zfcp_devices with
-        get_dirname of model_utils returning None
-        mock_utils: mock of model_utils imported as
-                    utils in model.storagedevices
-        get_zfcp_devices should return empty list
-        """
-        mock_utils.get_directories.return_value = ['dummy_path']
-        mock_utils.get_dirname.return_value = None
-        expected_out = []
-        actual_out = _get_zfcp_devices()
-        mock_utils.get_directories.assert_called_once_with(syspath_zfcp)
-        mock_utils.get_dirname.assert_called_once_with('dummy_path')
-        self.assertEqual(actual_out, expected_out)
-
-
 class IsOnlineUnitTests(unittest.TestCase):
     """
     Unit tests for _is_online() method
@@ -1135,194 +1151,258 @@ class IsDasdEckdPersistedUnitTests(unittest.TestCase):
     """
     Unit tests for _is_dasdeckd_persisted()
     """
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_device_persistsed(self, mock_os):
+    @mock.patch('model.storagedevices.persistence.dasd_conf', autospec=True)
+    def test_device_persistsed(self, mock_dasd_conf):
         """
         unit test to validate _is_dasdeckd_persisted() method
-        success scenario(ie, dasd-eckd device is persisted and
-        user has read access to /etc/dasd.conf)
-        mock_os: mock python os module imported in model.storagedevices
+        success scenario(ie, dasd-eckd device is persisted)
+        mock_dasd_conf: mock of /etc/dasd.conf in model.persistence
         on scuccess, _is_dasdeckd_persisted() should return True
         """
         device = "dummy_device"
-        mock_os.access.return_value = True
-        open_mock = mock.mock_open(read_data='dummy_device')
-        with mock.patch('model.storagedevices.open', open_mock, create=True):
-            status = _is_dasdeckd_persisted(device)
-            mock_os.access.assert_called_once_with(DASD_CONF, mock_os.R_OK)
-            self.assertTrue(status)
-            open_mock.assert_called_once_with(DASD_CONF)
+        mock_dasd_conf.contains.return_value = True
+        status = _is_dasdeckd_persisted(device)
+        mock_dasd_conf.contains.assert_called_once_with(device)
+        self.assertTrue(status)
 
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_device_not_persistsed(self, mock_os):
+    @mock.patch('model.storagedevices.persistence.dasd_conf', autospec=True)
+    def test_device_not_persistsed(self, mock_dasd_conf):
         """
         unit test to validate _is_dasdeckd_persisted() method for a
         device which is not persisted
-        mock_os: mock python os module imported in model.storagedevices
+        mock_dasd_conf: mock of /etc/dasd.conf in model.persistence
         _is_dasdeckd_persisted() should return False
         """
         device = "dummy_device"
-        mock_os.access.return_value = True
-        open_mock = mock.mock_open(read_data='No Content')
-        with mock.patch('model.storagedevices.open', open_mock, create=True):
-            status = _is_dasdeckd_persisted(device)
-            mock_os.access.assert_called_once_with(DASD_CONF, mock_os.R_OK)
-            self.assertFalse(status)
-            open_mock.assert_called_once_with(DASD_CONF)
+        mock_dasd_conf.contains.return_value = False
+        status = _is_dasdeckd_persisted(device)
+        mock_dasd_conf.contains.assert_called_once_with(device)
+        self.assertFalse(status)
 
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persisted_no_access(self, mock_os):
+    @mock.patch('model.storagedevices.persistence.dasd_conf', autospec=True)
+    def test_persisted_no_access(self, mock_dasd_conf):
         """
         unit test to validate _is_dasdeckd_persisted() method
-        failure scenario(os.acces returns False ie.,
-        failed to access /etc/dasd.conf file)
-        mock_os: mock python os module imported in model.storagedevices
+        failure scenario(failed to read /etc/dasd.conf file)
+        mock_dasd_conf: mock of /etc/dasd.conf in model.persistence
         _is_dasdeckd_persisted() should return False
         """
         device = "dummy_device"
-        mock_os.access.return_value = False
-        open_mock = mock.mock_open(read_data='No Content')
-        with mock.patch('model.storagedevices.open', open_mock, create=True):
-            status = _is_dasdeckd_persisted(device)
-            mock_os.access.assert_called_once_with(DASD_CONF, mock_os.R_OK)
-            self.assertFalse(status)
-            self.assertFalse(open_mock.called,
-                             msg='Unexpected call to open_mock()')
+        mock_dasd_conf.contains.side_effect = IOError(13, 'Permission '
+                                                          'denied')
+        status = _is_dasdeckd_persisted(device)
+        self.assertFalse(status)
 
 
 class IsDasdEckdDeviceUnitTests(unittest.TestCase):
     """
     Unit tests for _is_dasdeckd_device() method
     """
-    @mock.patch('model.storagedevices._get_dasdeckd_devices', autospec=True)
-    def test_is_dasdeckd_success(self, mock_get_dasdeckd_devices):
+    @mock.patch('model.storagedevices.device_cache', autospec=True)
+    def test_is_dasdeckd_success(self, mock_device_cache):
         """
         unit test to validate if device is of type dasd-eckd - success
         scenario (ie, given device is of type dasd-eckd)
-        mock_get_dasdeckd_devices: mock of _get_dasdeckd_devices
-        model.storagedevices
+        mock_device_cache: mock of device_cache of model.storagedevices
         on success _is_dasdeckd_device() returns True
         """
-        mock_get_dasdeckd_devices.return_value = ['dummy_device', 'device2']
-        expected_out = True
+        mock_device_cache.has_device.return_value = True
         device = 'dummy_device'
         actual_out = _is_dasdeckd_device(device)
-        mock_get_dasdeckd_devices.assert_called_once_with()
-        self.assertEqual(actual_out, expected_out)
+        mock_device_cache.has_device.assert_called_once_with(syspath_eckd,
+                                                             device)
+        self.assertTrue(actual_out)
 
-    @mock.patch('model.storagedevices._get_dasdeckd_devices', autospec=True)
-    def test_is_dasdeckd_failure(self, mock_get_dasdeckd_devices):
+    @mock.patch('model.storagedevices.device_cache', autospec=True)
+    def test_is_dasdeckd_failure(self, mock_device_cache):
         """
         unit test to validate if device is of type dasd-eckd - failure
         scenario (ie, given device is not of dasd-eckd type)
-        mock_get_dasdeckd_devices: mock of _get_dasdeckd_devices
-        model.storagedevices
+        mock_device_cache: mock of device_cache of model.storagedevices
         on failure _is_dasdeckd_device() returns False
         """
-        mock_get_dasdeckd_devices.return_value = ['dummy_device', 'device2']
-        expected_out = False
+        mock_device_cache.has_device.return_value = False
         device = 'dev_not'
         actual_out = _is_dasdeckd_device(device)
-        mock_get_dasdeckd_devices.assert_called_once_with()
-        self.assertEqual(actual_out, expected_out)
+        mock_device_cache.has_device.assert_called_once_with(syspath_eckd,
+                                                             device)
+        self.assertFalse(actual_out)
 
 
 class IszFCPDeviceUnitTests(unittest.TestCase):
     """
     unit tests for _is_zfcp_device() method
     """
-    @mock.patch('model.storagedevices._get_zfcp_devices', autospec=True)
-    def test_is_zfcp_success(self, mock_get_zfcp_devices):
+    @mock.patch('model.storagedevices.device_cache', autospec=True)
+    def test_is_zfcp_success(self, mock_device_cache):
         """
         unit test to validate if device is of type zfcp - success
         scenario (ie, given device is of type zfcp)
-        mock_get_zfcp_devices: mock of _get_zfcp_devices model.storagedevices
+        mock_device_cache: mock of device_cache of model.storagedevices
         on success _is_zfcp_device() returns True
         """
-        mock_get_zfcp_devices.return_value = ['dummy_device', 'device2']
-        expected_out = True
+        mock_device_cache.has_device.return_value = True
         device = 'dummy_device'
         actual_out = _is_zfcp_device(device)
-        mock_get_zfcp_devices.assert_called_once_with()
-        self.assertEqual(actual_out, expected_out)
+        mock_device_cache.has_device.assert_called_once_with(syspath_zfcp,
+                                                             device)
+        self.assertTrue(actual_out)
 
-    @mock.patch('model.storagedevices._get_zfcp_devices', autospec=True)
-    def test_is_zfcp_failure(self, mock_get_zfcp_devices):
+    @mock.patch('model.storagedevices.device_cache', autospec=True)
+    def test_is_zfcp_failure(self, mock_device_cache):
         """
         unit test to validate if device is of type zfcp - failure
         scenario (ie, given device is not of zfcp type)
-        mock_get_zfcp_devices: mock of _get_zfcp_devices model.storagedevices
+        mock_device_cache: mock of device_cache of model.storagedevices
         on failure _is_zfcp_device() returns False
         """
-        mock_get_zfcp_devices.return_value = ['dummy_device', 'device2']
-        expected_out = False
+        mock_device_cache.has_device.return_value = False
         device = 'dev_not'
         actual_out = _is_zfcp_device(device)
-        mock_get_zfcp_devices.assert_called_once_with()
-        self.assertEqual(actual_out, expected_out)
+        mock_device_cache.has_device.assert_called_once_with(syspath_zfcp,
+                                                             device)
+        self.assertFalse(actual_out)
+
+
+class StorageDeviceCacheUnitTests(unittest.TestCase):
+    """
+    unit tests for the cache of lscss output and sysfs devices
+    """
+    def setUp(self):
+        patcher = mock.patch('model.storagedevices.uevent.watch',
+                             autospec=True)
+        self.mock_watch = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = StorageDeviceCache(30)
+
+    @mock.patch('model.storagedevices.utils', autospec=True)
+    def test_device_paths_cached(self, mock_utils):
+        """
+        unit test to validate that sysfs is globbed once per pattern
+        and cache is watching ccw uevents
+        """
+        mock_utils.get_directories.return_value = ['/path/0.0.0190/']
+        mock_utils.get_dirname.return_value = '0.0.0190'
+        self.assertTrue(self.cache.has_device(syspath_eckd, '0.0.0190'))
+        self.assertFalse(self.cache.has_device(syspath_eckd, '0.0.0191'))
+        self.assertEqual(self.cache.get_paths(syspath_eckd),
+                         ['/path/0.0.0190/'])
+        mock_utils.get_directories.assert_called_once_with(syspath_eckd)
+        self.mock_watch.assert_called_once_with(self.cache.invalidate,
+                                                ['ccw', 'css'])
+
+    @mock.patch('model.storagedevices.utils.get_directories', autospec=True)
+    @mock.patch('model.storagedevices._get_device_table', autospec=True)
+    def test_table_cached(self, mock_get_device_table, mock_get_directories):
+        """
+        unit test to validate that the table is built once until invalidated
+        and only for the dasd-eckd and zfcp devices
+        """
+        mock_get_directories.side_effect = lambda pattern: \
+            [pattern.replace('0.*', '0.0.0190')] \
+            if 'dasd-eckd' in pattern else []
+        mock_get_device_table.return_value = {
+            '0.0.0190': {'device': '0.0.0190', 'status': 'online'}}
+        device_info = self.cache.get_device('0.0.0190')
+        device_info['status'] = 'offline'
+        self.assertEqual(self.cache.get_device('0.0.0190')['status'],
+                         'online')
+        self.assertIsNone(self.cache.get_device('0.0.0191'))
+        mock_get_device_table.assert_called_once_with(set(['0.0.0190']))
+        self.cache.invalidate()
+        self.cache.get_device('0.0.0190')
+        self.assertEqual(mock_get_device_table.call_count, 2)
+
+    @mock.patch('model.storagedevices.utils.get_directories', autospec=True)
+    @mock.patch('model.storagedevices._get_device_table', autospec=True)
+    def test_device_copied_alone(self, mock_get_device_table,
+                                 mock_get_directories):
+        """
+        unit test to validate that looking up a device copies only its
+        entry, not the whole table
+        """
+        class DeviceTable(dict):
+            def iteritems(self):
+                raise AssertionError('whole table copied')
+
+        mock_get_directories.return_value = ['/path/0.0.0190/']
+        mock_get_device_table.return_value = DeviceTable(
+            ('0.0.%04x' % devno, {'device': '0.0.%04x' % devno})
+            for devno in range(0x190, 0x1000))
+        self.assertEqual(self.cache.get_device('0.0.0190'),
+                         {'device': '0.0.0190'})
+        self.assertIsNone(self.cache.get_device('0.0.1000'))
+
+    @mock.patch('model.storagedevices.utils.get_directories', autospec=True)
+    @mock.patch('model.storagedevices._get_device_table', autospec=True)
+    def test_table_expired(self, mock_get_device_table, mock_get_directories):
+        """
+        unit test to validate that the table is built again once TTL expired
+        """
+        mock_get_directories.return_value = ['/path/0.0.0190/']
+        mock_get_device_table.return_value = {}
+        self.cache.get_table()
+        self.cache.timestamp -= 30
+        self.cache.get_table()
+        self.assertEqual(mock_get_device_table.call_count, 2)
+
+    @mock.patch('model.storagedevices.utils.get_directories', autospec=True)
+    @mock.patch('model.storagedevices._get_device_table', autospec=True)
+    def test_table_without_devices(self, mock_get_device_table,
+                                   mock_get_directories):
+        """
+        unit test to validate that the channel subsystem is not read if
+        there are no dasd-eckd and zfcp devices
+        """
+        mock_get_directories.return_value = []
+        self.assertEqual(self.cache.get_table(), {})
+        self.assertFalse(mock_get_device_table.called)
+
+    @mock.patch('model.storagedevices._device_online', autospec=True)
+    @mock.patch('model.storagedevices.device_cache', autospec=True)
+    def test_invalidated_by_online(self, mock_device_cache,
+                                   mock_device_online):
+        """
+        unit test to validate that bringing a device online
+        invalidates the cache, even on failure
+        """
+        mock_device_online.side_effect = exception.OperationFailed('dummy')
+        _bring_device_online(mock.Mock(), '0.0.0190')
+        mock_device_cache.invalidate.assert_called_once_with()
 
 
 class PersistDasdEckdDeviceUnitTests(unittest.TestCase):
     """
     unit tests for _persist_dasdeckd_device() method
     """
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persist_dasdeckd_success(self, mock_os):
+    @mock.patch('model.storagedevices.persistence.dasd_conf', autospec=True)
+    def test_persist_dasdeckd_success(self, mock_dasd_conf):
         """
         unit test to validate persisting dasd-eckd device, success
-        scenario(os.system return code is 0)
-        mock_os: mock of python os module imported in storagedevices
+        scenario
+        mock_dasd_conf: mock of /etc/dasd.conf in model.persistence
         on success, _persist_dasdeckd_device() method doesn't return anything
         """
-        mock_os.system.return_value = 0
-        mock_os.access.return_value = True
         device = "dummy_device"
-        command = 'flock -w 1 %s -c \"echo %s >> %s\"' \
-                  % (DASD_CONF, device, DASD_CONF)
         _persist_dasdeckd_device(device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
+        mock_dasd_conf.update.assert_called_once_with(add=[device])
 
     @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persist_dasdeckd_failtowrite_tofile(self, mock_os, mock_log):
+    @mock.patch('model.storagedevices.persistence.dasd_conf', autospec=True)
+    def test_persist_dasdeckd_failtowrite_tofile(self, mock_dasd_conf,
+                                                  mock_log):
         """
         unit test to validate persisting dasd-eckd device, failure
-        scenario(os.system return code is not zero)
-        mock_os: mock of python os module imported in storagedevices
+        scenario(failed to write dasd.conf file)
+        mock_dasd_conf: mock of /etc/dasd.conf in model.persistence
         mock_log: mock of wok_log imported in model.storagedevices
         on failure, _persist_dasdeckd_device() raises OperationFailed exception
         """
-        mock_os.system.return_value = 1
-        mock_os.access.return_value = True
+        mock_dasd_conf.update.side_effect = IOError(13, 'Permission denied')
         device = "dummy_device"
-        command = 'flock -w 1 %s -c \"echo %s >> %s\"' \
-                  % (DASD_CONF, device, DASD_CONF)
         self.assertRaises(exception.OperationFailed,
                           _persist_dasdeckd_device, device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
-        mock_log.error.assert_called_with("Failed to persist "
-                                          "dasd-eckd device: %s" % device)
-
-    @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persist_dasdeckd_failtoaccess_file(self, mock_os, mock_log):
-        """
-        unit test to validate persisting dasd-eckd device, failure
-        scenario(os.accsess returns False, ie, failed to
-        access dasd.conf file in write mode)
-        mock_os: mock of python os module imported in storagedevices
-        mock_log: mock of wok_log imported in model.storagedevices
-        on failure, _persist_dasdeckd_device() raises OperationFailed exception
-        """
-        mock_os.access.return_value = False
-        device = "dummy_device"
-        self.assertRaises(exception.OperationFailed,
-                          _persist_dasdeckd_device, device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        self.assertFalse(mock_os.system.called,
-                         msg='Unexpected call to mock_os.system()')
+        mock_dasd_conf.update.assert_called_once_with(add=[device])
         mock_log.error.assert_called_with("Failed to persist "
                                           "dasd-eckd device: %s" % device)
 
@@ -1331,70 +1411,40 @@ class UnPersistDasdEckdUnitTests(unittest.TestCase):
     """
     unit tests for _unpersist_dasdeckd_device() method
     """
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_unpersist_dasdeckd_success(self, mock_os):
+    @mock.patch('model.storagedevices.persistence.dasd_conf', autospec=True)
+    def test_unpersist_dasdeckd_success(self, mock_dasd_conf):
         """
         unit test to validate un persisting dasd-eckd
         device(removing dasd-eckd device id from dasd.conf file),
-        success scenario(os.system return code is 0)
-        mock_os: mock of python os module imported in storagedevices
+        success scenario
+        mock_dasd_conf: mock of /etc/dasd.conf in model.persistence
         on success, _unpersist_dasdeckd_device()
          method doesn't return anything
         """
-        mock_os.system.return_value = 0
-        mock_os.access.return_value = True
         device = "dummy_device"
-        command = 'flock -w 1 %s -c \"sed -i \'/%s/Id\' %s\"' \
-                  % (DASD_CONF, device, DASD_CONF)
         _unpersist_dasdeckd_device(device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
+        mock_dasd_conf.update.assert_called_once_with(remove=[device])
 
     @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_unpersist_dasdeckd_failtowrite_tofile(self, mock_os, mock_log):
+    @mock.patch('model.storagedevices.persistence.dasd_conf', autospec=True)
+    def test_unpersist_dasdeckd_failtowrite_tofile(self, mock_dasd_conf,
+                                                    mock_log):
         """
         unit test to validate un persisting dasd-eckd device, failure
-        scenario(os.system return code is not zero)
-        mock_os: mock of python os module imported in storagedevices
+        scenario(failed to write dasd.conf file)
+        mock_dasd_conf: mock of /etc/dasd.conf in model.persistence
         mock_log: mock of wok_log imported in model.storagedevices
         on failure, _unpersist_dasdeckd_device()
         raises OperationFailed exception
         """
-        mock_os.system.return_value = 1
-        mock_os.access.return_value = True
+        mock_dasd_conf.update.side_effect = OSError(28, 'No space left')
         device = "dummy_device"
-        command = 'flock -w 1 %s -c \"sed -i \'/%s/Id\' %s\"' \
-                  % (DASD_CONF, device, DASD_CONF)
         self.assertRaises(exception.OperationFailed,
                           _unpersist_dasdeckd_device, device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
+        mock_dasd_conf.update.assert_called_once_with(remove=[device])
         mock_log.error.assert_called_with("Failed to unpersist"
                                           " dasd-eckd device: %s" % device)
 
-    @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_unpersist_dasdeckd_failtoaccess_file(self, mock_os, mock_log):
-        """
-        unit test to validate un persisting dasd-eckd device, failure
-        scenario - os.accsess returns False, ie, failed to
-        access dasd.conf file in write mode
-        mock_os: mock of python os module imported in storagedevices
-        mock_log: mock of wok_log imported in model.storagedevices
-        on failure, _unpersist_dasdeckd_device()
-        raises OperationFailed exception
-        """
-        mock_os.access.return_value = False
-        device = "dummy_device"
-        self.assertRaises(exception.OperationFailed,
-                          _unpersist_dasdeckd_device, device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_log.error.assert_called_with("Failed to unpersist "
-                                          "dasd-eckd device: %s" % device)
-        self.assertFalse(mock_os.system.called,
-                         msg='Unexpected call to mock_os.system()')
-
 
 class BringOnlineUnitTests(unittest.TestCase):
     """
@@ -1472,3 +1522,114 @@ class BringOfflineUnitTests(unittest.TestCase):
         mock_run_command.assert_called_once_with(command)
         mock_log.error.assert_called_with("Failed to bring device %s offline."
                                           " Error: dummy error" % device)
+
+
+class BulkOnlineOfflineUnitTests(unittest.TestCase):
+    """
+    unit tests for bringing many devices online or offline in a task
+    """
+    def setUp(self):
+        self.online = {'0.0.0200': False, '0.0.0201': False,
+                       '0.0.0202': True, '0.0.1900': False}
+        self.broken = set()
+        self.cb = mock.Mock()
+        for target, attr in (('run_command', 'run_command'),
+                             ('_is_online', 'is_online'),
+                             ('_is_dasdeckd_device', 'is_eckd'),
+                             ('persistence', 'persistence'),
+                             ('device_cache', 'device_cache')):
+            patcher = mock.patch('model.storagedevices.' + target)
+            setattr(self, 'mock_' + attr, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.mock_run_command.side_effect = self._chccwdev
+        self.mock_is_online.side_effect = lambda device: self.online[device]
+        self.mock_is_eckd.side_effect = lambda device: device != '0.0.1900'
+
+    def _chccwdev(self, command):
+        """
+        fake chccwdev, processing all the devices but the broken ones
+        """
+        rc = 0
+        for device in command[2].split(','):
+            if device in self.broken:
+                rc = 1
+            else:
+                self.online[device] = command[1] == '-e'
+        return ['', 'failed' if rc else '', rc]
+
+    def test_online_batched(self):
+        """
+        unit test to validate that chccwdev runs once for all devices and
+        dasd.conf is updated once
+        """
+        devices = ['0.0.0200', '0.0.0201', '0.0.0202', '0.0.1900']
+        _devices_online(self.cb, devices)
+        self.mock_run_command.assert_called_once_with(
+            ['chccwdev', '-e', '0.0.0200,0.0.0201,0.0.1900'])
+        self.mock_persistence.dasd_conf.update.assert_called_once_with(
+            add=['0.0.0200', '0.0.0201', '0.0.0202'])
+        self.cb.assert_any_call('Device 0.0.1900 is online, 4 of 4 devices '
+                                'done')
+        self.assertTrue(self.cb.call_args[0][1])
+        self.assertTrue(all(self.online.values()))
+        self.mock_device_cache.invalidate.assert_called_once_with()
+
+    def test_online_fallback(self):
+        """
+        unit test to validate that the devices of a failed batch are retried
+        one by one and the failed ones are neither persisted nor reported
+        as successful
+        """
+        self.broken.add('0.0.0201')
+        _devices_online(self.cb, ['0.0.0200', '0.0.0201', '0.0.1900'])
+        self.mock_run_command.assert_any_call(['chccwdev', '-e', '0.0.0201'])
+        self.assertEqual(self.mock_run_command.call_count, 2)
+        self.mock_persistence.dasd_conf.update.assert_called_once_with(
+            add=['0.0.0200'])
+        message, success = self.cb.call_args[0]
+        self.assertFalse(success)
+        self.assertIn('0.0.0201', message)
+        self.assertNotIn('0.0.0200', message)
+
+    def test_offline_skips_offline_devices(self):
+        """
+        unit test to validate that only online devices are brought offline
+        """
+        _devices_offline(self.cb, ['0.0.0201', '0.0.0202'])
+        self.mock_run_command.assert_called_once_with(
+            ['chccwdev', '-d', '0.0.0202'])
+        self.mock_persistence.dasd_conf.update.assert_called_once_with(
+            remove=['0.0.0201', '0.0.0202'])
+        self.assertFalse(self.online['0.0.0202'])
+        self.assertTrue(self.cb.call_args[0][1])
+
+    def test_persist_failure_reverts(self):
+        """
+        unit test to validate that the devices are brought back offline if
+        dasd.conf can't be updated
+        """
+        self.mock_persistence.dasd_conf.update.side_effect = IOError('dummy')
+        _devices_online(self.cb, ['0.0.0200', '0.0.0202'])
+        self.mock_run_command.assert_called_with(
+            ['chccwdev', '-d', '0.0.0200'])
+        self.assertFalse(self.online['0.0.0200'])
+        self.assertTrue(self.online['0.0.0202'])
+        self.assertFalse(self.cb.call_args[0][1])
+
+    @mock.patch('model.storagedevices.add_task', autospec=True)
+    @mock.patch('model.storagedevices.TaskModel', autospec=True)
+    def test_model_validates_devices(self, mock_task_model, mock_add_task):
+        """
+        unit test to validate that the device ids are checked before the
+        task is created
+        """
+        model = StorageDevicesBulkModel(objstore='objstore')
+        self.assertRaises(exception.InvalidParameter, model.online, 'online',
+                          '0.0.0200')
+        self.assertRaises(exception.InvalidParameter, model.offline,
+                          'offline', ['0.0.0200', 'invalid'])
+        self.assertFalse(mock_add_task.called)
+        model.online('online', ['0200', '0.0.0200', '0.0.0201'])
+        mock_add_task.assert_called_once_with(
+            '/plugins/gingers390x/storagedevices/bulk/online',
+            _devices_online, 'objstore', ['0.0.0200', '0.0.0201'])
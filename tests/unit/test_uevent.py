@@ -0,0 +1,94 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM, Corp. 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from model import uevent
+
+
+class WaitUntilUnitTests(unittest.TestCase):
+    """
+    unit tests for waiting on uevents using a stub listener
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        patcher = mock.patch('model.uevent._open_listener')
+        self.mock_open_listener = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.listener = self.mock_open_listener.return_value
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_no_wait_if_condition_met(self):
+        self.assertEqual(uevent.wait_until(lambda: 'done', 5), 'done')
+        self.assertFalse(self.listener.wait.called)
+        self.listener.close.assert_called_once_with()
+
+    def test_wakes_up_on_uevent(self):
+        path = os.path.join(self.tmp_dir, '0x4010400000000000')
+
+        def device_added(timeout):
+            os.mkdir(path)
+            return {'ACTION': 'add'}
+
+        self.listener.wait.side_effect = device_added
+        missing = uevent.wait_for_paths([path], 5)
+        self.assertEqual(missing, [])
+        self.assertEqual(self.listener.wait.call_count, 1)
+
+    def test_timeout(self):
+        path = os.path.join(self.tmp_dir, 'never')
+        self.listener.wait.return_value = None
+        missing = uevent.wait_for_paths([path], 0.1)
+        self.assertEqual(missing, [path])
+        self.listener.close.assert_called_once_with()
+
+    @mock.patch('model.uevent.time.sleep', autospec=True)
+    def test_polls_without_listener(self, mock_sleep):
+        self.mock_open_listener.return_value = None
+        results = iter([False, False, True])
+        self.assertTrue(uevent.wait_until(lambda: next(results), 5))
+        self.assertEqual(mock_sleep.call_count, 2)
+
+
+class UeventListenerUnitTests(unittest.TestCase):
+    """
+    unit tests for parsing uevents received from netlink
+    """
+
+    @mock.patch('model.uevent.select.select', autospec=True)
+    @mock.patch('model.uevent.socket.socket', autospec=True)
+    def test_parse_uevent(self, mock_socket, mock_select):
+        sock = mock_socket.return_value
+        mock_select.return_value = ([sock], [], [])
+        sock.recv.return_value = 'add@/devices/css0/0.0.0001/0.0.1900\0' \
+                                 'ACTION=add\0' \
+                                 'DEVPATH=/devices/css0/0.0.0001/0.0.1900\0' \
+                                 'SUBSYSTEM=ccw\0'
+        listener = uevent.UeventListener()
+        event = listener.wait(1)
+        self.assertEqual(event['ACTION'], 'add')
+        self.assertEqual(event['SUBSYSTEM'], 'ccw')
+        sock.bind.assert_called_once_with((0, uevent.UEVENT_KERNEL_GROUP))
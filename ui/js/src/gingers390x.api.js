@@ -153,7 +153,7 @@ var gingers390x = {
   },
 listFCPluns: function(suc, err) {
     wok.requestJSON({
-      url: 'plugins/gingers390x/fcluns?type="disk"&configured="false"',
+      url: 'plugins/gingers390x/fcluns?_type=disk&_configured=false',
       type: 'GET',
       contentType: 'application/json',
       dataType: 'json',
@@ -213,25 +213,22 @@ listFCPluns: function(suc, err) {
       error: err
     });
   },
-  configureFcpSanAdapter: function(device, enable, suc, err, progress) {
-    var device = encodeURIComponent(device);
-
-    wok.requestJSON({
-      url: "plugins/gingers390x/storagedevices/" + device +
-        '/' + (enable === true ? 'online' : 'offline'),
-      type: "POST",
-      contentType: "application/json",
-      dataType: "json",
-      success: suc,
-      error: err
-    });
-  },
-
-  configureEckd: function(device, enable, suc, err, progress) {
+  configureStorageDevice: function(device, enable, suc, err, progress) {
+    var deviceId = device;
     var device = encodeURIComponent(device);
+    // callers expect the device and its new status as result
+    var onTaskFinished = function(result) {
+      result['device'] = deviceId;
+      result['status'] = (enable === true ? 'online' : 'offline');
+      suc && suc(result);
+    };
+    var onTaskFailed = function(result) {
+      result['device'] = deviceId;
+      err && err(result);
+    };
     var onResponse = function(data) {
       taskID = data['id'];
-      gingers390x.trackTask(taskID, suc, err, progress);
+      gingers390x.trackTask(taskID, onTaskFinished, onTaskFailed, progress);
     };
 
     wok.requestJSON({
@@ -240,10 +237,18 @@ listFCPluns: function(suc, err) {
       type: "POST",
       contentType: "application/json",
       dataType: "json",
-      success: suc,
-      error: err
+      success: onResponse,
+      error: onTaskFailed
     });
   },
+
+  configureFcpSanAdapter: function(device, enable, suc, err, progress) {
+    gingers390x.configureStorageDevice(device, enable, suc, err, progress);
+  },
+
+  configureEckd: function(device, enable, suc, err, progress) {
+    gingers390x.configureStorageDevice(device, enable, suc, err, progress);
+  },
   listFcpSanAdapter: function(suc, err) {
     wok.requestJSON({
       url: 'plugins/gingers390x/storagedevices?_type=zfcp&status=offline',